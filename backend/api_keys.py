@@ -0,0 +1,222 @@
+import time
+import secrets
+import sqlite3
+import hashlib
+import logging
+import threading
+from contextlib import contextmanager
+from pathlib import Path
+
+from config import config
+
+logger = logging.getLogger(__name__)
+
+# Tiers keys can be issued for, matching api.rate_limits
+TIERS = ('free', 'standard', 'premium')
+
+# Prefix of generated keys, so they are recognizable in logs and config files
+KEY_PREFIX = 'vpk_'
+
+
+def hash_key(api_key):
+    """Get the stored form of an API key; keys are random, so a plain SHA-256 is enough"""
+    return hashlib.sha256(api_key.encode('utf-8')).hexdigest()
+
+
+class ApiKey:
+    """A valid API key's tier and quota"""
+
+    __slots__ = ("key_hash", "name", "tier", "daily_limit")
+
+    def __init__(self, key_hash, name, tier, daily_limit):
+        self.key_hash = key_hash
+        self.name = name
+        self.tier = tier
+        self.daily_limit = daily_limit
+
+
+class ApiKeyStore:
+    """
+    Persistent API keys with a per-process validation cache
+
+    Keys are stored as hashes in a small SQLite database. Lookups are cached,
+    including misses, so validating a key is normally a dict lookup. Every
+    change bumps a version number; each process checks it at most once per
+    `refresh_interval` and drops its cache when it moves, which bounds how
+    long a revoked key keeps working.
+    """
+
+    def __init__(self, db_path, ttl=300, negative_ttl=60, refresh_interval=5.0, max_entries=100000):
+        """
+        Initialize the store
+
+        Args:
+            db_path: Path of the SQLite key database, created if missing
+            ttl: Seconds a valid key is cached
+            negative_ttl: Seconds an unknown or revoked key is cached
+            refresh_interval: Minimum seconds between checks for changed keys
+            max_entries: Cached lookups per process before the cache is cleared
+        """
+        self.db_path = Path(db_path)
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        self.refresh_interval = refresh_interval
+        self.max_entries = max_entries
+
+        self._cache = {}
+        self._lock = threading.Lock()
+        self._version = None
+        self._version_checked = 0.0
+        self._schema_ready = False
+        self._stats = {"hits": 0, "misses": 0, "invalidations": 0}
+
+    @contextmanager
+    def _connect(self):
+        """Open a short-lived autocommit connection"""
+        if not self._schema_ready:
+            self.db_path.parent.mkdir(parents=True, exist_ok=True)
+        conn = sqlite3.connect(str(self.db_path), timeout=30, isolation_level=None)
+        conn.row_factory = sqlite3.Row
+        try:
+            if not self._schema_ready:
+                self._create_schema(conn)
+            yield conn
+        finally:
+            conn.close()
+
+    def _create_schema(self, conn):
+        """Create the key tables on first use"""
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS api_keys (
+                key_hash TEXT PRIMARY KEY,
+                prefix TEXT NOT NULL,
+                name TEXT,
+                tier TEXT NOT NULL,
+                daily_limit INTEGER,
+                created_at REAL NOT NULL,
+                revoked_at REAL
+            )
+        """)
+        conn.execute("CREATE TABLE IF NOT EXISTS api_keys_version (version INTEGER NOT NULL)")
+        if conn.execute("SELECT COUNT(*) FROM api_keys_version").fetchone()[0] == 0:
+            conn.execute("INSERT INTO api_keys_version (version) VALUES (0)")
+        self._schema_ready = True
+
+    def _changed(self, conn):
+        """Bump the version so every process drops its cached lookups"""
+        conn.execute("UPDATE api_keys_version SET version = version + 1")
+
+    def _check_version(self):
+        """Clear the cache if keys changed, polling the database at most once per refresh interval"""
+        now = time.monotonic()
+        if now - self._version_checked < self.refresh_interval:
+            return
+
+        self._version_checked = now
+        try:
+            with self._connect() as conn:
+                version = conn.execute("SELECT version FROM api_keys_version").fetchone()[0]
+        except sqlite3.Error:
+            logger.exception("Error checking API key version")
+            return
+
+        with self._lock:
+            if version != self._version:
+                if self._version is not None:
+                    self._stats["invalidations"] += 1
+                self._version = version
+                self._cache.clear()
+
+    def validate(self, api_key):
+        """Get the ApiKey for a key, or None if it's unknown or revoked"""
+        self._check_version()
+        key_hash = hash_key(api_key)
+        now = time.monotonic()
+
+        entry = self._cache.get(key_hash)
+        if entry is not None and entry[1] > now:
+            self._stats["hits"] += 1
+            return entry[0]
+        self._stats["misses"] += 1
+
+        with self._connect() as conn:
+            row = conn.execute(
+                "SELECT key_hash, name, tier, daily_limit FROM api_keys WHERE key_hash = ? AND revoked_at IS NULL",
+                (key_hash,)
+            ).fetchone()
+        key = ApiKey(row['key_hash'], row['name'], row['tier'], row['daily_limit']) if row else None
+
+        with self._lock:
+            # Lookups of random keys could otherwise grow the cache without bound
+            if len(self._cache) >= self.max_entries:
+                self._cache.clear()
+            self._cache[key_hash] = (key, now + (self.ttl if key else self.negative_ttl))
+        return key
+
+    def create(self, tier, name=None, daily_limit=None):
+        """Issue a new key and return it; only its hash is stored, so it can't be shown again"""
+        if tier not in TIERS:
+            raise ValueError(f"Unknown tier: {tier}")
+
+        api_key = KEY_PREFIX + secrets.token_urlsafe(32)
+        with self._connect() as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                conn.execute(
+                    "INSERT INTO api_keys (key_hash, prefix, name, tier, daily_limit, created_at) VALUES (?, ?, ?, ?, ?, ?)",
+                    (hash_key(api_key), api_key[:len(KEY_PREFIX) + 6], name, tier, daily_limit, time.time())
+                )
+                self._changed(conn)
+                conn.execute("COMMIT")
+            except Exception:
+                conn.execute("ROLLBACK")
+                raise
+        return api_key
+
+    def revoke(self, key_or_prefix):
+        """Revoke a key, given in full or by the prefix shown by list_keys; returns how many were revoked"""
+        with self._connect() as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                cursor = conn.execute(
+                    "UPDATE api_keys SET revoked_at = ? WHERE revoked_at IS NULL AND (key_hash = ? OR prefix = ?)",
+                    (time.time(), hash_key(key_or_prefix), key_or_prefix)
+                )
+                if cursor.rowcount:
+                    self._changed(conn)
+                conn.execute("COMMIT")
+            except Exception:
+                conn.execute("ROLLBACK")
+                raise
+        return cursor.rowcount
+
+    def list_keys(self, include_revoked=False):
+        """Get every key as a dict, without the key itself"""
+        sql = "SELECT prefix, name, tier, daily_limit, created_at, revoked_at FROM api_keys"
+        if not include_revoked:
+            sql += " WHERE revoked_at IS NULL"
+        with self._connect() as conn:
+            return [dict(row) for row in conn.execute(sql + " ORDER BY created_at")]
+
+    def stats(self):
+        """Get cache usage metrics"""
+        with self._lock:
+            stats = dict(self._stats)
+            stats["entries"] = len(self._cache)
+        return stats
+
+
+def create_api_key_store():
+    """Create the API key store from the configuration"""
+    db_path = config.get('api.keys_db_path')
+    return ApiKeyStore(
+        db_path or config.media_output_dir / "api_keys.db",
+        ttl=config.get('api.key_cache_ttl', 300),
+        negative_ttl=config.get('api.key_negative_ttl', 60),
+        refresh_interval=config.get('api.key_refresh_interval', 5.0)
+    )
+
+
+# Create a singleton API key store
+api_keys = create_api_key_store()
@@ -1,15 +1,26 @@
-from flask import Flask, request, jsonify, g
+from flask import Flask, request, jsonify, g, abort, send_from_directory
 from functools import wraps
-import uuid
 import datetime
 import time
+import math
 import os
+import sqlite3
 from pathlib import Path
 import logging
 
 from config import config
 from database import db
-from media_generator import MemeGenerator, GifGenerator, ClipGenerator
+from media_generator import MemeGenerator, FrameResizer, frame_resizer, media_id, touch_media
+from job_queue import job_queue, DONE, FAILED
+from text_render import text_cache
+from rate_limiter import rate_limiter
+from api_keys import api_keys
+from media_manifest import media_manifest
+from utils import cleanup_expired_media, parse_timestamp
+from subtitle_index import SubtitleIndex
+from response_cache import ResponseCache
+from frame_store import frame_index, EPISODE_PATTERN
+from video_index import video_index
 
 # Configure logging
 logging.basicConfig(
@@ -29,10 +40,18 @@ if config.is_production:
 @app.before_first_request
 def setup_cleanup():
     if config.get('auto_cleanup_media', True):
-        # In a production app, you would use a task scheduler like Celery
-        # For simplicity, we'll just log a reminder
-        logger.info("Media cleanup should be scheduled with a cron job or task scheduler")
-        # cleanup_expired_media() # Uncomment to run on startup
+        # Each worker process sweeps on a timer; sweeps are cheap indexed queries,
+        # so overlapping ones in several workers are harmless
+        media_manifest.start(config.get('media.sweep_interval', 3600), sweep=cleanup_expired_media)
+    else:
+        logger.info("Media cleanup should be scheduled with cleanup_media.py in a cron job or task scheduler")
+
+# Start the background job dispatcher in each worker process
+@app.before_request
+def start_job_dispatcher():
+    # Disable when GIFs and clips are generated by a separate job_worker.py process
+    if config.get('jobs.run_in_app', True):
+        job_queue.start()
 
 # Define error codes
 ERROR_CODES = {
@@ -57,18 +76,29 @@ def require_api_key(f):
         if not api_key:
             return jsonify({"error": ERROR_CODES[401]}), 401
         
-        # TODO: Implement proper API key validation
-        # This is a placeholder implementation
-        g.api_tier = 'free'  # Default tier
+        # Cached in-process, including unknown keys, so this rarely touches the key database
+        key = api_keys.validate(api_key)
+        if key is None:
+            return jsonify({"error": ERROR_CODES[401]}), 401
         
-        if api_key == 'test-standard':
-            g.api_tier = 'standard'
-        elif api_key == 'test-premium':
-            g.api_tier = 'premium'
+        g.api_key = api_key
+        g.api_tier = key.tier
+        g.api_limit = key.daily_limit
         
         return f(*args, **kwargs)
     return decorated_function
 
+# Subscription tier check; applied before rate_limit so refused requests aren't charged
+def require_tier(tiers, message):
+    def decorator(f):
+        @wraps(f)
+        def decorated_function(*args, **kwargs):
+            if getattr(g, 'api_tier', 'free') not in tiers:
+                return jsonify({"error": message}), 403
+            return f(*args, **kwargs)
+        return decorated_function
+    return decorator
+
 # Rate limiting decorator
 def rate_limit(f):
     @wraps(f)
@@ -76,21 +106,75 @@ def rate_limit(f):
         # Get the user's tier
         tier = getattr(g, 'api_tier', 'free')
         
-        # Check if rate limit is exceeded
-        # This is a very simple implementation, in production you would use Redis or another cache
-        # to track request counts over time
-        
         # In development mode, we might bypass rate limiting
         if config.is_development and config.get('bypass_rate_limit', False):
             return f(*args, **kwargs)
         
-        # Get the daily limit based on tier
-        daily_limit = config.get(f'api.rate_limits.{tier}', 100)
+        # The key's own quota or its tier's limit is the bucket size; it refills over api.rate_limit_period
+        limit = getattr(g, 'api_limit', None) or config.get(f'api.rate_limits.{tier}', 100)
+        key = getattr(g, 'api_key', None) or request.remote_addr or 'anonymous'
         
-        # TODO: Implement proper rate limiting
-        # This is a placeholder implementation
+        try:
+            result = rate_limiter.take(key, limit, rate_limiter.cost(request.endpoint))
+        except sqlite3.Error:
+            # Serving without limits beats failing every request
+            logger.exception("Rate limiter unavailable")
+            return f(*args, **kwargs)
         
-        return f(*args, **kwargs)
+        if not result.allowed:
+            response = jsonify({"error": ERROR_CODES[429]})
+            response.status_code = 429
+        else:
+            response = app.make_response(f(*args, **kwargs))
+        response.headers.update(result.headers())
+        return response
+    return decorated_function
+
+# Cache for read-only endpoints; entries are dropped whenever the database file changes
+response_cache = ResponseCache(
+    max_bytes=config.get('cache.max_bytes', 64 * 1024 * 1024),
+    ttl=config.get('cache.ttl', 3600),
+    version_source=db.data_version,
+    version_check_interval=config.get('cache.version_check_interval', 1.0)
+)
+
+# Frame and time lookups; rebuilt whenever the database file changes
+subtitle_index = SubtitleIndex(
+    db.get_subtitle_intervals,
+    version_source=db.data_version,
+    version_check_interval=config.get('cache.version_check_interval', 1.0)
+)
+
+# The caches above see a newly published database in its data version; it can come with
+# new frames and videos too, so their listings are reloaded
+db.on_version_change(frame_index.invalidate)
+db.on_version_change(video_index.invalidate)
+
+# Response caching decorator for read-only JSON endpoints
+def cached_response(f):
+    @wraps(f)
+    def decorated_function(*args, **kwargs):
+        if not config.get('cache.enabled', True):
+            return f(*args, **kwargs)
+        
+        # Normalize the key so parameter order doesn't matter
+        key = (request.path, tuple(sorted(request.args.items(multi=True))))
+        entry = response_cache.get(key)
+        
+        if entry is None:
+            database_path = db.current_path
+            response = app.make_response(f(*args, **kwargs))
+            # Only successful responses are cached, errors are passed through untouched;
+            # neither is one that may have been built from a database version just replaced
+            if response.status_code != 200 or db.current_path != database_path:
+                return response
+            entry = response_cache.set(key, response.get_data(), response.mimetype)
+        
+        response = app.response_class(entry.body, mimetype=entry.mimetype)
+        response.set_etag(entry.etag)
+        response.headers['Cache-Control'] = f"public, max-age={config.get('cache.max_age', 300)}"
+        # Turns the response into a 304 if the client's If-None-Match matches
+        return response.make_conditional(request)
     return decorated_function
 
 # Error handler for common HTTP errors
@@ -111,20 +195,31 @@ def handle_exception(e):
 @app.route('/v1/search', methods=['GET'])
 @require_api_key
 @rate_limit
+@cached_response
 def search_quotes():
     query = request.args.get('query', '')
     if not query:
         return jsonify({"error": "Query parameter is required"}), 400
     
-    page = int(request.args.get('page', 1))
-    limit = min(int(request.args.get('limit', 20)), 50)  # Max limit is 50
+    try:
+        page, limit = page_args(20, 50)
+    except ValueError:
+        return jsonify({"error": "page and limit must be whole numbers of at least 1"}), 400
     
-    results = db.search_quotes(query, page, limit)
+    # A cursor parameter (even an empty one) switches to keyset pagination
+    cursor = request.args.get('cursor')
+    include_total = request.args.get('include_total', 'true' if cursor is None else 'false').lower() == 'true'
+    
+    try:
+        results = db.search_quotes(query, page, limit, cursor=cursor, include_total=include_total)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
     return jsonify(results)
 
 @app.route('/v1/subtitle/<int:subtitle_id>', methods=['GET'])
 @require_api_key
 @rate_limit
+@cached_response
 def get_subtitle(subtitle_id):
     frames_before = min(int(request.args.get('frames_before', 3)), 10)
     frames_after = min(int(request.args.get('frames_after', 3)), 10)
@@ -147,21 +242,119 @@ def get_subtitle(subtitle_id):
 @app.route('/v1/episode/<episode_id>', methods=['GET'])
 @require_api_key
 @rate_limit
+@cached_response
 def get_episode_subtitles(episode_id):
     # Validate episode_id format (e.g., S01E04)
     if not (len(episode_id) == 6 and episode_id[0] == 'S' and episode_id[3] == 'E'):
         return jsonify({"error": "Invalid episode ID format. Expected format: S01E04"}), 400
     
-    page = int(request.args.get('page', 1))
-    limit = min(int(request.args.get('limit', 50)), 100)  # Max limit is 100
+    try:
+        page, limit = page_args(50, 100)
+    except ValueError:
+        return jsonify({"error": "page and limit must be whole numbers of at least 1"}), 400
     
-    result = db.get_episode_subtitles(episode_id, page, limit)
+    # A cursor parameter (even an empty one) switches to keyset pagination
+    cursor = request.args.get('cursor')
+    include_total = request.args.get('include_total', 'true' if cursor is None else 'false').lower() == 'true'
+    
+    try:
+        result = db.get_episode_subtitles(episode_id, page, limit, cursor=cursor, include_total=include_total)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
     
     if not result:
         return jsonify({"error": f"Episode {episode_id} not found"}), 404
     
     return jsonify(result)
 
+@app.route('/v1/frame/<episode>/<int:frame>', methods=['GET'])
+@require_api_key
+@rate_limit
+def get_subtitle_at_frame(episode, frame):
+    """Get the subtitle on screen at a frame number"""
+    if not EPISODE_PATTERN.match(episode):
+        return jsonify({"error": "Invalid episode ID format. Expected format: S01E04"}), 400
+    
+    intervals = subtitle_index.episode(episode)
+    if intervals is None:
+        return jsonify({"error": f"Episode {episode} not found"}), 404
+    
+    return jsonify(dict(intervals.at_frame(frame), episode=episode, frame=frame))
+
+@app.route('/v1/at/<episode>', methods=['GET'])
+@require_api_key
+@rate_limit
+def get_subtitle_at_time(episode):
+    """Get the subtitle on screen at a time, given as seconds or HH:MM:SS,mmm"""
+    if not EPISODE_PATTERN.match(episode):
+        return jsonify({"error": "Invalid episode ID format. Expected format: S01E04"}), 400
+    
+    try:
+        milliseconds = parse_time_ms(request.args.get('t', ''))
+    except (ValueError, OverflowError):
+        return jsonify({"error": "t must be seconds or a timestamp like 00:12:34,500"}), 400
+    
+    intervals = subtitle_index.episode(episode)
+    if intervals is None:
+        return jsonify({"error": f"Episode {episode} not found"}), 404
+    
+    return jsonify(dict(intervals.at_time(milliseconds), episode=episode, t=milliseconds / 1000))
+
+@app.route('/v1/range/<episode>', methods=['GET'])
+@require_api_key
+@rate_limit
+@cached_response
+def get_subtitles_in_range(episode):
+    """Get the subtitles on screen between two times, given as seconds or HH:MM:SS,mmm"""
+    if not EPISODE_PATTERN.match(episode):
+        return jsonify({"error": "Invalid episode ID format. Expected format: S01E04"}), 400
+    
+    try:
+        start_ms = parse_time_ms(request.args.get('start', ''))
+        end_ms = parse_time_ms(request.args.get('end', ''))
+    except (ValueError, OverflowError):
+        return jsonify({"error": "start and end must be seconds or timestamps like 00:12:34,500"}), 400
+    
+    if end_ms < start_ms:
+        return jsonify({"error": "end must not be before start"}), 400
+    if end_ms - start_ms > config.get('api.max_range_seconds', 600) * 1000:
+        return jsonify({"error": f"Range is longer than {config.get('api.max_range_seconds', 600)} seconds"}), 400
+    
+    return jsonify({
+        "episode": episode,
+        "start_ms": start_ms,
+        "end_ms": end_ms,
+        "subtitles": db.get_subtitles_between(episode, start_ms, end_ms)
+    })
+
+def parse_time_ms(value):
+    """Parse a time given as seconds or an HH:MM:SS,mmm timestamp to integer milliseconds"""
+    value = str(value).strip()
+    return round((parse_timestamp(value) if ':' in value else float(value)) * 1000)
+
+def clip_range_ms(data):
+    """Get a clip request's (start_ms, end_ms), from start_ms/end_ms or the start_time/end_time timestamps"""
+    if 'start_ms' in data and 'end_ms' in data:
+        return int(data['start_ms']), int(data['end_ms'])
+    return parse_time_ms(data['start_time']), parse_time_ms(data['end_time'])
+
+def page_args(default_limit, max_limit):
+    """Get the page and limit query parameters, raising ValueError unless they're whole numbers of at least 1"""
+    page = int(request.args.get('page', 1))
+    limit = int(request.args.get('limit', default_limit))
+    if page < 1 or limit < 1:
+        raise ValueError("page and limit must be at least 1")
+    return page, min(limit, max_limit)
+
+def int_field(data, field):
+    """Get an optional whole-number request field, raising ValueError for anything else"""
+    value = data.get(field)
+    if value is None:
+        return None
+    if isinstance(value, bool) or (isinstance(value, float) and not value.is_integer()):
+        raise ValueError(f"{field} must be a whole number")
+    return int(value)
+
 @app.route('/v1/create/meme', methods=['POST'])
 @require_api_key
 @rate_limit
@@ -173,17 +366,24 @@ def create_meme():
         if field not in data:
             return jsonify({"error": f"Missing required field: {field}"}), 400
     
+    try:
+        subtitle_id = int_field(data, 'subtitle_id')
+        frame_id = int_field(data, 'frame_id')  # If not provided, use the subtitle's main frame
+    except (TypeError, ValueError, OverflowError):
+        return jsonify({"error": "subtitle_id and frame_id must be whole numbers"}), 400
+    
     # Default values
-    frame_id = data.get('frame_id')  # If not provided, use the subtitle's main frame
     font = data.get('font', 'impact')
     text_color = data.get('text_color', '#ffffff')
     outline_color = data.get('outline_color', '#000000')
     
     try:
         generator = MemeGenerator()
-        meme_id = str(uuid.uuid4())[:8]  # Generate a unique ID
+        # Identical requests share one ID, so repeated memes are served from the first render
+        meme_id = media_id('meme', subtitle_id=subtitle_id, text=data['text'], frame_id=frame_id,
+                           font=font, text_color=text_color, outline_color=outline_color)
         meme_url = generator.create_meme(
-            subtitle_id=data['subtitle_id'],
+            subtitle_id=subtitle_id,
             frame_id=frame_id,
             text=data['text'],
             font=font,
@@ -192,13 +392,10 @@ def create_meme():
             meme_id=meme_id
         )
         
-        # Calculate expiry date (7 days from now)
-        expires_at = (datetime.datetime.utcnow() + datetime.timedelta(days=7)).isoformat() + "Z"
-        
         return jsonify({
             "meme_id": meme_id,
             "url": meme_url,
-            "expires_at": expires_at
+            "expires_at": media_expiry(config.media_output_dir / "memes" / f"{meme_id}.jpg")
         })
     except Exception as e:
         logger.exception("Error creating meme")
@@ -215,150 +412,232 @@ def create_gif():
         if field not in data:
             return jsonify({"error": f"Missing required field: {field}"}), 400
     
-    # Default values
-    caption = data.get('caption', True)
-    speed = data.get('speed', 1.0)
-    quality = data.get('quality', 'medium')
-    
     try:
-        generator = GifGenerator()
-        gif_id = str(uuid.uuid4())[:8]  # Generate a unique ID
-        gif_url = generator.create_gif(
-            subtitle_id=data['subtitle_id'],
-            start_frame=data['start_frame'],
-            end_frame=data['end_frame'],
-            caption=caption,
-            speed=speed,
-            quality=quality,
-            gif_id=gif_id
-        )
-        
-        # Calculate expiry date (7 days from now)
-        expires_at = (datetime.datetime.utcnow() + datetime.timedelta(days=7)).isoformat() + "Z"
-        
-        return jsonify({
-            "gif_id": gif_id,
-            "url": gif_url,
-            "expires_at": expires_at
-        })
-    except Exception as e:
-        logger.exception("Error creating GIF")
-        return jsonify({"error": str(e)}), 500
+        subtitle_id = int_field(data, 'subtitle_id')
+        start_frame = int_field(data, 'start_frame')
+        end_frame = int_field(data, 'end_frame')
+        speed = float(data.get('speed', 1.0))
+    except (TypeError, ValueError, OverflowError):
+        return jsonify({"error": "subtitle_id, start_frame, end_frame and speed must be numbers"}), 400
+    if start_frame < 0 or end_frame < start_frame:
+        return jsonify({"error": "GIF must end at or after its first frame"}), 400
+    max_frames = config.get('gif.max_frames', 600)
+    if end_frame - start_frame + 1 > max_frames:
+        return jsonify({"error": f"GIF is longer than {max_frames} frames"}), 400
+    if not math.isfinite(speed) or speed <= 0:
+        return jsonify({"error": "Speed must be a positive number"}), 400
+    
+    # Fail fast on unknown subtitles instead of queueing a job that can't succeed
+    if not db.get_subtitle_info(subtitle_id):
+        return jsonify({"error": ERROR_CODES[404]}), 404
+    
+    params = {
+        "subtitle_id": subtitle_id,
+        "start_frame": start_frame,
+        "end_frame": end_frame,
+        "caption": data.get('caption', True),
+        "speed": speed,
+        "quality": data.get('quality', 'medium')
+    }
+    gif_id = media_id('gif', **params)
+    
+    # An identical GIF was already generated, no job needed
+    if touch_media(config.media_output_dir / "gifs" / f"{gif_id}.gif"):
+        return media_ready("gif", gif_id, "gif")
+    
+    job_id = job_queue.submit('gif', dict(params, gif_id=gif_id), key=f"gif/{gif_id}")
+    return job_accepted(job_id, gif_id=gif_id)
 
 @app.route('/v1/create/clip', methods=['POST'])
 @require_api_key
+@require_tier(['premium'], "Creating video clips requires a premium subscription")
 @rate_limit
 def create_clip():
-    # Check if user is allowed to create clips
-    if g.api_tier not in ['premium']:
-        return jsonify({
-            "error": "Creating video clips requires a premium subscription"
-        }), 403
-    
     data = request.json
     
-    required_fields = ['subtitle_id', 'start_time', 'end_time']
+    # The range is given either in milliseconds or as timestamps
+    range_fields = ['start_ms', 'end_ms'] if 'start_ms' in data or 'end_ms' in data else ['start_time', 'end_time']
+    required_fields = ['subtitle_id'] + range_fields
     for field in required_fields:
         if field not in data:
             return jsonify({"error": f"Missing required field: {field}"}), 400
     
-    # Default values
-    caption = data.get('caption', True)
-    format = data.get('format', 'mp4')
-    quality = data.get('quality', 'medium')
+    try:
+        start_ms, end_ms = clip_range_ms(data)
+    except (TypeError, ValueError, OverflowError):
+        return jsonify({"error": "Invalid clip range"}), 400
+    if start_ms < 0 or end_ms <= start_ms:
+        return jsonify({"error": "Clip must end after it starts"}), 400
     
     try:
-        generator = ClipGenerator()
-        clip_id = str(uuid.uuid4())[:8]  # Generate a unique ID
-        clip_url = generator.create_clip(
-            subtitle_id=data['subtitle_id'],
-            start_time=data['start_time'],
-            end_time=data['end_time'],
-            caption=caption,
-            format=format,
-            quality=quality,
-            clip_id=clip_id
+        subtitle_id = int_field(data, 'subtitle_id')
+    except (TypeError, ValueError, OverflowError):
+        return jsonify({"error": "subtitle_id must be a whole number"}), 400
+    
+    if not db.get_subtitle_info(subtitle_id):
+        return jsonify({"error": ERROR_CODES[404]}), 404
+    
+    format = data.get('format', 'mp4')
+    if format not in ['mp4', 'webm']:
+        return jsonify({"error": f"Unsupported format: {format}"}), 400
+    
+    params = {
+        "subtitle_id": subtitle_id,
+        "start_ms": start_ms,
+        "end_ms": end_ms,
+        "caption": data.get('caption', True),
+        "format": format,
+        "quality": data.get('quality', 'medium')
+    }
+    clip_id = media_id('clip', **params)
+    
+    if touch_media(config.media_output_dir / "clips" / f"{clip_id}.{format}"):
+        return media_ready("clip", clip_id, format)
+    
+    job_id = job_queue.submit('clip', dict(params, clip_id=clip_id), key=f"clip/{clip_id}")
+    return job_accepted(job_id, clip_id=clip_id)
+
+def media_expiry(path, fallback=None):
+    """Get when a generated file expires as ISO 8601 UTC, from the media manifest"""
+    expires_at = media_manifest.expires_at(path)
+    if expires_at is None:
+        # Not recorded (yet); assume it was just used
+        expires_at = fallback or time.time() + config.get('cdn.file_expiry_days', 7) * 86400
+    return format_job_time(expires_at)
+
+def media_ready(file_type, file_id, extension):
+    """Build the response for media that already exists"""
+    return jsonify({
+        f"{file_type}_id": file_id,
+        "status": DONE,
+        "url": f"{config.get('cdn.base_url')}/{file_type}s/{file_id}.{extension}",
+        "expires_at": media_expiry(config.media_output_dir / f"{file_type}s" / f"{file_id}.{extension}")
+    })
+
+def job_accepted(job_id, **ids):
+    """Build the 202 response for a queued generation job"""
+    status_url = f"/{config.get('api.version', 'v1')}/jobs/{job_id}"
+    response = jsonify({
+        "job_id": job_id,
+        "status": "queued",
+        "status_url": status_url,
+        **ids
+    })
+    response.status_code = 202
+    response.headers['Location'] = status_url
+    return response
+
+def format_job_time(timestamp):
+    """Format a job timestamp as ISO 8601 UTC, or None if it isn't set"""
+    if timestamp is None:
+        return None
+    return datetime.datetime.utcfromtimestamp(timestamp).isoformat() + "Z"
+
+@app.route('/v1/jobs/<job_id>', methods=['GET'])
+@require_api_key
+def get_job(job_id):
+    """Get the status of a GIF or clip generation job"""
+    job = job_queue.get(job_id)
+    if job is None:
+        return jsonify({"error": ERROR_CODES[404]}), 404
+    
+    result = {
+        "job_id": job['id'],
+        "type": job['kind'],
+        "status": job['status'],
+        "created_at": format_job_time(job['created_at']),
+        "started_at": format_job_time(job['started_at']),
+        "finished_at": format_job_time(job['finished_at'])
+    }
+    
+    if job['status'] == DONE:
+        expiry = datetime.timedelta(days=config.get('cdn.file_expiry_days', 7))
+        result["url"] = job['result']
+        file_name = job['result'].rsplit('/', 1)[-1]
+        result["expires_at"] = media_expiry(
+            config.media_output_dir / f"{job['kind']}s" / file_name,
+            fallback=job['finished_at'] + expiry.total_seconds()
         )
-        
-        # Calculate expiry date (7 days from now)
-        expires_at = (datetime.datetime.utcnow() + datetime.timedelta(days=7)).isoformat() + "Z"
-        
-        return jsonify({
-            "clip_id": clip_id,
-            "url": clip_url,
-            "expires_at": expires_at
-        })
-    except Exception as e:
-        logger.exception("Error creating clip")
-        return jsonify({"error": str(e)}), 500
+    elif job['status'] == FAILED:
+        result["error"] = job['error']
+    
+    response = jsonify(result)
+    if job['status'] not in (DONE, FAILED):
+        # Hint for clients polling until the job finishes
+        response.headers['Retry-After'] = str(max(1, int(config.get('jobs.poll_interval', 1.0))))
+    return response
 
 # Static file serving routes
-@app.route('/frames/<episode>/<frame_id>.jpg', methods=['GET'])
-def serve_frame(episode, frame_id):
-    """Serve a frame image"""
-    try:
-        # Parse episode ID to get season and episode
-        season_num = int(episode[1:3])
-        episode_num = int(episode[4:6])
-        
-        # Extract frame number from frame_id
-        frame_num = int(frame_id)
-        
-        # Build path to frame
-        frame_dir = config.static_dir / f"Season {season_num}" / episode / "frames"
-        
-        # Look for the frame file (may be named with zero padding)
-        frame_path = frame_dir / f"frame_{frame_num:010d}.jpg"
-        
-        if not frame_path.exists():
-            # Try alternative naming formats if the expected one doesn't exist
-            for file in frame_dir.glob(f"*{frame_num}*.jpg"):
-                frame_path = file
-                break
-            else:
-                abort(404)
-        
-        return send_from_directory(frame_path.parent, frame_path.name)
-    except Exception as e:
-        logger.exception(f"Error serving frame: {e}")
+def send_image(episode, kind, number):
+    """Send a frame or thumbnail from the episode's packed archive or loose files"""
+    # Resolved from cached archive indexes and directory listings, no filesystem probing per request
+    pack = frame_index.pack(episode, kind)
+    if pack is None:
+        image_path = frame_index.lookup(episode, kind, number)
+        if image_path is None:
+            abort(404)
+        return send_from_directory(image_path.parent, image_path.name, max_age=config.get('frames.max_age', 604800))
+    
+    entry = pack.entry(number)
+    if entry is None:
         abort(404)
+    offset, length = entry
+    
+    file_wrapper = request.environ.get('wsgi.file_wrapper')
+    image_file = pack.open_data() if file_wrapper is not None else None
+    if image_file is None:
+        # Without server support, or once the archive has been rebuilt under
+        # this process, copy the bytes out of the memory-mapped archive
+        body = pack.read(number)
+    else:
+        # WSGI servers send at most Content-Length bytes from the file's current
+        # position; gunicorn does this with os.sendfile, without copying
+        image_file.seek(offset)
+        body = file_wrapper(image_file)
+    
+    response = app.response_class(body, mimetype='image/jpeg', direct_passthrough=True)
+    response.content_length = length
+    # The same validators and caching send_from_directory gives loose files, so clients can revalidate with a 304
+    response.set_etag(f"{pack.generation.hex()}-{offset:x}-{length:x}")
+    response.last_modified = pack.mtime_ns // 1_000_000_000
+    response.cache_control.public = True
+    response.cache_control.max_age = config.get('frames.max_age', 604800)
+    return response.make_conditional(request)
+
+@app.route('/frames/<episode>/<frame_id>.<format>', methods=['GET'])
+def serve_frame(episode, frame_id, format):
+    """Serve a frame image, optionally scaled to ?w= pixels wide or as WebP"""
+    if not EPISODE_PATTERN.match(episode) or not frame_id.isdigit() or format not in FrameResizer.FORMATS:
+        abort(404)
+    
+    width = request.args.get('w')
+    if width is None and format == 'jpg':
+        return send_image(episode, "frames", int(frame_id))
+    
+    if width is not None and (not width.isdigit() or int(width) == 0):
+        abort(400)
+    
+    # Generated on the first request for each size, then served from the derivative cache
+    frame_path = frame_resizer.get_derivative(episode, int(frame_id), int(width) if width else None, format)
+    if frame_path is None:
+        abort(404)
+    # send_from_directory adds Last-Modified and an ETag and answers conditional requests with 304
+    return send_from_directory(frame_path.parent, frame_path.name, max_age=config.get('frames.max_age', 604800))
 
 @app.route('/thumbnails/<episode>/<index>.jpg', methods=['GET'])
 def serve_thumbnail(episode, index):
     """Serve a thumbnail image"""
-    try:
-        # Parse episode ID to get season and episode
-        season_num = int(episode[1:3])
-        episode_num = int(episode[4:6])
-        
-        # Extract thumbnail index
-        thumb_idx = int(index)
-        
-        # Build path to thumbnail
-        thumb_dir = config.static_dir / f"Season {season_num}" / episode / "thumbnails"
-        
-        # Look for the thumbnail file (may be named with zero padding)
-        thumb_path = thumb_dir / f"thumb_{thumb_idx:010d}.jpg"
-        
-        if not thumb_path.exists():
-            # Try alternative naming formats if the expected one doesn't exist
-            for file in thumb_dir.glob(f"*{thumb_idx}*.jpg"):
-                thumb_path = file
-                break
-            else:
-                abort(404)
-        
-        return send_from_directory(thumb_path.parent, thumb_path.name)
-    except Exception as e:
-        logger.exception(f"Error serving thumbnail: {e}")
+    if not EPISODE_PATTERN.match(episode) or not index.isdigit():
         abort(404)
+    
+    return send_image(episode, "thumbnails", int(index))
 
 @app.route('/memes/<meme_id>.jpg', methods=['GET'])
 def serve_meme(meme_id):
     """Serve a generated meme image"""
     try:
-        meme_path = config.get('media_output_dir', 'media_output') / "memes" / f"{meme_id}.jpg"
-        if not os.path.exists(meme_path):
+        meme_path = config.media_output_dir / "memes" / f"{meme_id}.jpg"
+        if not touch_media(meme_path):
             abort(404)
         return send_from_directory(meme_path.parent, meme_path.name)
     except Exception as e:
@@ -369,8 +648,8 @@ def serve_meme(meme_id):
 def serve_gif(gif_id):
     """Serve a generated GIF"""
     try:
-        gif_path = config.get('media_output_dir', 'media_output') / "gifs" / f"{gif_id}.gif"
-        if not os.path.exists(gif_path):
+        gif_path = config.media_output_dir / "gifs" / f"{gif_id}.gif"
+        if not touch_media(gif_path):
             abort(404)
         return send_from_directory(gif_path.parent, gif_path.name)
     except Exception as e:
@@ -386,8 +665,8 @@ def serve_clip(clip_id, format):
         if format not in allowed_formats:
             abort(400)
             
-        clip_path = config.get('media_output_dir', 'media_output') / "clips" / f"{clip_id}.{format}"
-        if not os.path.exists(clip_path):
+        clip_path = config.media_output_dir / "clips" / f"{clip_id}.{format}"
+        if not touch_media(clip_path):
             abort(404)
         return send_from_directory(clip_path.parent, clip_path.name)
     except Exception as e:
@@ -401,7 +680,14 @@ def health_check():
         "status": "ok",
         "version": config.get('api.version', 'v1'),
         "environment": config.get('environment'),
-        "timestamp": datetime.datetime.utcnow().isoformat()
+        "timestamp": datetime.datetime.utcnow().isoformat(),
+        "database": db.current_path.name,
+        "database_pool": db.pool.stats(),
+        "response_cache": response_cache.stats(),
+        "jobs": job_queue.stats(),
+        "text_cache": text_cache.stats(),
+        "api_keys": api_keys.stats(),
+        "media": media_manifest.stats()
     })
 
 if __name__ == '__main__':
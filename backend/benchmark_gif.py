@@ -0,0 +1,105 @@
+#!/usr/bin/env python3
+"""
+Script to measure GIF frame throughput for each quality setting
+Runs the decode, resize and caption pipeline over a range of frames, once
+serially and once on the shared frame pool, then times a complete GIF
+with the configured encoder (gif.encoder, gif.delta_frames)
+"""
+
+import io
+import sys
+import time
+import logging
+import argparse
+from pathlib import Path
+
+# Add the parent directory to the path so we can import the application modules
+parent_dir = Path(__file__).resolve().parent
+sys.path.append(str(parent_dir))
+
+# Configure logging
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger(__name__)
+
+from config import config
+from frame_store import frame_index
+from media_generator import GifGenerator
+
+
+def best_time(func, repeat):
+    """Run func `repeat` times and return the fastest wall time and the last result"""
+    best = None
+    result = None
+    for _ in range(repeat):
+        started = time.perf_counter()
+        result = func()
+        elapsed = time.perf_counter() - started
+        best = elapsed if best is None else min(best, elapsed)
+    return best, result
+
+
+def benchmark_quality(generator, episode, frames, quality, caption, repeat):
+    """Time the serial and pooled frame pipelines and the encoder for one quality level"""
+    settings = generator.QUALITY_SETTINGS[quality]
+    width, height = generator.frame_size(episode, frames[0])
+    size = (int(width * settings['size']), int(height * settings['size']))
+    overlay = generator.render_caption(size, caption) if caption else None
+
+    serial, _ = best_time(
+        lambda: [generator.prepare_frame(episode, frame, size, overlay) for frame in frames], repeat
+    )
+    pooled, _ = best_time(
+        lambda: list(generator.render_frames(episode, frames, size, overlay)), repeat
+    )
+
+    def encode():
+        output = io.BytesIO()
+        generator.write_gif(output, episode, frames, size, overlay, 1.0 / settings['fps'])
+        return output.getbuffer().nbytes
+
+    encoded, gif_bytes = best_time(encode, repeat)
+    return {
+        "quality": quality,
+        "size": f"{size[0]}x{size[1]}",
+        "serial": len(frames) / serial,
+        "pooled": len(frames) / pooled,
+        "gif": len(frames) / encoded,
+        "bytes": gif_bytes
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark GIF frame throughput")
+    parser.add_argument('--episode', required=True, help="Episode to read frames from (e.g. S01E04)")
+    parser.add_argument('--start', type=int, default=None, help="First frame (defaults to the episode's first frame)")
+    parser.add_argument('--frames', type=int, default=48, help="Number of frames per GIF")
+    parser.add_argument('--repeat', type=int, default=3, help="Runs per measurement, the fastest is reported")
+    parser.add_argument('--caption', default="I've got a secret. The vice presidency is not a real job.",
+                        help="Caption text (empty for none)")
+    args = parser.parse_args()
+
+    pack = frame_index.pack(args.episode)
+    numbers = list(range(pack.first_frame, pack.first_frame + len(pack))) if pack else list(frame_index.directory(args.episode).numbers)
+    if args.start is not None:
+        numbers = [number for number in numbers if number >= args.start]
+    frames = [number for number in numbers if frame_index.has(args.episode, "frames", number)][:args.frames]
+    if not frames:
+        logger.error(f"No frames found for {args.episode}")
+        sys.exit(1)
+
+    generator = GifGenerator()
+    logger.info(f"{args.episode}: {len(frames)} frames from {frames[0]}, frame pool of {config.get('gif.workers') or 'CPU count'} threads")
+    logger.info(f"Encoder: {config.get('gif.encoder', 'streaming')}, delta frames: {config.get('gif.delta_frames', False)}")
+
+    print(f"{'quality':<8} {'size':>10} {'serial fps':>11} {'pooled fps':>11} {'gif fps':>11} {'gif bytes':>10}")
+    for quality in generator.QUALITY_SETTINGS:
+        result = benchmark_quality(generator, args.episode, frames, quality, args.caption, args.repeat)
+        print(f"{result['quality']:<8} {result['size']:>10} {result['serial']:>11.1f} "
+              f"{result['pooled']:>11.1f} {result['gif']:>11.1f} {result['bytes']:>10}")
+
+
+if __name__ == "__main__":
+    main()
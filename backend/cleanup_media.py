@@ -7,6 +7,7 @@ Can be scheduled as a cron job or Windows scheduled task
 import os
 import sys
 import logging
+import argparse
 from pathlib import Path
 
 # Add the parent directory to the path so we can import the application modules
@@ -24,5 +25,13 @@ logging.basicConfig(
 from utils import cleanup_expired_media
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Delete expired generated media")
+    parser.add_argument('--rescan', action='store_true',
+                        help="Add files missing from the media manifest (e.g. generated before it existed) first")
+    args = parser.parse_args()
+    
     # Run the cleanup
-    cleanup_expired_media()
+    result = cleanup_expired_media(rescan=args.rescan)
+    if result is None:
+        sys.exit(1)
+    print(f"Freed {result['freed_bytes']} bytes ({result['expired']} expired, {result['evicted']} evicted files)")
@@ -22,6 +22,21 @@ class Config:
                 "environment": os.environ.get("VEEPIAC_ENV", "development"),
                 "static_dir": os.environ.get("VEEPIAC_STATIC_DIR", "./static"),
                 "database_path": os.environ.get("VEEPIAC_DB_PATH", "./static/subtitles.db"),
+                "database": {
+                    "backend": "sqlite",
+                    "pool_size": 8,
+                    "pool_timeout": 10.0,
+                    "read_only": True,
+                    "immutable": False,
+                    "wal": True,
+                    "pragmas": {
+                        "cache_size": -65536,
+                        "mmap_size": 268435456,
+                        "temp_store": "MEMORY"
+                    },
+                    "version_check_interval": 1.0,
+                    "keep_versions": 3
+                },
                 "server": {
                     "host": os.environ.get("VEEPIAC_HOST", "127.0.0.1"),
                     "port": int(os.environ.get("VEEPIAC_PORT", 5000)),
@@ -33,11 +48,67 @@ class Config:
                         "free": 100,
                         "standard": 1000,
                         "premium": 5000
-                    }
+                    },
+                    "rate_limit_period": 86400,
+                    "rate_limit_costs": {
+                        "create_meme": 5,
+                        "create_gif": 20,
+                        "create_clip": 50
+                    },
+                    "rate_limit_db_path": None,
+                    "keys_db_path": None,
+                    "key_cache_ttl": 300,
+                    "key_negative_ttl": 60,
+                    "key_refresh_interval": 5.0,
+                    "max_range_seconds": 600
                 },
                 "cdn": {
                     "base_url": os.environ.get("VEEPIAC_CDN_URL", "https://cdn.veepiac.com"),
                     "file_expiry_days": 7
+                },
+                "search": {
+                    "tokenizer": "porter unicode61 remove_diacritics 2"
+                },
+                "gif": {
+                    "workers": None,
+                    "encoder": "streaming",
+                    "delta_frames": False,
+                    "palette_samples": 8,
+                    "max_frames": 600,
+                    "max_memory": 268435456
+                },
+                "fonts": {
+                    "text_cache_bytes": 33554432
+                },
+                "keyframes": {
+                    "count": 3
+                },
+                "cache": {
+                    "enabled": True,
+                    "max_bytes": 67108864,
+                    "ttl": 3600,
+                    "max_age": 300,
+                    "version_check_interval": 1.0
+                },
+                "clips": {
+                    "stream_copy": True
+                },
+                "frames": {
+                    "widths": [160, 320, 480, 640, 960, 1280],
+                    "cache_max_bytes": 1073741824,
+                    "max_age": 604800
+                },
+                "media": {
+                    "sweep_interval": 3600,
+                    "max_bytes": None,
+                    "manifest_path": None
+                },
+                "jobs": {
+                    "run_in_app": True,
+                    "workers": 2,
+                    "poll_interval": 1.0,
+                    "timeout": 600,
+                    "max_attempts": 2
                 }
             }
             self.save_config()
@@ -134,7 +205,7 @@ class Config:
         path.mkdir(exist_ok=True)
         
         # Create subdirectories
-        for subdir in ['memes', 'gifs', 'clips']:
+        for subdir in ['memes', 'gifs', 'clips', 'segments', 'subtitles', 'derivatives']:
             (path / subdir).mkdir(exist_ok=True)
             
         return path
@@ -0,0 +1,149 @@
+import os
+import queue
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+from pathlib import Path
+
+# Pragmas applied to every pooled connection unless overridden in config
+DEFAULT_PRAGMAS = {
+    "cache_size": -65536,       # 64 MiB page cache (negative values are KiB)
+    "mmap_size": 268435456,     # Map up to 256 MiB of the file
+    "temp_store": "MEMORY"      # Keep sorts and temp b-trees off disk
+}
+
+
+class PoolTimeout(Exception):
+    """Raised when no pooled connection becomes free in time"""
+
+
+class ConnectionPool:
+    """Bounded pool of persistent read-only SQLite connections"""
+
+    def __init__(self, db_path, size=8, timeout=10.0, pragmas=None, read_only=True, immutable=False):
+        """Initialize an empty pool; connections are opened on demand up to `size`"""
+        self.db_path = Path(db_path)
+        self.size = max(1, int(size))
+        self.timeout = timeout
+        self.pragmas = dict(DEFAULT_PRAGMAS, **(pragmas or {}))
+        self.read_only = read_only
+        self.immutable = immutable
+
+        self._lock = threading.Lock()
+        self._closed = False
+        self._reset()
+
+    def _reset(self):
+        """Forget all connections, e.g. after the worker process has been forked"""
+        self._idle = queue.LifoQueue()
+        self._opened = 0
+        self._pid = os.getpid()
+        self._stats = {"hits": 0, "misses": 0, "waits": 0, "wait_time": 0.0, "timeouts": 0}
+
+    def _connect(self):
+        """Open and configure a new connection"""
+        if self.read_only:
+            uri = f"{self.db_path.resolve().as_uri()}?mode=ro"
+            if self.immutable:
+                uri += "&immutable=1"
+            conn = sqlite3.connect(uri, uri=True, check_same_thread=False)
+        else:
+            conn = sqlite3.connect(self.db_path, check_same_thread=False)
+
+        conn.row_factory = sqlite3.Row
+        for name, value in self.pragmas.items():
+            if not name.isidentifier():
+                raise ValueError(f"Invalid pragma name: {name}")
+            conn.execute(f"PRAGMA {name} = {value}")
+        return conn
+
+    def acquire(self):
+        """Take a connection from the pool, opening or waiting for one as needed"""
+        with self._lock:
+            if self._pid != os.getpid():
+                # Connections must not be shared across fork()
+                self._reset()
+
+            try:
+                conn = self._idle.get_nowait()
+                self._stats["hits"] += 1
+                return conn
+            except queue.Empty:
+                pass
+
+            if self._opened < self.size:
+                self._opened += 1
+                self._stats["misses"] += 1
+                create = True
+            else:
+                self._stats["waits"] += 1
+                create = False
+
+        if create:
+            try:
+                return self._connect()
+            except Exception:
+                with self._lock:
+                    self._opened -= 1
+                raise
+
+        started = time.perf_counter()
+        try:
+            conn = self._idle.get(timeout=self.timeout)
+        except queue.Empty:
+            with self._lock:
+                self._stats["timeouts"] += 1
+            raise PoolTimeout(f"No database connection available after {self.timeout}s")
+        finally:
+            with self._lock:
+                self._stats["wait_time"] += time.perf_counter() - started
+        return conn
+
+    def release(self, conn):
+        """Return a connection to the pool"""
+        if self._closed:
+            self.discard(conn)
+            return
+        if conn.in_transaction:
+            conn.rollback()
+        self._idle.put(conn)
+
+    def discard(self, conn):
+        """Close a connection that should not be reused"""
+        with self._lock:
+            self._opened -= 1
+        conn.close()
+
+    @contextmanager
+    def connection(self):
+        """Context manager that borrows a connection for the duration of the block"""
+        conn = self.acquire()
+        try:
+            yield conn
+        finally:
+            self.release(conn)
+
+    def clear(self):
+        """Close all idle connections so the next requests reopen them"""
+        while True:
+            try:
+                conn = self._idle.get_nowait()
+            except queue.Empty:
+                break
+            self.discard(conn)
+
+    def close(self):
+        """Retire the pool: idle connections are closed now, borrowed ones when they're returned"""
+        self._closed = True
+        self.clear()
+
+    def stats(self):
+        """Get pool usage metrics"""
+        with self._lock:
+            stats = dict(self._stats)
+            stats["wait_time"] = round(stats["wait_time"], 6)
+            stats["size"] = self.size
+            stats["open"] = self._opened
+            stats["idle"] = self._idle.qsize()
+        return stats
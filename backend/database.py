@@ -1,6 +1,182 @@
+import re
+import time
+import base64
+import logging
 import sqlite3
+import threading
+from collections import OrderedDict
 from contextlib import contextmanager
+from pathlib import Path
 from config import config
+from connection_pool import ConnectionPool
+
+logger = logging.getLogger(__name__)
+
+# Default FTS5 tokenizer; porter stemming lets "running" match "run"
+DEFAULT_FTS_TOKENIZER = "porter unicode61 remove_diacritics 2"
+
+# Number of distinct COUNT(*) results kept for pagination totals
+COUNT_CACHE_SIZE = 1024
+
+# Longest a subtitle is assumed to stay on screen, bounding time-range scans
+MAX_SUBTITLE_MS = 60000
+
+# Tables of a subtitles.db built from scratch by ingest.py, as in the original export
+CORPUS_SCHEMA = """
+    CREATE TABLE IF NOT EXISTS subtitles (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        episode INTEGER,
+        season INTEGER,
+        file_path TEXT,
+        subtitle_number INTEGER,
+        timestamp TEXT,
+        timestamp_start TEXT,
+        timestamp_end TEXT,
+        content TEXT,
+        start_frame INTEGER,
+        end_frame INTEGER
+    );
+    
+    CREATE TABLE IF NOT EXISTS episodes (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        season INTEGER,
+        episode_of_season INTEGER,
+        episode_overall INTEGER,
+        title TEXT,
+        air_date TEXT,
+        UNIQUE(season, episode_of_season)
+    );
+    
+    CREATE TABLE IF NOT EXISTS ingested_episodes (
+        episode_code TEXT PRIMARY KEY,
+        file_hash TEXT NOT NULL,
+        subtitle_count INTEGER NOT NULL,
+        ingested_at REAL NOT NULL
+    );
+"""
+
+# Indexes of the original export, created after a bulk load instead of maintained during it
+CORPUS_INDEXES = """
+    CREATE INDEX IF NOT EXISTS idx_subtitles_episode ON subtitles(episode);
+    CREATE INDEX IF NOT EXISTS idx_subtitles_season ON subtitles(season);
+    CREATE INDEX IF NOT EXISTS idx_subtitles_content ON subtitles(content);
+    CREATE INDEX IF NOT EXISTS idx_subtitles_frames ON subtitles(start_frame, end_frame);
+    CREATE INDEX IF NOT EXISTS idx_episodes_season ON episodes(season);
+    CREATE INDEX IF NOT EXISTS idx_episodes_title ON episodes(title);
+"""
+
+# Columns of a subtitle row given to Database.ingest_episodes, in order
+INGEST_COLUMNS = (
+    'subtitle_number', 'timestamp', 'timestamp_start', 'timestamp_end', 'content',
+    'start_frame', 'end_frame', 'start_ms', 'end_ms'
+)
+
+# Terms are either "quoted phrases" or bare words, optionally ending in * for prefix search
+SEARCH_TERM_PATTERN = re.compile(r'"([^"]*)"(\*?)|(\S+)')
+
+
+def parse_search_terms(query):
+    """
+    Split a user search string into (text, is_prefix) terms
+    
+    Quoted text is kept together as a phrase and a trailing * marks a prefix
+    term. Punctuation-only terms are dropped.
+    """
+    terms = []
+    for match in SEARCH_TERM_PATTERN.finditer(query):
+        phrase, phrase_prefix, word = match.groups()
+        if phrase is not None:
+            text, prefix = phrase, bool(phrase_prefix)
+        else:
+            prefix = word.endswith('*')
+            text = word.rstrip('*')
+        
+        # Drop punctuation-only terms, the tokenizer would discard them anyway
+        if not re.search(r'\w', text):
+            continue
+        
+        terms.append((text, prefix))
+    
+    return terms
+
+
+def build_match_query(query):
+    """
+    Translate a user search string into an FTS5 MATCH expression
+    
+    Quoted text becomes a phrase query and a trailing * makes a prefix query.
+    Every term is quoted so FTS5 operators typed by users are treated as text.
+    All terms must match. Returns None if nothing searchable is left.
+    """
+    terms = []
+    for text, prefix in parse_search_terms(query):
+        text = text.replace('"', '""')
+        terms.append(f'"{text}"' + ('*' if prefix else ''))
+    
+    return ' '.join(terms) if terms else None
+
+
+def default_frame_indices(start_frame, end_frame, count=3):
+    """Evenly spaced frames across a subtitle, used until keyframes have been selected"""
+    if start_frame is None or end_frame is None:
+        return []
+    if end_frame <= start_frame:
+        return [start_frame]
+    
+    step = (end_frame - start_frame) / (count + 1)
+    indices = [int(start_frame + step * (i + 1)) for i in range(count)]
+    return sorted(set(indices))
+
+
+def parse_frame_indices(stored, start_frame, end_frame):
+    """Parse keyframes stored as "12,40,77", falling back to evenly spaced frames"""
+    if stored:
+        return [int(frame) for frame in stored.split(',')]
+    return default_frame_indices(start_frame, end_frame)
+
+
+def timestamp_ms_sql(column):
+    """SQL expression converting an HH:MM:SS,mmm text column to integer milliseconds"""
+    value = f"trim({column})"
+    # Parsed from the right, so hours may have any number of digits
+    return (
+        f"(CAST(substr({value}, 1, length({value}) - 10) AS INTEGER) * 3600000"
+        f" + CAST(substr({value}, -9, 2) AS INTEGER) * 60000"
+        f" + CAST(round(CAST(replace(substr({value}, -6), ',', '.') AS REAL) * 1000) AS INTEGER))"
+    )
+
+
+def timestamp_range(start, end, start_ms, end_ms):
+    """Build a subtitle's timestamp object, with both the text and millisecond forms"""
+    return {
+        "start": start,
+        "end": end,
+        "start_ms": start_ms,
+        "end_ms": end_ms
+    }
+
+
+def encode_cursor(season, episode, subtitle_number):
+    """Encode a (season, episode, subtitle_number) position as an opaque pagination cursor"""
+    raw = f"{season}.{episode}.{subtitle_number}".encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+
+def decode_cursor(cursor):
+    """Decode a pagination cursor, raising ValueError if it is malformed"""
+    try:
+        raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)).decode()
+        season, episode, subtitle_number = (int(part) for part in raw.split('.'))
+    except (ValueError, UnicodeDecodeError):
+        raise ValueError(f"Invalid cursor: {cursor}")
+    return (season, episode, subtitle_number)
+
+
+def check_page(page, limit):
+    """Raise ValueError unless page and limit are both at least 1"""
+    if page < 1 or limit < 1:
+        raise ValueError("page and limit must be at least 1")
+
 
 class Database:
     """Database connection manager for Veepiac API"""
@@ -8,14 +184,102 @@ class Database:
     def __init__(self, db_path=None):
         """Initialize database with path from config or override"""
         self.db_path = db_path or config.database_path
+        self._schema = None
+        self._count_cache = OrderedDict()
+        self._count_lock = threading.Lock()
+        self._count_version = None
+        
+        # db_path may be a symlink to one of several versions (see db_versions.py);
+        # connections are opened on the file it pointed to when it was last checked
+        self.current_path = Path(self.db_path).resolve()
+        self.version_check_interval = config.get('database.version_check_interval', 1.0)
+        self._version_checked = time.monotonic()
+        self._version_lock = threading.Lock()
+        self._version_listeners = []
+        self.pool = self._create_pool(self.current_path)
+        
+        # Per-episode URL prefixes, built once per process instead of per row
+        self.cdn_base_url = config.get('cdn.base_url')
+        self._url_prefixes = {}
+    
+    def _create_pool(self, path):
+        """Create a connection pool for one database file"""
+        return ConnectionPool(
+            path,
+            size=config.get('database.pool_size', 8),
+            timeout=config.get('database.pool_timeout', 10.0),
+            pragmas=config.get('database.pragmas'),
+            read_only=config.get('database.read_only', True),
+            immutable=config.get('database.immutable', False)
+        )
+    
+    def on_version_change(self, listener):
+        """Register a callable to run after switching to a newly published database version"""
+        self._version_listeners.append(listener)
+    
+    def check_version(self):
+        """Switch to a newly published database version, checking db_path at most once per check interval"""
+        now = time.monotonic()
+        if now - self._version_checked < self.version_check_interval:
+            return
+        self._version_checked = now
+        
+        path = Path(self.db_path).resolve()
+        if path == self.current_path:
+            return
+        
+        with self._version_lock:
+            if path == self.current_path:
+                return
+            old_pool = self.pool
+            self.pool = self._create_pool(path)
+            self.current_path = path
+            self._schema = None
+            with self._count_lock:
+                self._count_cache.clear()
+        
+        # Requests still using the old file finish on it; their connections are closed when returned
+        old_pool.close()
+        logger.info(f"Switched to database {path}")
+        self._version_changed()
+    
+    def _version_changed(self):
+        """Drop state derived from the previous database version"""
+        for listener in self._version_listeners:
+            try:
+                listener()
+            except Exception:
+                logger.exception("Error invalidating state after a database version change")
+    
+    def data_version(self):
+        """Get a token that changes whenever the database file (or its WAL) is modified or replaced"""
+        self.check_version()
+        version = [str(self.current_path)]
+        for path in (self.current_path, Path(f"{self.current_path}-wal")):
+            try:
+                stat = path.stat()
+                version.append((stat.st_mtime_ns, stat.st_size))
+            except FileNotFoundError:
+                version.append(None)
+        return tuple(version)
     
     @contextmanager
     def get_connection(self):
-        """Context manager for database connections"""
-        conn = sqlite3.connect(self.db_path)
+        """Context manager for pooled (read-only by default) database connections"""
+        self.check_version()
+        with self.pool.connection() as conn:
+            yield conn
+    
+    @contextmanager
+    def get_write_connection(self):
+        """Context manager for a dedicated read-write connection, used for migrations"""
+        conn = sqlite3.connect(self.current_path)
         # Enable row factory for dict-like access
         conn.row_factory = sqlite3.Row
         try:
+            if config.get('database.wal', True):
+                # WAL is persistent, so setting it here lets readers run alongside later writes
+                conn.execute("PRAGMA journal_mode = WAL")
             yield conn
         finally:
             conn.close()
@@ -32,90 +296,660 @@ class Database:
                 conn.rollback()
                 raise
     
-    def search_quotes(self, query, page=1, limit=20):
-        """Search subtitle database for matching keywords"""
-        offset = (page - 1) * limit
+    def _has_column(self, table, column=None):
+        """Check whether a table (or a column of it) exists, caching the schema"""
+        if self._schema is None:
+            schema = {}
+            with self.get_cursor() as cursor:
+                cursor.execute("SELECT name FROM sqlite_master WHERE type = 'table'")
+                for row in cursor.fetchall():
+                    cursor.execute(f"PRAGMA table_info('{row['name']}')")
+                    schema[row["name"]] = {info["name"] for info in cursor.fetchall()}
+            self._schema = schema
+        
+        columns = self._schema.get(table)
+        if column is None:
+            return columns is not None
+        return columns is not None and column in columns
+    
+    @property
+    def has_search_index(self):
+        """Check whether the FTS5 search index has been built"""
+        return self._has_column('subtitles_fts')
+    
+    @property
+    def has_episode_codes(self):
+        """Check whether the materialized episode_code columns have been added"""
+        return self._has_column('subtitles', 'episode_code') and self._has_column('episodes', 'episode_code')
+    
+    @property
+    def has_timestamp_ms(self):
+        """Check whether the materialized start_ms/end_ms columns have been added"""
+        return self._has_column('subtitles', 'start_ms') and self._has_column('subtitles', 'end_ms')
+    
+    def _timestamp_ms_sql(self, alias, edge):
+        """SQL expression for a subtitle's start or end in milliseconds, preferring the materialized column"""
+        if self.has_timestamp_ms:
+            return f"{alias}.{edge}_ms"
+        return timestamp_ms_sql(f"{alias}.timestamp_{edge}")
+    
+    def _episode_code_sql(self, alias, episode_column='episode'):
+        """SQL expression for an episode code like S01E04, preferring the materialized column"""
+        if self.has_episode_codes:
+            return f"{alias}.episode_code"
+        return f"'S' || printf('%02d', {alias}.season) || 'E' || printf('%02d', {alias}.{episode_column})"
+    
+    def episode_urls(self, episode_code):
+        """Get the (thumbnail, frame) URL prefixes for an episode"""
+        prefixes = self._url_prefixes.get(episode_code)
+        if prefixes is None:
+            prefixes = (
+                f"{self.cdn_base_url}/thumbnails/{episode_code}/",
+                f"{self.cdn_base_url}/frames/{episode_code}/"
+            )
+            self._url_prefixes[episode_code] = prefixes
+        return prefixes
+    
+    def _keyframes_sql(self, alias):
+        """Select expression and join for stored keyframes, if they have been selected"""
+        if self._has_column('subtitle_keyframes'):
+            return "k.frame_indices", f"LEFT JOIN subtitle_keyframes k ON k.subtitle_id = {alias}.id"
+        return "NULL", ""
+    
+    def _schema_changed(self):
+        """Drop state derived from the old schema after a migration"""
+        # Pooled connections may have cached the old schema
+        self.pool.clear()
+        self._schema = None
+        with self._count_lock:
+            self._count_cache.clear()
+    
+    def build_indexes(self):
+        """Create indexes that the API queries rely on but the original export lacks"""
+        with self.get_write_connection() as conn:
+            # Serves keyset pagination and neighbour lookups within an episode
+            conn.execute(
+                """
+                CREATE INDEX IF NOT EXISTS idx_subtitles_episode_number
+                ON subtitles(season, episode, subtitle_number)
+                """
+            )
+            conn.execute("ANALYZE")
+            conn.commit()
+        
+        self._schema_changed()
+    
+    def build_episode_codes(self):
+        """
+        Materialize S01E04-style episode codes on `subtitles` and `episodes`
+        
+        Triggers fill the column for rows inserted later without one.
+        """
+        with self.get_write_connection() as conn:
+            for table, episode_column in (('subtitles', 'episode'), ('episodes', 'episode_of_season')):
+                columns = {row["name"] for row in conn.execute(f"PRAGMA table_info('{table}')")}
+                if 'episode_code' not in columns:
+                    conn.execute(f"ALTER TABLE {table} ADD COLUMN episode_code TEXT")
+                
+                conn.executescript(
+                    f"""
+                    UPDATE {table} SET episode_code = printf('S%02dE%02d', season, {episode_column});
+                    
+                    DROP TRIGGER IF EXISTS {table}_episode_code_insert;
+                    CREATE TRIGGER {table}_episode_code_insert AFTER INSERT ON {table}
+                    WHEN new.episode_code IS NULL BEGIN
+                        UPDATE {table} SET episode_code = printf('S%02dE%02d', new.season, new.{episode_column})
+                        WHERE id = new.id;
+                    END;
+                    """
+                )
+            
+            conn.execute(
+                "CREATE INDEX IF NOT EXISTS idx_subtitles_episode_code ON subtitles(episode_code, subtitle_number)"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_episodes_episode_code ON episodes(episode_code)")
+            conn.commit()
+        
+        self._schema_changed()
+    
+    def build_timestamp_ms(self):
+        """
+        Materialize subtitle start and end times as integer milliseconds
         
+        Adds `start_ms` and `end_ms` with an index for time-range queries;
+        triggers keep them in step with the text timestamps.
+        """
+        with self.get_write_connection() as conn:
+            columns = {row["name"] for row in conn.execute("PRAGMA table_info('subtitles')")}
+            for edge in ('start', 'end'):
+                if f'{edge}_ms' not in columns:
+                    conn.execute(f"ALTER TABLE subtitles ADD COLUMN {edge}_ms INTEGER")
+            
+            conn.executescript(
+                f"""
+                UPDATE subtitles SET
+                    start_ms = {timestamp_ms_sql('timestamp_start')},
+                    end_ms = {timestamp_ms_sql('timestamp_end')};
+                
+                DROP TRIGGER IF EXISTS subtitles_timestamp_ms_insert;
+                CREATE TRIGGER subtitles_timestamp_ms_insert AFTER INSERT ON subtitles
+                WHEN new.start_ms IS NULL OR new.end_ms IS NULL BEGIN
+                    UPDATE subtitles SET
+                        start_ms = {timestamp_ms_sql('new.timestamp_start')},
+                        end_ms = {timestamp_ms_sql('new.timestamp_end')}
+                    WHERE id = new.id;
+                END;
+                
+                DROP TRIGGER IF EXISTS subtitles_timestamp_ms_update;
+                CREATE TRIGGER subtitles_timestamp_ms_update AFTER UPDATE OF timestamp_start, timestamp_end ON subtitles BEGIN
+                    UPDATE subtitles SET
+                        start_ms = {timestamp_ms_sql('new.timestamp_start')},
+                        end_ms = {timestamp_ms_sql('new.timestamp_end')}
+                    WHERE id = new.id;
+                END;
+                """
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_subtitles_time ON subtitles(season, episode, start_ms)")
+            conn.commit()
+        
+        self._schema_changed()
+    
+    def build_search_index(self, tokenizer=None):
+        """
+        (Re)build the FTS5 search index over subtitle content
+        
+        The index is an external-content table backed by `subtitles`, kept in
+        sync by triggers, so it only stores the inverted index and not a second
+        copy of the dialogue.
+        """
+        tokenizer = tokenizer or config.get('search.tokenizer', DEFAULT_FTS_TOKENIZER)
+        tokenizer = tokenizer.replace("'", "''")
+        
+        with self.get_write_connection() as conn:
+            conn.executescript(
+                f"""
+                DROP TRIGGER IF EXISTS subtitles_fts_insert;
+                DROP TRIGGER IF EXISTS subtitles_fts_delete;
+                DROP TRIGGER IF EXISTS subtitles_fts_update;
+                DROP TABLE IF EXISTS subtitles_fts;
+                
+                CREATE VIRTUAL TABLE subtitles_fts USING fts5(
+                    content,
+                    content='subtitles',
+                    content_rowid='id',
+                    tokenize='{tokenizer}'
+                );
+                
+                CREATE TRIGGER subtitles_fts_insert AFTER INSERT ON subtitles BEGIN
+                    INSERT INTO subtitles_fts(rowid, content) VALUES (new.id, new.content);
+                END;
+                
+                CREATE TRIGGER subtitles_fts_delete AFTER DELETE ON subtitles BEGIN
+                    INSERT INTO subtitles_fts(subtitles_fts, rowid, content)
+                    VALUES ('delete', old.id, old.content);
+                END;
+                
+                CREATE TRIGGER subtitles_fts_update AFTER UPDATE OF content ON subtitles BEGIN
+                    INSERT INTO subtitles_fts(subtitles_fts, rowid, content)
+                    VALUES ('delete', old.id, old.content);
+                    INSERT INTO subtitles_fts(rowid, content) VALUES (new.id, new.content);
+                END;
+                
+                INSERT INTO subtitles_fts(subtitles_fts) VALUES ('rebuild');
+                INSERT INTO subtitles_fts(subtitles_fts) VALUES ('optimize');
+                """
+            )
+            conn.commit()
+        
+        self._schema_changed()
+    
+    def get_frame_ranges(self, episodes=None):
+        """Get (subtitle_id, start_frame, end_frame) of every subtitle, grouped by episode code"""
+        ranges = {}
         with self.get_cursor() as cursor:
-            # Get total count
             cursor.execute(
-                "SELECT COUNT(*) as count FROM subtitles WHERE content LIKE ?",
-                (f"%{query}%",)
+                f"""
+                SELECT 
+                    {self._episode_code_sql('s')} as episode,
+                    s.id,
+                    s.start_frame,
+                    s.end_frame
+                FROM subtitles s
+                ORDER BY s.season, s.episode, s.subtitle_number
+                """
             )
-            total_results = cursor.fetchone()["count"]
-            
-            # Get results
+            for row in cursor.fetchall():
+                if episodes and row["episode"] not in episodes:
+                    continue
+                ranges.setdefault(row["episode"], []).append((row["id"], row["start_frame"], row["end_frame"]))
+        return ranges
+    
+    def get_subtitle_intervals(self):
+        """
+        Get (subtitle_id, start_frame, end_frame, timestamp_start, timestamp_end,
+        start_ms, end_ms, content) of every subtitle, grouped by episode code
+        """
+        intervals = {}
+        with self.get_cursor() as cursor:
             cursor.execute(
+                f"""
+                SELECT 
+                    {self._episode_code_sql('s')} as episode,
+                    s.id,
+                    s.start_frame,
+                    s.end_frame,
+                    s.timestamp_start,
+                    s.timestamp_end,
+                    {self._timestamp_ms_sql('s', 'start')} as start_ms,
+                    {self._timestamp_ms_sql('s', 'end')} as end_ms,
+                    s.content
+                FROM subtitles s
+                ORDER BY s.season, s.episode, s.subtitle_number
                 """
+            )
+            for row in cursor.fetchall():
+                intervals.setdefault(row["episode"], []).append((
+                    row["id"], row["start_frame"], row["end_frame"],
+                    row["timestamp_start"], row["timestamp_end"],
+                    row["start_ms"], row["end_ms"], row["content"]
+                ))
+        return intervals
+    
+    def get_subtitle_times(self, episodes=None):
+        """Get (subtitle_id, start_ms, end_ms) of every subtitle, grouped by episode code"""
+        times = {}
+        with self.get_cursor() as cursor:
+            cursor.execute(
+                f"""
                 SELECT 
+                    {self._episode_code_sql('s')} as episode,
+                    s.id,
+                    {self._timestamp_ms_sql('s', 'start')} as start_ms,
+                    {self._timestamp_ms_sql('s', 'end')} as end_ms
+                FROM subtitles s
+                ORDER BY s.season, s.episode, s.subtitle_number
+                """
+            )
+            for row in cursor.fetchall():
+                if episodes and row["episode"] not in episodes:
+                    continue
+                times.setdefault(row["episode"], []).append((row["id"], row["start_ms"], row["end_ms"]))
+        return times
+    
+    def get_episode_captions(self, episode_id):
+        """Get (start_ms, end_ms, content) of every subtitle in an episode, in order"""
+        season = int(episode_id[1:3])
+        episode = int(episode_id[4:6])
+        
+        with self.get_cursor() as cursor:
+            cursor.execute(
+                f"""
+                SELECT
+                    {self._timestamp_ms_sql('s', 'start')} as start_ms,
+                    {self._timestamp_ms_sql('s', 'end')} as end_ms,
+                    s.content
+                FROM subtitles s
+                WHERE s.season = ? AND s.episode = ?
+                ORDER BY s.subtitle_number
+                """,
+                (season, episode)
+            )
+            return [(row["start_ms"], row["end_ms"], row["content"]) for row in cursor.fetchall()]
+    
+    def get_subtitles_between(self, episode_id, start_ms, end_ms):
+        """Get the subtitles of an episode overlapping start_ms..end_ms, in time order"""
+        season = int(episode_id[1:3])
+        episode = int(episode_id[4:6])
+        
+        # With materialized times this is a range scan of idx_subtitles_time; subtitles are
+        # short, so any that overlap the range start no earlier than a minute before it
+        start_sql = self._timestamp_ms_sql('s', 'start')
+        end_sql = self._timestamp_ms_sql('s', 'end')
+        with self.get_cursor() as cursor:
+            cursor.execute(
+                f"""
+                SELECT
                     s.id as subtitle_id,
-                    'S' || printf('%02d', s.season) || 'E' || printf('%02d', s.episode) as episode,
-                    e.title as episode_title,
-                    s.subtitle_number as index,
-                    s.timestamp_start as timestamp_start,
-                    s.timestamp_end as timestamp_end,
+                    s.subtitle_number as "index",
+                    s.timestamp_start,
+                    s.timestamp_end,
+                    {start_sql} as start_ms,
+                    {end_sql} as end_ms,
                     s.content as dialogue,
                     s.start_frame,
                     s.end_frame
                 FROM subtitles s
-                JOIN episodes e ON s.season = e.season AND s.episode = e.episode_of_season
-                WHERE s.content LIKE ?
-                ORDER BY s.season, s.episode, s.subtitle_number
-                LIMIT ? OFFSET ?
+                WHERE s.season = ? AND s.episode = ?
+                    AND {start_sql} BETWEEN ? AND ?
+                    AND {end_sql} >= ?
+                ORDER BY {start_sql}
                 """,
-                (f"%{query}%", limit, offset)
+                (season, episode, start_ms - MAX_SUBTITLE_MS, end_ms, start_ms)
             )
-            
-            results = []
-            for row in cursor.fetchall():
-                # Convert row to dict and format data
-                result = dict(row)
+            return [
+                {
+                    "subtitle_id": row["subtitle_id"],
+                    "index": row["index"],
+                    "dialogue": row["dialogue"],
+                    "start_frame": row["start_frame"],
+                    "end_frame": row["end_frame"],
+                    "timestamp": timestamp_range(row["timestamp_start"], row["timestamp_end"], row["start_ms"], row["end_ms"])
+                }
+                for row in cursor.fetchall()
+            ]
+
+    def store_keyframes(self, selections):
+        """Save selected keyframes, given as (subtitle_id, [frame numbers]) pairs"""
+        with self.get_write_connection() as conn:
+            conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS subtitle_keyframes (
+                    subtitle_id INTEGER PRIMARY KEY REFERENCES subtitles(id) ON DELETE CASCADE,
+                    frame_indices TEXT NOT NULL
+                )
+                """
+            )
+            conn.executemany(
+                "INSERT OR REPLACE INTO subtitle_keyframes (subtitle_id, frame_indices) VALUES (?, ?)",
+                [(subtitle_id, ','.join(str(frame) for frame in frames)) for subtitle_id, frames in selections]
+            )
+            conn.commit()
+        
+        self._schema_changed()
+    
+    def get_ingested_hashes(self):
+        """Get the file hash of every episode loaded by ingest.py, by episode code"""
+        if not Path(self.db_path).exists() or not self._has_column('ingested_episodes'):
+            return {}
+        with self.get_cursor() as cursor:
+            cursor.execute("SELECT episode_code, file_hash FROM ingested_episodes")
+            return {row["episode_code"]: row["file_hash"] for row in cursor.fetchall()}
+    
+    def _drop_subtitle_schema(self, conn, kind):
+        """Drop every index or trigger on `subtitles` (automatic indexes have no SQL and are kept)"""
+        for (name,) in conn.execute(
+            "SELECT name FROM sqlite_master WHERE type = ? AND tbl_name = 'subtitles' AND sql IS NOT NULL",
+            (kind,)
+        ).fetchall():
+            conn.execute(f'DROP {kind.upper()} IF EXISTS "{name}"')
+    
+    def ingest_episodes(self, episodes, removed=(), rebuild=False):
+        """
+        Replace the subtitles of some episodes in one transaction
+        
+        `episodes` are dicts with code, season, episode, title, file_path, hash and
+        subtitles (tuples of INGEST_COLUMNS); `removed` are episode codes to
+        delete. Subtitles keep their IDs across re-ingests, matched on
+        subtitle_number, and their selected keyframes unless their frame range
+        changed. With `rebuild`, every index and trigger on `subtitles`
+        (and the search index) is dropped before loading and only the original
+        indexes are recreated; run the build_* methods afterwards.
+        """
+        with self.get_write_connection() as conn:
+            conn.executescript(CORPUS_SCHEMA)
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                if rebuild:
+                    # Triggers (including the search index's) would otherwise run for every row
+                    self._drop_subtitle_schema(conn, 'trigger')
+                    conn.execute("DROP TABLE IF EXISTS subtitles_fts")
                 
-                # Format frame indices (just using a sample for now)
-                frame_indices = [0, 1, 2]  # Would be calculated in real implementation
+                columns = {row["name"] for row in conn.execute("PRAGMA table_info('subtitles')")}
+                has_keyframes = conn.execute(
+                    "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'subtitle_keyframes'"
+                ).fetchone() is not None
                 
-                # Format timestamps
-                timestamp = {
-                    "start": result.pop("timestamp_start"),
-                    "end": result.pop("timestamp_end")
-                }
+                # Old rows are deleted while the indexes still make finding them cheap
+                old_ids = {}
+                for code in list(removed) + [episode["code"] for episode in episodes]:
+                    season, number = int(code[1:3]), int(code[4:6])
+                    old_ids[code] = {
+                        row["subtitle_number"]: (row["id"], row["start_frame"], row["end_frame"])
+                        for row in conn.execute(
+                            "SELECT subtitle_number, id, start_frame, end_frame FROM subtitles "
+                            "WHERE season = ? AND episode = ?",
+                            (season, number)
+                        )
+                    }
+                    conn.execute("DELETE FROM subtitles WHERE season = ? AND episode = ?", (season, number))
+                    if code in removed:
+                        conn.execute("DELETE FROM episodes WHERE season = ? AND episode_of_season = ?", (season, number))
+                        conn.execute("DELETE FROM ingested_episodes WHERE episode_code = ?", (code,))
+                
+                if rebuild:
+                    self._drop_subtitle_schema(conn, 'index')
                 
-                # Create thumbnail URL
-                thumbnail_url = f"{config.get('cdn.base_url')}/thumbnails/{result['episode']}/{result['index']}.jpg"
+                # Derived columns are filled here when they exist, so their triggers have nothing to do
+                extra = [column for column in ('episode_code', 'start_ms', 'end_ms') if column in columns]
+                insert_columns = ['id', 'season', 'episode', 'file_path'] + list(INGEST_COLUMNS[:7]) + extra
+                insert_sql = (
+                    f"INSERT INTO subtitles ({', '.join(insert_columns)}) "
+                    f"VALUES ({', '.join('?' * len(insert_columns))})"
+                )
                 
-                # Add formatted fields to result
-                result["timestamp"] = timestamp
-                result["frame_indices"] = frame_indices
-                result["thumbnail_url"] = thumbnail_url
+                now = time.time()
+                # Selected keyframes stay valid while a subtitle keeps its ID and frame range
+                stale_ids = []
+                for episode in episodes:
+                    season, number, ids = episode["season"], episode["episode"], old_ids[episode["code"]]
+                    rows = []
+                    for subtitle in episode["subtitles"]:
+                        values = dict(zip(INGEST_COLUMNS, subtitle), episode_code=episode["code"])
+                        subtitle_id, start_frame, end_frame = ids.pop(subtitle[0], (None, None, None))
+                        if subtitle_id is not None and (start_frame, end_frame) != (values["start_frame"], values["end_frame"]):
+                            stale_ids.append(subtitle_id)
+                        rows.append(
+                            (subtitle_id, season, number, episode["file_path"])
+                            + tuple(subtitle[:7])
+                            + tuple(values[column] for column in extra)
+                        )
+                    conn.executemany(insert_sql, rows)
+                    
+                    conn.execute(
+                        """
+                        INSERT INTO episodes (season, episode_of_season, title) VALUES (?, ?, ?)
+                        ON CONFLICT(season, episode_of_season) DO UPDATE SET
+                            title = COALESCE(excluded.title, episodes.title)
+                        """,
+                        (season, number, episode["title"])
+                    )
+                    conn.execute(
+                        "INSERT OR REPLACE INTO ingested_episodes (episode_code, file_hash, subtitle_count, ingested_at) "
+                        "VALUES (?, ?, ?, ?)",
+                        (episode["code"], episode["hash"], len(rows), now)
+                    )
                 
-                results.append(result)
+                # Subtitles that are gone take their keyframes with them
+                for ids in old_ids.values():
+                    stale_ids.extend(subtitle_id for subtitle_id, _, _ in ids.values())
+                if has_keyframes:
+                    conn.executemany(
+                        "DELETE FROM subtitle_keyframes WHERE subtitle_id = ?",
+                        [(subtitle_id,) for subtitle_id in stale_ids]
+                    )
+                
+                # Episodes are numbered across the series in (season, episode) order
+                conn.execute(
+                    """
+                    UPDATE episodes SET episode_overall = (
+                        SELECT COUNT(*) FROM episodes e
+                        WHERE e.season < episodes.season
+                            OR (e.season = episodes.season AND e.episode_of_season <= episodes.episode_of_season)
+                    )
+                    """
+                )
+                
+                # Building the indexes once is much faster than updating them row by row
+                for statement in CORPUS_INDEXES.strip().split(';'):
+                    if statement.strip():
+                        conn.execute(statement)
+                conn.commit()
+            except Exception:
+                conn.rollback()
+                raise
+        
+        self._schema_changed()
+    
+    def _cached_count(self, key, sql, params, cursor):
+        """Run a COUNT query, reusing the result for identical queries until the data changes"""
+        # Another process (an in-place ingest or migrate_db.py) may have written to the file
+        version = self.data_version()
+        with self._count_lock:
+            if version != self._count_version:
+                self._count_version = version
+                self._count_cache.clear()
+            if key in self._count_cache:
+                self._count_cache.move_to_end(key)
+                return self._count_cache[key]
+        
+        cursor.execute(sql, params)
+        count = cursor.fetchone()["count"]
+        
+        with self._count_lock:
+            if self._count_version == version:
+                self._count_cache[key] = count
+                if len(self._count_cache) > COUNT_CACHE_SIZE:
+                    self._count_cache.popitem(last=False)
+        return count
+    
+    def search_quotes(self, query, page=1, limit=20, cursor=None, include_total=True):
+        """
+        Search subtitle database for matching keywords
+        
+        By default results are ranked by relevance and paged with `page`. Passing
+        `cursor` (an empty string for the first page) switches to keyset
+        pagination in episode order, where every page costs the same to fetch.
+        """
+        check_page(page, limit)
+        keyset = cursor is not None
+        position = decode_cursor(cursor) if cursor else None
+        
+        keyframes_column, keyframes_join = self._keyframes_sql('s')
+        
+        # Use the ranked full-text index when available, otherwise fall back to a substring scan
+        match_query = build_match_query(query) if self.has_search_index else None
+        if match_query:
+            count_sql = "SELECT COUNT(*) as count FROM subtitles_fts WHERE subtitles_fts MATCH ?"
+            from_sql = f"""
+                FROM subtitles_fts f
+                JOIN subtitles s ON s.id = f.rowid
+                JOIN episodes e ON s.season = e.season AND s.episode = e.episode_of_season
+                {keyframes_join}
+                WHERE subtitles_fts MATCH ?
+            """
+            order_sql = "ORDER BY f.rank, s.season, s.episode, s.subtitle_number"
+            params = (match_query,)
+        else:
+            count_sql = "SELECT COUNT(*) as count FROM subtitles WHERE content LIKE ?"
+            from_sql = f"""
+                FROM subtitles s
+                JOIN episodes e ON s.season = e.season AND s.episode = e.episode_of_season
+                {keyframes_join}
+                WHERE s.content LIKE ?
+            """
+            order_sql = "ORDER BY s.season, s.episode, s.subtitle_number"
+            params = (f"%{query}%",)
+        
+        if keyset:
+            order_sql = "ORDER BY s.season, s.episode, s.subtitle_number"
+            if position:
+                from_sql += " AND (s.season, s.episode, s.subtitle_number) > (?, ?, ?)"
+            page_sql = "LIMIT ?"
+            page_params = (position or ()) + (limit + 1,)
+        else:
+            page_sql = "LIMIT ? OFFSET ?"
+            page_params = (limit, (page - 1) * limit)
+        
+        with self.get_cursor() as db_cursor:
+            # Get total count
+            total_results = None
+            if include_total or not keyset:
+                total_results = self._cached_count(("search", params), count_sql, params, db_cursor)
             
-            # Calculate pagination info
-            total_pages = (total_results + limit - 1) // limit
+            # Get results
+            db_cursor.execute(
+                f"""
+                SELECT 
+                    s.id as subtitle_id,
+                    {self._episode_code_sql('s')} as episode,
+                    e.title as episode_title,
+                    s.subtitle_number as "index",
+                    s.timestamp_start as timestamp_start,
+                    s.timestamp_end as timestamp_end,
+                    {self._timestamp_ms_sql('s', 'start')} as start_ms,
+                    {self._timestamp_ms_sql('s', 'end')} as end_ms,
+                    s.content as dialogue,
+                    s.start_frame,
+                    s.end_frame,
+                    {keyframes_column} as frame_indices,
+                    s.season as season_number,
+                    s.episode as episode_number
+                {from_sql}
+                {order_sql}
+                {page_sql}
+                """,
+                params + page_params
+            )
+            rows = db_cursor.fetchall()
             
-            return {
-                "results": results,
-                "pagination": {
+            # Keyset pages fetch one extra row to find out whether another page exists
+            next_cursor = None
+            if keyset and rows and len(rows) > limit:
+                rows = rows[:limit]
+                last = rows[-1]
+                next_cursor = encode_cursor(last["season_number"], last["episode_number"], last["index"])
+            
+            results = []
+            for row in rows:
+                thumbnail_prefix, _ = self.episode_urls(row["episode"])
+                results.append({
+                    "subtitle_id": row["subtitle_id"],
+                    "episode": row["episode"],
+                    "episode_title": row["episode_title"],
+                    "index": row["index"],
+                    "dialogue": row["dialogue"],
+                    "start_frame": row["start_frame"],
+                    "end_frame": row["end_frame"],
+                    "timestamp": timestamp_range(row["timestamp_start"], row["timestamp_end"], row["start_ms"], row["end_ms"]),
+                    "frame_indices": parse_frame_indices(row["frame_indices"], row["start_frame"], row["end_frame"]),
+                    "thumbnail_url": f"{thumbnail_prefix}{row['index']}.jpg"
+                })
+            
+            # Calculate pagination info
+            if keyset:
+                pagination = {
+                    "next_cursor": next_cursor,
+                    "limit": limit
+                }
+                if total_results is not None:
+                    pagination["total_results"] = total_results
+            else:
+                pagination = {
                     "total_results": total_results,
                     "page": page,
-                    "total_pages": total_pages,
+                    "total_pages": (total_results + limit - 1) // limit,
                     "limit": limit
                 }
+            
+            return {
+                "results": results,
+                "pagination": pagination
             }
 
-    def get_subtitle(self, subtitle_id, frames_before=3, frames_after=3, subtitles_before=2, subtitles_after=2):
-        """Get detailed information about a specific subtitle"""
+    def get_subtitle_info(self, subtitle_id):
+        """Get basic subtitle information without surrounding frames and subtitles"""
         with self.get_cursor() as cursor:
-            # Get primary subtitle
             cursor.execute(
-                """
+                f"""
                 SELECT 
                     s.id as subtitle_id,
-                    'S' || printf('%02d', s.season) || 'E' || printf('%02d', s.episode) as episode,
+                    {self._episode_code_sql('s')} as episode,
                     e.title as episode_title,
-                    s.subtitle_number as index,
+                    s.subtitle_number as "index",
                     s.timestamp_start,
                     s.timestamp_end,
+                    {self._timestamp_ms_sql('s', 'start')} as start_ms,
+                    {self._timestamp_ms_sql('s', 'end')} as end_ms,
                     s.content as dialogue,
                     s.start_frame,
                     s.end_frame
@@ -130,133 +964,179 @@ class Database:
             if not row:
                 return None
             
-            subtitle = dict(row)
-            season = int(subtitle["episode"][1:3])
-            episode = int(subtitle["episode"][4:6])
-            index = subtitle["index"]
-            
-            # Format timestamp
-            subtitle["timestamp"] = {
-                "start": subtitle.pop("timestamp_start"),
-                "end": subtitle.pop("timestamp_end")
-            }
-            
-            # Calculate frame indices (placeholder)
-            subtitle["frame_indices"] = [1, 8, 0]
-            
-            # Get frames before
-            cursor.execute(
-                """
-                SELECT 
-                    id as frame_id,
-                    timestamp_start as timestamp
-                FROM subtitles
-                WHERE season = ? AND episode = ? AND subtitle_number < ?
-                ORDER BY subtitle_number DESC
-                LIMIT ?
-                """,
-                (season, episode, index, frames_before)
-            )
-            frames_before_data = [dict(row) for row in cursor.fetchall()]
-            frames_before_data.reverse()  # Put in chronological order
-            
-            # Get frames after
+            return dict(row)
+    
+    def get_subtitle(self, subtitle_id, frames_before=3, frames_after=3, subtitles_before=2, subtitles_after=2):
+        """Get detailed information about a specific subtitle"""
+        # Frames and surrounding subtitles are both built from neighbouring rows,
+        # so fetch enough neighbours for whichever needs more
+        rows_before = max(frames_before, subtitles_before)
+        rows_after = max(frames_after, subtitles_after)
+        keyframes_column, keyframes_join = self._keyframes_sql('s')
+        start_ms_sql = self._timestamp_ms_sql('s', 'start')
+        end_ms_sql = self._timestamp_ms_sql('s', 'end')
+        
+        with self.get_cursor() as cursor:
+            # Fetch the subtitle and its neighbours in one statement: the target row
+            # plus two bounded scans of idx_subtitles_episode_number around it
             cursor.execute(
-                """
+                f"""
+                WITH target AS (
+                    SELECT id, season, episode, subtitle_number FROM subtitles WHERE id = ?
+                )
                 SELECT 
-                    id as frame_id,
-                    timestamp_start as timestamp
-                FROM subtitles
-                WHERE season = ? AND episode = ? AND subtitle_number > ?
-                ORDER BY subtitle_number ASC
-                LIMIT ?
+                    s.id as subtitle_id,
+                    {self._episode_code_sql('s')} as episode,
+                    e.title as episode_title,
+                    s.subtitle_number as "index",
+                    s.timestamp_start,
+                    s.timestamp_end,
+                    {start_ms_sql} as start_ms,
+                    {end_ms_sql} as end_ms,
+                    s.content as dialogue,
+                    s.start_frame,
+                    s.end_frame,
+                    {keyframes_column} as frame_indices
+                FROM target t
+                JOIN subtitles s ON s.id = t.id
+                JOIN episodes e ON s.season = e.season AND s.episode = e.episode_of_season
+                {keyframes_join}
+                UNION ALL
+                SELECT * FROM (
+                    SELECT s.id, NULL, NULL, s.subtitle_number, s.timestamp_start, s.timestamp_end,
+                           {start_ms_sql}, {end_ms_sql}, s.content, s.start_frame, s.end_frame, NULL
+                    FROM subtitles s
+                    WHERE s.season = (SELECT season FROM target)
+                        AND s.episode = (SELECT episode FROM target)
+                        AND s.subtitle_number < (SELECT subtitle_number FROM target)
+                    ORDER BY s.subtitle_number DESC
+                    LIMIT ?
+                )
+                UNION ALL
+                SELECT * FROM (
+                    SELECT s.id, NULL, NULL, s.subtitle_number, s.timestamp_start, s.timestamp_end,
+                           {start_ms_sql}, {end_ms_sql}, s.content, s.start_frame, s.end_frame, NULL
+                    FROM subtitles s
+                    WHERE s.season = (SELECT season FROM target)
+                        AND s.episode = (SELECT episode FROM target)
+                        AND s.subtitle_number > (SELECT subtitle_number FROM target)
+                    ORDER BY s.subtitle_number ASC
+                    LIMIT ?
+                )
                 """,
-                (season, episode, index, frames_after)
+                (subtitle_id, rows_before, rows_after)
             )
-            frames_after_data = [dict(row) for row in cursor.fetchall()]
-            
-            # Add URLs to frames
-            cdn_base = config.get('cdn.base_url')
-            for frame in frames_before_data + frames_after_data:
-                frame["url"] = f"{cdn_base}/frames/{subtitle['episode']}/{frame['frame_id']}.jpg"
-            
-            current_frame = {
-                "frame_id": subtitle_id,
-                "timestamp": subtitle["timestamp"]["start"],
-                "url": f"{cdn_base}/frames/{subtitle['episode']}/{subtitle_id}.jpg"
+            rows = cursor.fetchall()
+        
+        # The target row comes first; without it the subtitle (or its episode) doesn't exist
+        if not rows or rows[0]["subtitle_id"] != subtitle_id or rows[0]["episode"] is None:
+            return None
+        
+        subtitle = dict(rows[0])
+        index = subtitle["index"]
+        neighbours = sorted(rows[1:], key=lambda row: row["index"])
+        before = [row for row in neighbours if row["index"] < index]
+        after = [row for row in neighbours if row["index"] > index]
+        
+        # Format timestamp
+        subtitle["timestamp"] = timestamp_range(
+            subtitle.pop("timestamp_start"), subtitle.pop("timestamp_end"),
+            subtitle.pop("start_ms"), subtitle.pop("end_ms")
+        )
+        
+        subtitle["frame_indices"] = parse_frame_indices(
+            subtitle.pop("frame_indices"), subtitle["start_frame"], subtitle["end_frame"]
+        )
+        
+        # Slice frames and surrounding subtitles from the same neighbour rows,
+        # closest rows first so the lists stay in chronological order
+        _, frame_prefix = self.episode_urls(subtitle["episode"])
+        frames_before_data = [
+            {
+                "frame_id": row["subtitle_id"],
+                "timestamp": row["timestamp_start"],
+                "url": f"{frame_prefix}{row['subtitle_id']}.jpg"
             }
-            
-            # Get surrounding subtitles
-            # Before
-            cursor.execute(
-                """
-                SELECT 
-                    id as subtitle_id,
-                    content as dialogue,
-                    timestamp_start,
-                    timestamp_end
-                FROM subtitles 
-                WHERE season = ? AND episode = ? AND subtitle_number < ?
-                ORDER BY subtitle_number DESC
-                LIMIT ?
-                """,
-                (season, episode, index, subtitles_before)
-            )
-            subtitles_before_data = [dict(row) for row in cursor.fetchall()]
-            subtitles_before_data.reverse()  # Put in chronological order
-            
-            # After
-            cursor.execute(
-                """
-                SELECT 
-                    id as subtitle_id,
-                    content as dialogue,
-                    timestamp_start,
-                    timestamp_end
-                FROM subtitles 
-                WHERE season = ? AND episode = ? AND subtitle_number > ?
-                ORDER BY subtitle_number ASC
-                LIMIT ?
-                """,
-                (season, episode, index, subtitles_after)
-            )
-            subtitles_after_data = [dict(row) for row in cursor.fetchall()]
-            
-            # Format timestamps for surrounding subtitles
-            for sub in subtitles_before_data + subtitles_after_data:
-                sub["timestamp"] = {
-                    "start": sub.pop("timestamp_start"),
-                    "end": sub.pop("timestamp_end")
-                }
-            
-            return {
-                "subtitle": subtitle,
-                "frames": {
-                    "before": frames_before_data,
-                    "current": current_frame,
-                    "after": frames_after_data
-                },
-                "surrounding_subtitles": {
-                    "before": subtitles_before_data,
-                    "after": subtitles_after_data
-                },
-                "episode_link": f"/episode/{subtitle['episode']}?subtitle={subtitle_id}"
+            for row in before[-frames_before:]
+        ] if frames_before else []
+        frames_after_data = [
+            {
+                "frame_id": row["subtitle_id"],
+                "timestamp": row["timestamp_start"],
+                "url": f"{frame_prefix}{row['subtitle_id']}.jpg"
             }
+            for row in after[:frames_after]
+        ]
+        
+        current_frame = {
+            "frame_id": subtitle_id,
+            "timestamp": subtitle["timestamp"]["start"],
+            "url": f"{frame_prefix}{subtitle_id}.jpg"
+        }
+        
+        subtitles_before_data = [
+            {
+                "subtitle_id": row["subtitle_id"],
+                "dialogue": row["dialogue"],
+                "timestamp": timestamp_range(row["timestamp_start"], row["timestamp_end"], row["start_ms"], row["end_ms"])
+            }
+            for row in before[-subtitles_before:]
+        ] if subtitles_before else []
+        subtitles_after_data = [
+            {
+                "subtitle_id": row["subtitle_id"],
+                "dialogue": row["dialogue"],
+                "timestamp": timestamp_range(row["timestamp_start"], row["timestamp_end"], row["start_ms"], row["end_ms"])
+            }
+            for row in after[:subtitles_after]
+        ]
+        
+        return {
+            "subtitle": subtitle,
+            "frames": {
+                "before": frames_before_data,
+                "current": current_frame,
+                "after": frames_after_data
+            },
+            "surrounding_subtitles": {
+                "before": subtitles_before_data,
+                "after": subtitles_after_data
+            },
+            "episode_link": f"/episode/{subtitle['episode']}?subtitle={subtitle_id}"
+        }
     
-    def get_episode_subtitles(self, episode_id, page=1, limit=50):
-        """Get all subtitles for a specific episode with pagination"""
-        offset = (page - 1) * limit
+    def get_episode_subtitles(self, episode_id, page=1, limit=50, cursor=None, include_total=True):
+        """
+        Get all subtitles for a specific episode with pagination
+        
+        Passing `cursor` (an empty string for the first page) switches from
+        page numbers to keyset pagination on subtitle_number.
+        """
+        check_page(page, limit)
+        keyset = cursor is not None
         
         # Parse episode ID (format: S01E04)
         season = int(episode_id[1:3])
         episode = int(episode_id[4:6])
         
-        with self.get_cursor() as cursor:
+        if keyset:
+            after_number = 0
+            if cursor:
+                cursor_season, cursor_episode, after_number = decode_cursor(cursor)
+                if (cursor_season, cursor_episode) != (season, episode):
+                    raise ValueError(f"Cursor does not belong to episode {episode_id}")
+            page_sql = "AND subtitle_number > ? ORDER BY subtitle_number LIMIT ?"
+            page_params = (after_number, limit + 1)
+        else:
+            page_sql = "ORDER BY subtitle_number LIMIT ? OFFSET ?"
+            page_params = (limit, (page - 1) * limit)
+        
+        with self.get_cursor() as db_cursor:
             # Get episode information
-            cursor.execute(
-                """
+            db_cursor.execute(
+                f"""
                 SELECT 
-                    'S' || printf('%02d', season) || 'E' || printf('%02d', episode_of_season) as id,
+                    {self._episode_code_sql('episodes', 'episode_of_season')} as id,
                     title,
                     season,
                     episode_of_season as episode,
@@ -271,67 +1151,95 @@ class Database:
                 (season, episode)
             )
             
-            episode_row = cursor.fetchone()
+            episode_row = db_cursor.fetchone()
             if not episode_row:
                 return None
                 
             episode_info = dict(episode_row)
             
             # Get total count of subtitles
-            cursor.execute(
-                "SELECT COUNT(*) as count FROM subtitles WHERE season = ? AND episode = ?",
-                (season, episode)
-            )
-            total_subtitles = cursor.fetchone()["count"]
+            total_subtitles = None
+            if include_total or not keyset:
+                total_subtitles = self._cached_count(
+                    ("episode", season, episode),
+                    "SELECT COUNT(*) as count FROM subtitles WHERE season = ? AND episode = ?",
+                    (season, episode),
+                    db_cursor
+                )
             
             # Get subtitles
-            cursor.execute(
-                """
+            keyframes_column, keyframes_join = self._keyframes_sql('subtitles')
+            db_cursor.execute(
+                f"""
                 SELECT 
                     id as subtitle_id,
-                    subtitle_number as index,
+                    subtitle_number as "index",
                     timestamp_start,
                     timestamp_end,
+                    {self._timestamp_ms_sql('subtitles', 'start')} as start_ms,
+                    {self._timestamp_ms_sql('subtitles', 'end')} as end_ms,
                     content as dialogue,
                     start_frame,
-                    end_frame
+                    end_frame,
+                    {keyframes_column} as frame_indices
                 FROM subtitles
+                {keyframes_join}
                 WHERE season = ? AND episode = ?
-                ORDER BY subtitle_number
-                LIMIT ? OFFSET ?
+                {page_sql}
                 """,
-                (season, episode, limit, offset)
+                (season, episode) + page_params
             )
+            rows = db_cursor.fetchall()
+            
+            # Keyset pages fetch one extra row to find out whether another page exists
+            next_cursor = None
+            if keyset and rows and len(rows) > limit:
+                rows = rows[:limit]
+                next_cursor = encode_cursor(season, episode, rows[-1]["index"])
             
+            thumbnail_prefix, _ = self.episode_urls(episode_info["id"])
             subtitles = []
-            for row in cursor.fetchall():
-                subtitle = dict(row)
-                
-                # Format timestamps
-                subtitle["timestamp"] = {
-                    "start": subtitle.pop("timestamp_start"),
-                    "end": subtitle.pop("timestamp_end")
-                }
-                
-                # Add frame indices and thumbnail URL
-                subtitle["frame_indices"] = [1, 4, 2]  # Placeholder
-                subtitle["thumbnail_url"] = f"{config.get('cdn.base_url')}/thumbnails/{episode_id}/{subtitle['index']}.jpg"
-                
-                subtitles.append(subtitle)
+            for row in rows:
+                subtitles.append({
+                    "subtitle_id": row["subtitle_id"],
+                    "index": row["index"],
+                    "dialogue": row["dialogue"],
+                    "start_frame": row["start_frame"],
+                    "end_frame": row["end_frame"],
+                    "timestamp": timestamp_range(row["timestamp_start"], row["timestamp_end"], row["start_ms"], row["end_ms"]),
+                    "frame_indices": parse_frame_indices(row["frame_indices"], row["start_frame"], row["end_frame"]),
+                    "thumbnail_url": f"{thumbnail_prefix}{row['index']}.jpg"
+                })
             
             # Calculate pagination info
-            total_pages = (total_subtitles + limit - 1) // limit
-            
-            return {
-                "episode": episode_info,
-                "subtitles": subtitles,
-                "pagination": {
+            if keyset:
+                pagination = {
+                    "next_cursor": next_cursor,
+                    "limit": limit
+                }
+                if total_subtitles is not None:
+                    pagination["total_subtitles"] = total_subtitles
+            else:
+                pagination = {
                     "total_subtitles": total_subtitles,
                     "page": page,
-                    "total_pages": total_pages,
+                    "total_pages": (total_subtitles + limit - 1) // limit,
                     "limit": limit
                 }
+            
+            return {
+                "episode": episode_info,
+                "subtitles": subtitles,
+                "pagination": pagination
             }
 
+def create_database(db_path=None):
+    """Create the database backend selected by `database.backend` in config"""
+    if config.get('database.backend', 'sqlite') == 'memory':
+        # Imported here because memory_store builds on this module
+        from memory_store import MemoryDatabase
+        return MemoryDatabase(db_path)
+    return Database(db_path)
+
 # Create a singleton database instance
-db = Database()
+db = create_database()
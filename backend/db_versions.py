@@ -0,0 +1,176 @@
+#!/usr/bin/env python3
+"""
+Versioned copies of subtitles.db behind an atomically switched symlink
+database_path points into a `<name>.versions` directory next to it; running
+workers notice the new target within database.version_check_interval and
+move to it without a restart
+"""
+
+import os
+import sys
+import time
+import sqlite3
+import secrets
+import logging
+import argparse
+from pathlib import Path
+
+# Add the parent directory to the path so we can import the application modules
+parent_dir = Path(__file__).resolve().parent
+sys.path.append(str(parent_dir))
+
+from config import config
+
+logger = logging.getLogger(__name__)
+
+# Files SQLite may keep next to a database
+SIDE_FILES = ('-wal', '-shm', '-journal')
+
+
+def versions_dir(db_path):
+    """Get the directory holding the versions of a database"""
+    db_path = Path(db_path)
+    return db_path.with_name(f"{db_path.name}.versions")
+
+
+def new_version_path(db_path):
+    """Get an unused path for a new version; names sort by creation time"""
+    directory = versions_dir(db_path)
+    directory.mkdir(parents=True, exist_ok=True)
+    return directory / f"{time.strftime('%Y%m%dT%H%M%S')}-{secrets.token_hex(3)}.db"
+
+
+def list_versions(db_path):
+    """Get every version of a database, oldest first"""
+    directory = versions_dir(db_path)
+    return sorted(directory.glob("*.db")) if directory.is_dir() else []
+
+
+def current_version(db_path):
+    """Get the version database_path points to, or None if it isn't versioned yet"""
+    db_path = Path(db_path)
+    return db_path.resolve() if db_path.is_symlink() else None
+
+
+def copy_database(source, destination):
+    """Copy a database with the SQLite backup API, which is consistent even while it's in use"""
+    source_conn = sqlite3.connect(f"{Path(source).resolve().as_uri()}?mode=ro", uri=True)
+    destination_conn = sqlite3.connect(str(destination))
+    try:
+        source_conn.backup(destination_conn)
+    finally:
+        destination_conn.close()
+        source_conn.close()
+
+
+def finalize(path):
+    """
+    Prepare a version for publishing
+
+    Folds the WAL into the file and switches to rollback journaling, so
+    readers need no -wal or -shm files and an old version can be deleted
+    while a worker that hasn't switched yet still has it open.
+    """
+    conn = sqlite3.connect(str(path))
+    try:
+        conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+        conn.execute("PRAGMA journal_mode = DELETE")
+        conn.execute("PRAGMA optimize")
+    finally:
+        conn.close()
+
+
+def remove_version(path):
+    """Delete a version and its side files"""
+    for suffix in ('',) + SIDE_FILES:
+        try:
+            os.remove(f"{path}{suffix}")
+        except FileNotFoundError:
+            pass
+
+
+def prune(db_path, keep):
+    """Delete all but the newest `keep` versions, never the current one"""
+    current = current_version(db_path)
+    versions = [path for path in list_versions(db_path) if path.resolve() != current]
+    # The current version counts towards `keep`
+    stale = versions[:max(0, len(versions) - max(0, keep - 1))]
+    for path in stale:
+        remove_version(path)
+        logger.info(f"Removed old database version {path.name}")
+    return stale
+
+
+def publish(db_path, version_path, keep=None):
+    """
+    Point database_path at a version by atomically replacing the symlink
+
+    The first time, a plain database file is copied into the versions
+    directory before it's replaced, so it can be rolled back to.
+    """
+    db_path = Path(db_path)
+    version_path = Path(version_path).resolve()
+
+    if db_path.exists() and not db_path.is_symlink():
+        original = new_version_path(db_path)
+        copy_database(db_path, original)
+        finalize(original)
+        logger.info(f"Kept the original database as version {original.name}")
+
+    # Renaming over the old link is atomic, so readers see either version, never neither
+    temp_link = db_path.with_name(f".{db_path.name}.{os.getpid()}.tmp")
+    if temp_link.is_symlink() or temp_link.exists():
+        temp_link.unlink()
+    os.symlink(os.path.relpath(version_path, db_path.parent), temp_link)
+    os.replace(temp_link, db_path)
+    logger.info(f"Published database version {version_path.name}")
+
+    if keep is None:
+        keep = config.get('database.keep_versions', 3)
+    prune(db_path, keep)
+
+
+def main():
+    logging.basicConfig(
+        level=logging.INFO,
+        format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+    )
+
+    parser = argparse.ArgumentParser(description="Manage the published versions of subtitles.db")
+    parser.add_argument('--db', help="Path to subtitles.db (defaults to the configured database_path)")
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    subparsers.add_parser('list', help="List versions, marking the current one")
+
+    publish_parser = subparsers.add_parser('publish', help="Copy a database file in as a new version and switch to it")
+    publish_parser.add_argument('file', help="Database file to publish")
+
+    subparsers.add_parser('rollback', help="Switch back to the version before the current one")
+    args = parser.parse_args()
+
+    db_path = Path(args.db) if args.db else config.database_path
+
+    if args.command == 'list':
+        current = current_version(db_path)
+        for path in list_versions(db_path):
+            marker = '*' if path.resolve() == current else ' '
+            print(f"{marker} {path.name}  {path.stat().st_size:>12} bytes")
+
+    elif args.command == 'publish':
+        target = new_version_path(db_path)
+        copy_database(args.file, target)
+        finalize(target)
+        publish(db_path, target)
+
+    elif args.command == 'rollback':
+        current = current_version(db_path)
+        older = [path for path in list_versions(db_path) if current is not None and path.resolve() < current]
+        if not older:
+            print("No earlier version to roll back to")
+            sys.exit(1)
+        # Rolling back never prunes, so the newer version stays available to switch back to
+        publish(db_path, older[-1], keep=len(list_versions(db_path)))
+
+
+if __name__ == "__main__":
+    main()
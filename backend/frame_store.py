@@ -0,0 +1,306 @@
+import os
+import re
+import mmap
+import time
+import struct
+import threading
+from array import array
+from bisect import bisect_left
+
+from utils import get_episode_dir
+
+# Episode codes as used in URLs and directory names (e.g. S01E04)
+EPISODE_PATTERN = re.compile(r'^S\d{2}E\d{2}$')
+
+# Frame and thumbnail files, with any amount of zero padding
+FRAME_NAME_PATTERN = re.compile(r'^(?:frame|thumb)_(\d+)\.jpg$')
+
+# File name prefix for each image directory of an episode
+IMAGE_PREFIXES = {
+    "frames": "frame",
+    "thumbnails": "thumb"
+}
+
+
+# Packed archive index: header, then one fixed-width entry per frame number
+# from first_frame to first_frame + count - 1 (length 0 means no image)
+PACK_MAGIC = b'VPAK'
+PACK_VERSION = 2
+PACK_HEADER = struct.Struct('<4sHHQQ8s')  # magic, version, reserved, first_frame, count, generation
+PACK_ENTRY = struct.Struct('<QI')         # offset into the data file, length
+
+# Packed archive data: a header carrying the same generation as its index,
+# then the JPEGs back to back
+PACK_DATA_MAGIC = b'VPKD'
+PACK_DATA_HEADER = struct.Struct('<4s8s')  # magic, generation
+
+# How often to reopen an archive whose two files are from different builds,
+# which only happens while write_pack is moving a rebuilt one into place
+PACK_OPEN_ATTEMPTS = 5
+PACK_OPEN_DELAY = 0.01
+
+
+class ArchiveMismatch(ValueError):
+    """The data and index files of an archive come from different builds"""
+
+
+class PackedImages:
+    """
+    Memory-mapped archive of one image directory
+
+    `<kind>.pack` holds the JPEGs back to back and `<kind>.idx` maps each frame
+    number to its byte range, so a lookup is a single fixed-offset read.
+    """
+
+    def __init__(self, data_path, index_path):
+        self.data_path = data_path
+        self.index_path = index_path
+
+        with open(index_path, 'rb') as f:
+            self._index = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        if len(self._index) < PACK_HEADER.size:
+            raise ValueError(f"Unsupported frame archive: {index_path}")
+        magic, version, _, self.first_frame, self.count, self.generation = PACK_HEADER.unpack_from(self._index, 0)
+        if magic != PACK_MAGIC or version != PACK_VERSION:
+            raise ValueError(f"Unsupported frame archive: {index_path}")
+
+        # The index is opened first: if the data file was replaced since, the
+        # generations differ and the caller reopens both
+        with open(data_path, 'rb') as f:
+            self._data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            # Identifies this build of the archive in Last-Modified
+            self.mtime_ns = os.fstat(f.fileno()).st_mtime_ns
+        if self._read_generation(self._data) != self.generation:
+            raise ArchiveMismatch(f"Frame archive data and index differ: {data_path}")
+
+    @staticmethod
+    def _read_generation(header):
+        """Get the generation from the start of a data file, or None"""
+        if len(header) < PACK_DATA_HEADER.size:
+            return None
+        magic, generation = PACK_DATA_HEADER.unpack_from(header, 0)
+        return generation if magic == PACK_DATA_MAGIC else None
+
+    def __len__(self):
+        return self.count
+
+    def entry(self, number):
+        """Get the (offset, length) of a frame in the data file, or None"""
+        slot = number - self.first_frame
+        if slot < 0 or slot >= self.count:
+            return None
+        offset, length = PACK_ENTRY.unpack_from(self._index, PACK_HEADER.size + slot * PACK_ENTRY.size)
+        return (offset, length) if length else None
+
+    def __contains__(self, number):
+        return self.entry(number) is not None
+
+    def read(self, number):
+        """Get the bytes of a frame, or None"""
+        entry = self.entry(number)
+        if entry is None:
+            return None
+        offset, length = entry
+        return self._data[offset:offset + length]
+
+    def open_data(self):
+        """
+        Open the data file for sending entries, or None if it has been rebuilt
+
+        The path may hold a newer build than the one mapped, whose offsets
+        would point into the wrong images.
+        """
+        data_file = open(self.data_path, 'rb')
+        if self._read_generation(data_file.read(PACK_DATA_HEADER.size)) != self.generation:
+            data_file.close()
+            return None
+        return data_file
+
+
+def write_pack(directory_index, data_path, index_path):
+    """
+    Build a packed archive from a directory of loose images
+
+    Both files are written next to their final names and moved into place
+    once complete, so readers never see a half-written archive. The two moves
+    aren't atomic together, so both files carry a random generation and
+    readers reject a data file that doesn't match its index.
+    """
+    numbers = directory_index.numbers
+    first_frame = numbers[0] if numbers else 0
+    count = numbers[-1] - first_frame + 1 if numbers else 0
+    generation = os.urandom(8)
+
+    entries = bytearray(PACK_ENTRY.size * count)
+    data_tmp = data_path.with_name(data_path.name + '.tmp')
+    index_tmp = index_path.with_name(index_path.name + '.tmp')
+
+    offset = PACK_DATA_HEADER.size
+    with open(data_tmp, 'wb') as data_file:
+        data_file.write(PACK_DATA_HEADER.pack(PACK_DATA_MAGIC, generation))
+        for number in numbers:
+            with open(directory_index.get(number), 'rb') as image_file:
+                image = image_file.read()
+            data_file.write(image)
+            PACK_ENTRY.pack_into(entries, (number - first_frame) * PACK_ENTRY.size, offset, len(image))
+            offset += len(image)
+
+    with open(index_tmp, 'wb') as index_file:
+        index_file.write(PACK_HEADER.pack(PACK_MAGIC, PACK_VERSION, 0, first_frame, count, generation))
+        index_file.write(entries)
+
+    # Running servers keep the archive they mapped on first use; they pick up
+    # a rebuilt one after a restart or FrameIndex.invalidate()
+    os.replace(data_tmp, data_path)
+    os.replace(index_tmp, index_path)
+    return len(numbers), offset
+
+
+class DirectoryIndex:
+    """Sorted frame numbers present in one image directory"""
+
+    __slots__ = ("directory", "prefix", "numbers", "irregular")
+
+    def __init__(self, directory, prefix, numbers, irregular):
+        self.directory = directory
+        self.prefix = prefix
+        self.numbers = numbers
+        # Files whose names don't use the standard 10-digit padding
+        self.irregular = irregular
+
+    def __len__(self):
+        return len(self.numbers)
+
+    def __contains__(self, number):
+        index = bisect_left(self.numbers, number)
+        return index < len(self.numbers) and self.numbers[index] == number
+
+    def get(self, number):
+        """Get the path of a frame, or None if there's no file for it"""
+        if number not in self:
+            return None
+        name = self.irregular.get(number) or f"{self.prefix}_{number:010d}.jpg"
+        return self.directory / name
+
+
+class FrameIndex:
+    """
+    Lookup of frame and thumbnail images by episode and frame number
+
+    Images come from a packed archive (`frames.pack`/`frames.idx` in the
+    episode directory) when one exists, otherwise from the loose files. Either
+    source is opened once on first use, so later lookups (including misses)
+    never touch the disk.
+    """
+
+    def __init__(self):
+        self._indexes = {}
+        self._packs = {}
+        self._lock = threading.Lock()
+
+    def _build(self, episode, kind):
+        """List an image directory into a DirectoryIndex"""
+        prefix = IMAGE_PREFIXES[kind]
+        directory = get_episode_dir(episode) / kind
+        numbers = []
+        irregular = {}
+        try:
+            with os.scandir(directory) as entries:
+                for entry in entries:
+                    match = FRAME_NAME_PATTERN.match(entry.name)
+                    if not match:
+                        continue
+                    number = int(match.group(1))
+                    numbers.append(number)
+                    if entry.name != f"{prefix}_{number:010d}.jpg":
+                        irregular[number] = entry.name
+        except FileNotFoundError:
+            # Cache missing episodes too, so repeated misses stay cheap
+            pass
+
+        numbers.sort()
+        return DirectoryIndex(directory, prefix, array('q', numbers), irregular)
+
+    def directory(self, episode, kind="frames"):
+        """Get the index of an episode's frames or thumbnails, building it on first use"""
+        if kind not in IMAGE_PREFIXES:
+            raise ValueError(f"Unknown image kind: {kind}")
+        if not EPISODE_PATTERN.match(episode):
+            raise ValueError(f"Invalid episode ID: {episode}")
+
+        key = (episode, kind)
+        index = self._indexes.get(key)
+        if index is None:
+            with self._lock:
+                index = self._indexes.get(key)
+                if index is None:
+                    index = self._build(episode, kind)
+                    self._indexes[key] = index
+        return index
+
+    def pack(self, episode, kind="frames"):
+        """Get the packed archive of an episode's frames or thumbnails, or None if it has none"""
+        if kind not in IMAGE_PREFIXES:
+            raise ValueError(f"Unknown image kind: {kind}")
+        if not EPISODE_PATTERN.match(episode):
+            raise ValueError(f"Invalid episode ID: {episode}")
+
+        key = (episode, kind)
+        if key not in self._packs:
+            with self._lock:
+                if key not in self._packs:
+                    episode_dir = get_episode_dir(episode)
+                    data_path = episode_dir / f"{kind}.pack"
+                    index_path = episode_dir / f"{kind}.idx"
+                    if not (index_path.exists() and data_path.exists()):
+                        self._packs[key] = None
+                        return None
+                    for attempt in range(PACK_OPEN_ATTEMPTS):
+                        try:
+                            self._packs[key] = PackedImages(data_path, index_path)
+                            break
+                        except ArchiveMismatch:
+                            # Caught between write_pack's two moves
+                            time.sleep(PACK_OPEN_DELAY)
+                    else:
+                        # Use the loose files for now and try the archive again next time
+                        return None
+        return self._packs[key]
+
+    def lookup(self, episode, kind, number):
+        """Get the path of a loose frame or thumbnail file, or None if it doesn't exist"""
+        return self.directory(episode, kind).get(number)
+
+    def has(self, episode, kind, number):
+        """Check whether a frame or thumbnail exists in either the archive or loose files"""
+        pack = self.pack(episode, kind)
+        if pack is not None:
+            return number in pack
+        return number in self.directory(episode, kind)
+
+    def read(self, episode, kind, number):
+        """Get the bytes of a frame or thumbnail, or None if it doesn't exist"""
+        pack = self.pack(episode, kind)
+        if pack is not None:
+            return pack.read(number)
+
+        path = self.lookup(episode, kind, number)
+        if path is None:
+            return None
+        with open(path, 'rb') as f:
+            return f.read()
+
+    def invalidate(self, episode=None):
+        """Forget cached listings and archives so they are reopened on next use"""
+        with self._lock:
+            if episode is None:
+                self._indexes.clear()
+                self._packs.clear()
+            else:
+                for kind in IMAGE_PREFIXES:
+                    self._indexes.pop((episode, kind), None)
+                    self._packs.pop((episode, kind), None)
+
+
+# Create a singleton frame index
+frame_index = FrameIndex()
@@ -0,0 +1,124 @@
+import struct
+
+from PIL import Image, ImageChops, GifImagePlugin
+
+# Palette index kept free for unchanged pixels in delta frames
+TRANSPARENT_INDEX = 255
+
+# Frames sampled for the global palette are scaled down to about this many pixels each
+PALETTE_SAMPLE_PIXELS = 64 * 1024
+
+
+def build_palette(samples, colors=256):
+    """
+    Quantize a sample of frames to one palette shared by every frame of a GIF
+
+    The samples are scaled down and stacked into a single image, so the palette
+    covers colours from across the whole range rather than just the first frame.
+    Slots the quantizer didn't use repeat the first colour, so frames quantized
+    to the palette never land on a colour that isn't in it.
+    """
+    thumbnails = []
+    for img in samples:
+        scale = min(1.0, (PALETTE_SAMPLE_PIXELS / (img.width * img.height)) ** 0.5)
+        size = (max(1, int(img.width * scale)), max(1, int(img.height * scale)))
+        thumbnails.append(img.convert('RGB').resize(size, Image.BILINEAR))
+
+    montage = Image.new('RGB', (max(t.width for t in thumbnails), sum(t.height for t in thumbnails)))
+    y = 0
+    for thumbnail in thumbnails:
+        montage.paste(thumbnail, (0, y))
+        y += thumbnail.height
+
+    palette = montage.quantize(colors)
+    # Pillow pads unused slots with black, which real dark pixels would otherwise map to
+    count = palette.getextrema()[1] + 1
+    colours = palette.getpalette()[:count * 3]
+    palette.putpalette(colours + colours[:3] * (256 - count))
+    return palette
+
+
+class GifStreamWriter:
+    """
+    Animated GIF writer that encodes each frame as soon as it's added
+
+    All frames are mapped to one global palette, so nothing but the previous
+    frame's palette indexes (for delta frames) is kept between calls. With
+    `deltas`, every frame after the first only stores the rectangle that
+    changed, with unchanged pixels inside it left transparent.
+    """
+
+    def __init__(self, fp, size, palette, duration, loop=0, deltas=False):
+        """
+        Write the GIF header
+
+        Args:
+            fp: Writable binary file
+            size: (width, height) of every frame
+            palette: Palette image from build_palette; with `deltas` it must be built
+                with colors=TRANSPARENT_INDEX, so that slot only repeats another colour
+            duration: Seconds each frame is shown
+            loop: Number of loops, 0 for forever
+            deltas: Store only the changes between frames
+        """
+        self.fp = fp
+        self.size = size
+        self.palette = palette
+        self.duration = int(round(duration * 1000))
+        self.deltas = deltas
+        self.frames = 0
+        self._previous = None
+
+        # Pixels quantized to TRANSPARENT_INDEX are moved to the real entry it duplicates
+        self._remap = None
+        if deltas:
+            colours = palette.getpalette()
+            fill = colours[TRANSPARENT_INDEX * 3:TRANSPARENT_INDEX * 3 + 3]
+            alias = next(
+                (index for index in range(TRANSPARENT_INDEX) if colours[index * 3:index * 3 + 3] == fill),
+                None
+            )
+            if alias is None:
+                raise ValueError("Delta frames need a palette built with colors=TRANSPARENT_INDEX")
+            self._remap = [alias if index == TRANSPARENT_INDEX else index for index in range(256)]
+
+        palette_bytes = bytes(palette.getpalette()[:768]).ljust(768, b'\0')
+        # Global colour table of 256 entries, 8 bits per primary
+        fp.write(b'GIF89a' + struct.pack('<HHBBB', size[0], size[1], 0xF7, 0, 0) + palette_bytes)
+        fp.write(b'!\xff\x0bNETSCAPE2.0\x03\x01' + struct.pack('<H', loop) + b'\0')
+
+    def add_frame(self, img):
+        """Quantize an RGB frame to the palette and write it"""
+        if img.size != self.size:
+            raise ValueError(f"Frame size {img.size} doesn't match GIF size {self.size}")
+
+        # Dithering would scatter noise into unchanged areas and defeat delta frames
+        dither = Image.Dither.NONE if self.deltas else Image.Dither.FLOYDSTEINBERG
+        frame = img.convert('RGB').quantize(palette=self.palette, dither=dither)
+        offset = (0, 0)
+        params = {'duration': self.duration}
+
+        if self.deltas:
+            frame = frame.point(self._remap)
+            # Compare raw palette indexes; the frame is shown over the previous one (disposal 1)
+            indexes = Image.frombytes('L', self.size, frame.tobytes())
+            params['disposal'] = 1
+            if self._previous is not None:
+                changed = ImageChops.difference(indexes, self._previous)
+                bbox = changed.getbbox() or (0, 0, 1, 1)
+                mask = changed.crop(bbox).point(lambda value: 255 if value else 0)
+
+                delta = Image.new('P', mask.size, TRANSPARENT_INDEX)
+                delta.paste(frame.crop(bbox), (0, 0), mask)
+                frame = delta
+                offset = bbox[:2]
+                params['transparency'] = TRANSPARENT_INDEX
+            self._previous = indexes
+
+        for chunk in GifImagePlugin.getdata(frame, offset, **params):
+            self.fp.write(chunk)
+        self.frames += 1
+
+    def close(self):
+        """Write the GIF trailer"""
+        self.fp.write(b';')
@@ -0,0 +1,87 @@
+#!/usr/bin/env python3
+"""
+Script to build the keyframe index of every episode video
+Writes video.keyframes.json next to each video.mkv so clips can stream-copy
+whole GOPs, and optionally pre-cuts the copyable segment of every subtitle
+"""
+
+import sys
+import logging
+import argparse
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+# Add the parent directory to the path so we can import the application modules
+parent_dir = Path(__file__).resolve().parent
+sys.path.append(str(parent_dir))
+
+# Configure logging
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger(__name__)
+
+from config import config
+from database import Database
+from media_generator import ClipGenerator
+from pack_frames import find_episodes
+from utils import get_episode_dir
+from video_index import build_index, video_index
+
+
+def index_episode(episode):
+    """Build the keyframe index of one episode, returning False if it has no video"""
+    if not (get_episode_dir(episode) / "video.mkv").exists():
+        logger.warning(f"No video for {episode}, skipping")
+        return False
+    keyframes = build_index(episode)
+    logger.info(f"{episode}: indexed {keyframes} keyframes")
+    return True
+
+
+def precut_episode(episode, subtitles):
+    """Cut the copyable GOP range of each subtitle into the segment cache"""
+    index = video_index.get(episode)
+    if index is None:
+        return 0
+
+    generator = ClipGenerator()
+    video_path = generator.get_video_path(episode)
+    ranges = set()
+    for _, start_ms, end_ms in subtitles:
+        if start_ms is None or end_ms is None:
+            continue
+        inner = index.inner_range(start_ms / 1000, end_ms / 1000)
+        if inner is not None:
+            ranges.add(inner)
+
+    for first_keyframe, last_keyframe in sorted(ranges):
+        generator.copy_segment(episode, video_path, first_keyframe, last_keyframe)
+    logger.info(f"{episode}: cut {len(ranges)} segments")
+    return len(ranges)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Index episode keyframes for stream-copied clips")
+    parser.add_argument('--episode', action='append', help="Only index this episode (e.g. S01E04), repeatable")
+    parser.add_argument('--workers', type=int, default=4, help="Episodes probed in parallel")
+    parser.add_argument('--precut', action='store_true',
+                        help="Also cut the stream-copyable segment of every subtitle")
+    parser.add_argument('--db', help="Path to subtitles.db for --precut (defaults to the configured database_path)")
+    args = parser.parse_args()
+
+    episodes = args.episode or find_episodes(config.static_dir)
+
+    # ffprobe does the work, so threads are enough to keep several running
+    with ThreadPoolExecutor(max_workers=args.workers) as executor:
+        indexed = [episode for episode, ok in zip(episodes, executor.map(index_episode, episodes)) if ok]
+
+    if args.precut:
+        subtitles_by_episode = Database(args.db).get_subtitle_times(indexed)
+        with ThreadPoolExecutor(max_workers=args.workers) as executor:
+            list(executor.map(precut_episode, subtitles_by_episode.keys(), subtitles_by_episode.values()))
+
+
+if __name__ == "__main__":
+    main()
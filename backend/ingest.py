@@ -0,0 +1,231 @@
+#!/usr/bin/env python3
+"""
+Script to build subtitles.db from the subtitles.csv and title.txt of every episode
+Only episodes whose files changed since the last run are loaded again, then
+the derived indexes (episode codes, millisecond times, full-text search) are
+brought up to date. The result is published as a new database version that
+running servers switch to (see db_versions.py)
+"""
+
+import csv
+import sys
+import hashlib
+import logging
+import argparse
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+# Add the parent directory to the path so we can import the application modules
+parent_dir = Path(__file__).resolve().parent
+sys.path.append(str(parent_dir))
+
+import db_versions
+from config import config
+from database import Database
+from utils import parse_timestamp
+
+logger = logging.getLogger(__name__)
+
+# Accepted header names of each subtitles.csv column
+COLUMN_ALIASES = {
+    'subtitle_number': ('subtitle_number', 'number', 'index'),
+    'timestamp': ('timestamp',),
+    'timestamp_start': ('timestamp_start', 'start'),
+    'timestamp_end': ('timestamp_end', 'end'),
+    'content': ('content', 'text', 'dialogue'),
+    'start_frame': ('start_frame',),
+    'end_frame': ('end_frame',)
+}
+
+
+def find_episodes(static_dir, episodes=None):
+    """Get the directory of every episode with a subtitles.csv, by episode code"""
+    found = {}
+    for episode_dir in sorted(Path(static_dir).glob("Season */S[0-9][0-9]E[0-9][0-9]")):
+        if (episode_dir / "subtitles.csv").is_file() and (not episodes or episode_dir.name in episodes):
+            found[episode_dir.name] = episode_dir
+    return found
+
+
+def episode_hash(episode_dir):
+    """Hash the files an episode is loaded from, to tell whether it changed since the last ingest"""
+    digest = hashlib.blake2b(digest_size=16)
+    for name in ("subtitles.csv", "title.txt"):
+        path = episode_dir / name
+        digest.update(path.read_bytes() if path.is_file() else b'')
+        digest.update(b'\0')
+    return digest.hexdigest()
+
+
+def parse_int(value):
+    """Parse an optional integer field"""
+    value = (value or '').strip()
+    return int(float(value)) if value else None
+
+
+def parse_ms(timestamp):
+    """Parse an optional HH:MM:SS,mmm field to milliseconds, or None if it's empty or malformed"""
+    try:
+        return round(parse_timestamp(timestamp) * 1000) if timestamp else None
+    except ValueError:
+        return None
+
+
+def parse_episode(episode_dir, static_dir, file_hash):
+    """
+    Read an episode's title and subtitles
+
+    Runs in a worker process. Returns the dict Database.ingest_episodes takes,
+    with subtitle rows in INGEST_COLUMNS order.
+    """
+    code = episode_dir.name
+    title_path = episode_dir / "title.txt"
+    title = title_path.read_text(encoding='utf-8').strip() if title_path.is_file() else None
+
+    subtitles = []
+    with open(episode_dir / "subtitles.csv", newline='', encoding='utf-8-sig') as f:
+        reader = csv.DictReader(f)
+        headers = {(name or '').strip().lower(): name for name in reader.fieldnames or ()}
+        columns = {
+            column: next((headers[alias] for alias in aliases if alias in headers), None)
+            for column, aliases in COLUMN_ALIASES.items()
+        }
+        if columns['content'] is None:
+            raise ValueError(f"{episode_dir / 'subtitles.csv'} has no content column")
+
+        for position, record in enumerate(reader, 1):
+            values = {column: (record.get(name) or '').strip() if name else '' for column, name in columns.items()}
+            if not any(values.values()):
+                continue
+
+            # Either column form of the times is enough to derive the other
+            start, end = values['timestamp_start'], values['timestamp_end']
+            if (not start or not end) and '-->' in values['timestamp']:
+                start, end = (part.strip() for part in values['timestamp'].split('-->', 1))
+            timestamp = values['timestamp'] or (f"{start} --> {end}" if start and end else None)
+
+            subtitles.append((
+                parse_int(values['subtitle_number']) or position,
+                timestamp,
+                start or None,
+                end or None,
+                values['content'],
+                parse_int(values['start_frame']),
+                parse_int(values['end_frame']),
+                parse_ms(start),
+                parse_ms(end)
+            ))
+
+    return {
+        "code": code,
+        "season": int(code[1:3]),
+        "episode": int(code[4:6]),
+        "title": title,
+        "file_path": (episode_dir / "subtitles.csv").relative_to(static_dir).as_posix(),
+        "hash": file_hash,
+        "subtitles": subtitles
+    }
+
+
+def ingest(database, static_dir, args):
+    """Load new and changed episodes and bring the derived indexes up to date; returns whether anything changed"""
+    episode_dirs = find_episodes(static_dir, args.episode)
+    known = database.get_ingested_hashes()
+    # A first or full load goes in without indexes, which are built once at the end
+    rebuild = args.full or not known
+
+    hashes = {code: episode_hash(episode_dir) for code, episode_dir in episode_dirs.items()}
+    changed = [code for code in episode_dirs if args.full or hashes[code] != known.get(code)]
+    removed = [code for code in known if code not in episode_dirs] if args.prune and not args.episode else []
+    logger.info(
+        f"{len(episode_dirs)} episodes in {static_dir}: {len(changed)} new or changed, "
+        f"{len(removed)} removed"
+    )
+
+    if not changed and not removed and not rebuild:
+        return False
+
+    if changed or removed:
+        with ProcessPoolExecutor(max_workers=args.workers) as executor:
+            episodes = list(executor.map(
+                parse_episode,
+                [episode_dirs[code] for code in changed],
+                [static_dir] * len(changed),
+                [hashes[code] for code in changed]
+            ))
+
+        logger.info(f"Loading {sum(len(episode['subtitles']) for episode in episodes)} subtitles into {database.db_path}")
+        database.ingest_episodes(episodes, removed, rebuild=rebuild)
+
+    # Derived structures are built once on a new load; afterwards their triggers keep them current
+    logger.info("Creating indexes")
+    database.build_indexes()
+    if rebuild or not database.has_episode_codes:
+        logger.info("Materializing episode codes")
+        database.build_episode_codes()
+    if rebuild or not database.has_timestamp_ms:
+        logger.info("Materializing millisecond timestamps")
+        database.build_timestamp_ms()
+    if rebuild or not database.has_search_index:
+        logger.info("Building full-text search index")
+        database.build_search_index(tokenizer=args.tokenizer)
+    logger.info("Ingest complete")
+    return True
+
+
+def main():
+    logging.basicConfig(
+        level=logging.INFO,
+        format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+    )
+
+    parser = argparse.ArgumentParser(description="Load episode subtitles from the static directory into subtitles.db")
+    parser.add_argument('--db', help="Path to subtitles.db (defaults to the configured database_path)")
+    parser.add_argument('--static-dir', help="Static directory to read (defaults to the configured static_dir)")
+    parser.add_argument('--episode', action='append', help="Only ingest this episode (e.g. S01E04), repeatable")
+    parser.add_argument('--full', action='store_true',
+                        help="Reload every episode even if unchanged, rebuilding all indexes")
+    parser.add_argument('--prune', action='store_true',
+                        help="Delete previously ingested episodes whose directories are gone")
+    parser.add_argument('--workers', type=int, default=None, help="Worker processes (defaults to CPU count)")
+    parser.add_argument('--tokenizer', help="FTS5 tokenizer, e.g. 'trigram' or 'porter unicode61'")
+    parser.add_argument('--in-place', action='store_true',
+                        help="Write to the database directly instead of publishing a new version")
+    args = parser.parse_args()
+
+    static_dir = Path(args.static_dir) if args.static_dir else config.static_dir
+    db_path = Path(args.db) if args.db else config.database_path
+
+    if args.in_place:
+        target = db_path
+    else:
+        target = db_versions.new_version_path(db_path)
+        # Changes are made to a copy, which servers keep reading the live version during;
+        # a full reload starts from one too, so subtitle IDs and selected keyframes carry over
+        if db_path.exists():
+            logger.info(f"Copying {db_path} to {target.name}")
+            db_versions.copy_database(db_path, target)
+
+    database = Database(target)
+    try:
+        published = ingest(database, static_dir, args)
+        # Pooled connections would keep the version in WAL mode
+        database.pool.close()
+        if published and not args.in_place:
+            db_versions.finalize(target)
+    except BaseException:
+        if not args.in_place:
+            db_versions.remove_version(target)
+        raise
+
+    if args.in_place:
+        return
+    if not published:
+        db_versions.remove_version(target)
+        logger.info("Nothing changed, no new version published")
+        return
+    db_versions.publish(db_path, target)
+
+
+if __name__ == "__main__":
+    main()
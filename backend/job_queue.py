@@ -0,0 +1,313 @@
+import os
+import json
+import time
+import uuid
+import sqlite3
+import logging
+import threading
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from contextlib import contextmanager
+from functools import partial
+from pathlib import Path
+
+from config import config
+
+logger = logging.getLogger(__name__)
+
+# Job lifecycle
+QUEUED = 'queued'
+RUNNING = 'running'
+DONE = 'done'
+FAILED = 'failed'
+
+
+def run_job(kind, params):
+    """Run a generation job in a worker process and return the media URL"""
+    # Imported here so the web process doesn't need the generators to queue jobs
+    from media_generator import GifGenerator, ClipGenerator
+
+    if kind == 'gif':
+        return GifGenerator().create_gif(**params)
+    if kind == 'clip':
+        return ClipGenerator().create_clip(**params)
+    raise ValueError(f"Unknown job type: {kind}")
+
+
+class JobQueue:
+    """
+    Persistent queue of media generation jobs
+
+    Jobs are rows in a small SQLite database, so queued work survives restarts
+    and several processes (gunicorn workers, job_worker.py) can share one queue.
+    Each process that calls start() runs a dispatcher thread which claims jobs
+    and hands them to a bounded pool of worker processes. A claim is a lease:
+    a job whose runner died is picked up again once its lease runs out.
+    """
+
+    def __init__(self, db_path, workers=2, poll_interval=1.0, timeout=600, max_attempts=2):
+        """
+        Initialize the queue
+
+        Args:
+            db_path: Path of the SQLite job database, created if missing
+            workers: Worker processes this process runs jobs on
+            poll_interval: Seconds between checks for jobs queued by other processes
+            timeout: Seconds a job may run before its lease expires
+            max_attempts: Times a job is started before it's marked failed
+        """
+        self.db_path = Path(db_path)
+        self.workers = workers
+        self.poll_interval = poll_interval
+        self.timeout = timeout
+        self.max_attempts = max_attempts
+
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._slots = None
+        self._executor = None
+        self._thread = None
+        self._pid = None
+        self._schema_ready = False
+
+    @contextmanager
+    def _connect(self):
+        """Open a short-lived autocommit connection"""
+        if not self._schema_ready:
+            self.db_path.parent.mkdir(parents=True, exist_ok=True)
+        conn = sqlite3.connect(str(self.db_path), timeout=30, isolation_level=None)
+        conn.row_factory = sqlite3.Row
+        try:
+            if not self._schema_ready:
+                self._create_schema(conn)
+            yield conn
+        finally:
+            conn.close()
+
+    def _create_schema(self, conn):
+        """Create the jobs table on first use"""
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS jobs (
+                id TEXT PRIMARY KEY,
+                kind TEXT NOT NULL,
+                params TEXT NOT NULL,
+                status TEXT NOT NULL,
+                result TEXT,
+                error TEXT,
+                attempts INTEGER NOT NULL DEFAULT 0,
+                created_at REAL NOT NULL,
+                started_at REAL,
+                finished_at REAL,
+                lease_until REAL,
+                key TEXT
+            )
+        """)
+        # Queues created before jobs had keys
+        columns = {row[1] for row in conn.execute("PRAGMA table_info(jobs)")}
+        if 'key' not in columns:
+            conn.execute("ALTER TABLE jobs ADD COLUMN key TEXT")
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_jobs_status ON jobs(status, created_at)")
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_jobs_key ON jobs(key, status)")
+        self._schema_ready = True
+
+    def submit(self, kind, params, key=None):
+        """
+        Queue a job and return its ID
+
+        If `key` is given and a job with the same key is still queued or
+        running, that job's ID is returned instead of queueing a duplicate.
+        """
+        job_id = uuid.uuid4().hex
+        with self._connect() as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                existing = None
+                if key is not None:
+                    existing = conn.execute(
+                        "SELECT id FROM jobs WHERE key = ? AND status IN (?, ?) LIMIT 1",
+                        (key, QUEUED, RUNNING)
+                    ).fetchone()
+                if existing is None:
+                    conn.execute(
+                        "INSERT INTO jobs (id, kind, params, status, created_at, key) VALUES (?, ?, ?, ?, ?, ?)",
+                        (job_id, kind, json.dumps(params), QUEUED, time.time(), key)
+                    )
+                conn.execute("COMMIT")
+            except Exception:
+                conn.execute("ROLLBACK")
+                raise
+
+        if existing is not None:
+            return existing['id']
+        self._wakeup.set()
+        return job_id
+
+    def get(self, job_id):
+        """Get a job as a dict, or None if it doesn't exist"""
+        with self._connect() as conn:
+            row = conn.execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        if row is None:
+            return None
+
+        job = dict(row)
+        job['params'] = json.loads(job['params'])
+        return job
+
+    def purge(self, older_than):
+        """Delete finished jobs that ended more than `older_than` seconds ago"""
+        with self._connect() as conn:
+            cursor = conn.execute(
+                "DELETE FROM jobs WHERE status IN (?, ?) AND finished_at < ?",
+                (DONE, FAILED, time.time() - older_than)
+            )
+            return cursor.rowcount
+
+    def _claim(self):
+        """Take the oldest runnable job, or None if there is none"""
+        now = time.time()
+        with self._connect() as conn:
+            # IMMEDIATE takes the write lock up front, so two dispatchers can't claim the same job
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                # Jobs whose lease ran out on their last allowed attempt are given up on
+                conn.execute(
+                    "UPDATE jobs SET status = ?, error = ?, finished_at = ? "
+                    "WHERE status = ? AND lease_until < ? AND attempts >= ?",
+                    (FAILED, "Job timed out", now, RUNNING, now, self.max_attempts)
+                )
+                row = conn.execute(
+                    "SELECT id, kind, params, attempts FROM jobs "
+                    "WHERE status = ? OR (status = ? AND lease_until < ?) "
+                    "ORDER BY created_at LIMIT 1",
+                    (QUEUED, RUNNING, now)
+                ).fetchone()
+                if row is not None:
+                    conn.execute(
+                        "UPDATE jobs SET status = ?, attempts = ?, started_at = ?, lease_until = ? WHERE id = ?",
+                        (RUNNING, row['attempts'] + 1, now, now + self.timeout, row['id'])
+                    )
+                conn.execute("COMMIT")
+            except Exception:
+                conn.execute("ROLLBACK")
+                raise
+
+        if row is None:
+            return None
+        return {
+            'id': row['id'],
+            'kind': row['kind'],
+            'params': json.loads(row['params']),
+            'attempts': row['attempts'] + 1
+        }
+
+    def _finish(self, job, future):
+        """Record the outcome of a job once its worker returns"""
+        self._slots.release()
+        self._wakeup.set()
+
+        error = future.exception()
+        if error is None:
+            status, result, message = DONE, future.result(), None
+        else:
+            status, result, message = FAILED, None, str(error) or error.__class__.__name__
+            logger.error(f"Job {job['id']} ({job['kind']}) failed: {message}")
+            if isinstance(error, BrokenProcessPool):
+                with self._lock:
+                    self._executor = None
+
+        with self._connect() as conn:
+            # A job that outlived its lease may have been claimed again; only the current attempt may finish it
+            conn.execute(
+                "UPDATE jobs SET status = ?, result = ?, error = ?, finished_at = ?, lease_until = NULL "
+                "WHERE id = ? AND attempts = ?",
+                (status, result, message, time.time(), job['id'], job['attempts'])
+            )
+
+    def _get_executor(self):
+        with self._lock:
+            if self._executor is None:
+                # Spawned workers don't inherit the web process's threads, locks or connections
+                self._executor = ProcessPoolExecutor(
+                    max_workers=self.workers,
+                    mp_context=multiprocessing.get_context('spawn')
+                )
+            return self._executor
+
+    def _submit(self, job):
+        """Hand a claimed job to the worker pool"""
+        try:
+            return self._get_executor().submit(run_job, job['kind'], job['params'])
+        except BrokenProcessPool:
+            # A worker died since the last job finished; start a fresh pool
+            with self._lock:
+                self._executor = None
+            return self._get_executor().submit(run_job, job['kind'], job['params'])
+
+    def _dispatch(self):
+        """Dispatcher loop: keep every worker slot busy while there are jobs"""
+        while True:
+            while self._slots.acquire(blocking=False):
+                try:
+                    job = self._claim()
+                except sqlite3.Error:
+                    logger.exception("Error claiming job")
+                    job = None
+                if job is None:
+                    self._slots.release()
+                    break
+
+                logger.info(f"Starting job {job['id']} ({job['kind']}, attempt {job['attempts']})")
+                try:
+                    future = self._submit(job)
+                except Exception:
+                    # The job stays claimed and is retried once its lease runs out
+                    logger.exception(f"Error starting job {job['id']}")
+                    self._slots.release()
+                    break
+                future.add_done_callback(partial(self._finish, job))
+
+            self._wakeup.wait(self.poll_interval)
+            self._wakeup.clear()
+
+    def start(self):
+        """Start the dispatcher in this process if it isn't running yet"""
+        # A forked child (e.g. a gunicorn worker) gets its own dispatcher and pool
+        if self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._pid == os.getpid():
+                return
+            self._pid = os.getpid()
+            self._executor = None
+            self._slots = threading.BoundedSemaphore(self.workers)
+            self._thread = threading.Thread(target=self._dispatch, name="job-dispatcher", daemon=True)
+            self._thread.start()
+
+    def run_forever(self):
+        """Start the dispatcher and block, for a dedicated worker process"""
+        self.start()
+        self._thread.join()
+
+    def stats(self):
+        """Get the number of jobs in each state"""
+        with self._connect() as conn:
+            rows = conn.execute("SELECT status, COUNT(*) FROM jobs GROUP BY status").fetchall()
+        return {status: count for status, count in rows}
+
+
+def create_job_queue():
+    """Create the job queue from the configuration"""
+    db_path = config.get('jobs.db_path')
+    return JobQueue(
+        db_path or config.media_output_dir / "jobs.db",
+        workers=config.get('jobs.workers', 2),
+        poll_interval=config.get('jobs.poll_interval', 1.0),
+        timeout=config.get('jobs.timeout', 600),
+        max_attempts=config.get('jobs.max_attempts', 2)
+    )
+
+
+# Create a singleton job queue
+job_queue = create_job_queue()
@@ -0,0 +1,40 @@
+#!/usr/bin/env python3
+"""
+Script to run GIF and clip generation jobs outside the web server
+Set jobs.run_in_app to false in config.json when running this, so the API
+workers only queue jobs
+"""
+
+import sys
+import logging
+import argparse
+from pathlib import Path
+
+# Add the parent directory to the path so we can import the application modules
+parent_dir = Path(__file__).resolve().parent
+sys.path.append(str(parent_dir))
+
+# Configure logging
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger(__name__)
+
+from job_queue import job_queue
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run queued GIF and clip generation jobs")
+    parser.add_argument('--workers', type=int, help="Worker processes (defaults to jobs.workers)")
+    args = parser.parse_args()
+
+    if args.workers:
+        job_queue.workers = args.workers
+
+    logger.info(f"Processing jobs from {job_queue.db_path} with {job_queue.workers} workers")
+    job_queue.run_forever()
+
+
+if __name__ == "__main__":
+    main()
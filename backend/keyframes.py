@@ -0,0 +1,139 @@
+#!/usr/bin/env python3
+"""
+Script to pick representative frames for every subtitle
+Scores the frames of each subtitle for sharpness and scene changes and
+stores the best ones in the subtitle_keyframes table
+"""
+
+import io
+import sys
+import logging
+import argparse
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+from PIL import Image, ImageChops, ImageFilter, ImageStat
+
+# Add the parent directory to the path so we can import the application modules
+parent_dir = Path(__file__).resolve().parent
+sys.path.append(str(parent_dir))
+
+from config import config
+from database import Database
+from frame_store import frame_index
+
+logger = logging.getLogger(__name__)
+
+# Frames are scored on a small grayscale decode, which JPEG draft mode makes cheap
+SCORE_SIZE = (160, 90)
+
+# Upper bound on frames scored per subtitle; long lines are sampled evenly
+MAX_CANDIDATES = 24
+
+# How much a scene change counts relative to sharpness
+SCENE_CHANGE_WEIGHT = 0.5
+
+
+def load_thumbnail(data):
+    """Decode a frame's JPEG bytes at reduced size in grayscale, or None if it can't be read"""
+    try:
+        with Image.open(io.BytesIO(data)) as img:
+            img.draft('L', SCORE_SIZE)
+            return img.convert('L').resize(SCORE_SIZE)
+    except (OSError, ValueError):
+        return None
+
+
+def sharpness(img):
+    """Edge energy of a frame; blurry or motion-smeared frames score low"""
+    return ImageStat.Stat(img.filter(ImageFilter.FIND_EDGES)).var[0]
+
+
+def select_keyframes(episode, start_frame, end_frame, count=3):
+    """
+    Pick up to `count` representative frames between start_frame and end_frame
+
+    The range is split into `count` equal segments and the best frame of each
+    is kept, so the picks are spread across the line. A frame's score is its
+    sharpness plus a bonus for differing from the previous candidate, which
+    favours the first clean frame after a cut.
+    """
+    if start_frame is None or end_frame is None or end_frame < start_frame:
+        return []
+
+    total = end_frame - start_frame + 1
+    step = max(1, total // MAX_CANDIDATES)
+    candidates = range(start_frame, end_frame + 1, step)
+
+    scored = []
+    previous = None
+    for frame_num in candidates:
+        data = frame_index.read(episode, "frames", frame_num)
+        img = load_thumbnail(data) if data is not None else None
+        if img is None:
+            continue
+
+        score = sharpness(img)
+        if previous is not None:
+            change = ImageStat.Stat(ImageChops.difference(img, previous)).mean[0]
+            score += SCENE_CHANGE_WEIGHT * change * change
+        previous = img
+        scored.append((frame_num, score))
+
+    if not scored:
+        return []
+
+    picks = []
+    segment = total / count
+    for i in range(count):
+        low = start_frame + segment * i
+        high = start_frame + segment * (i + 1)
+        in_segment = [item for item in scored if low <= item[0] < high]
+        if in_segment:
+            picks.append(max(in_segment, key=lambda item: item[1])[0])
+
+    return sorted(set(picks))
+
+
+def select_episode_keyframes(episode, subtitles, count):
+    """Select keyframes for all subtitles of one episode"""
+    if frame_index.pack(episode) is None and not len(frame_index.directory(episode)):
+        logger.warning(f"No frames for {episode}, skipping")
+        return []
+
+    return [
+        (subtitle_id, select_keyframes(episode, start_frame, end_frame, count))
+        for subtitle_id, start_frame, end_frame in subtitles
+    ]
+
+
+def main():
+    logging.basicConfig(
+        level=logging.INFO,
+        format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+    )
+
+    parser = argparse.ArgumentParser(description="Select representative frames for each subtitle")
+    parser.add_argument('--db', help="Path to subtitles.db (defaults to the configured database_path)")
+    parser.add_argument('--count', type=int, default=config.get('keyframes.count', 3),
+                        help="Frames to select per subtitle")
+    parser.add_argument('--workers', type=int, default=None, help="Worker processes (defaults to CPU count)")
+    parser.add_argument('--episode', action='append', help="Only process this episode (e.g. S01E04), repeatable")
+    args = parser.parse_args()
+
+    database = Database(args.db)
+    subtitles_by_episode = database.get_frame_ranges(args.episode)
+
+    with ProcessPoolExecutor(max_workers=args.workers) as executor:
+        futures = {
+            episode: executor.submit(select_episode_keyframes, episode, subtitles, args.count)
+            for episode, subtitles in subtitles_by_episode.items()
+        }
+        for episode, future in futures.items():
+            selections = [(subtitle_id, picks) for subtitle_id, picks in future.result() if picks]
+            database.store_keyframes(selections)
+            logger.info(f"{episode}: stored keyframes for {len(selections)} subtitles")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,68 @@
+#!/usr/bin/env python3
+"""
+Script to create, list and revoke API keys
+Running servers pick up changes within api.key_refresh_interval seconds
+"""
+
+import sys
+import logging
+import argparse
+import datetime
+from pathlib import Path
+
+# Add the parent directory to the path so we can import the application modules
+parent_dir = Path(__file__).resolve().parent
+sys.path.append(str(parent_dir))
+
+# Configure logging
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger(__name__)
+
+from api_keys import api_keys, TIERS
+
+
+def format_time(timestamp):
+    """Format a Unix timestamp for the key list"""
+    if timestamp is None:
+        return '-'
+    return datetime.datetime.fromtimestamp(timestamp).strftime('%Y-%m-%d %H:%M')
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Manage API keys")
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    create = commands.add_parser('create', help="Issue a new key")
+    create.add_argument('--tier', choices=TIERS, default='free', help="Subscription tier")
+    create.add_argument('--name', help="Who or what the key is for")
+    create.add_argument('--daily-limit', type=int, help="Requests per day, instead of the tier's limit")
+
+    listing = commands.add_parser('list', help="List keys")
+    listing.add_argument('--all', action='store_true', help="Include revoked keys")
+
+    revoke = commands.add_parser('revoke', help="Revoke a key")
+    revoke.add_argument('key', help="The key, or its prefix as shown by list")
+
+    args = parser.parse_args()
+
+    if args.command == 'create':
+        api_key = api_keys.create(args.tier, name=args.name, daily_limit=args.daily_limit)
+        # The key can't be recovered from the store, so this is the only time it's shown
+        print(api_key)
+    elif args.command == 'list':
+        for key in api_keys.list_keys(include_revoked=args.all):
+            print(f"{key['prefix']}  {key['tier']:<8}  {key['daily_limit'] or '-':>8}  "
+                  f"{format_time(key['created_at'])}  {format_time(key['revoked_at'])}  {key['name'] or ''}")
+    elif args.command == 'revoke':
+        revoked = api_keys.revoke(args.key)
+        if not revoked:
+            logger.error(f"No active key matches {args.key}")
+            sys.exit(1)
+        logger.info(f"Revoked {revoked} key(s)")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,18 +1,145 @@
+import io
 import os
+import re
+import json
+import time
+import sqlite3
+import hashlib
 import logging
+import tempfile
+import threading
 import subprocess
+from collections import deque
+from contextlib import nullcontext
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
-import tempfile
-from PIL import Image, ImageDraw, ImageFont
+from PIL import Image
 import imageio
-import uuid
 import datetime
-import shutil
 
 from config import config
+from frame_store import frame_index
+from media_manifest import media_manifest
+from gif_encoder import GifStreamWriter, build_palette, TRANSPARENT_INDEX
+from text_render import text_cache, draw_caption, resolve_font, DEFAULT_FONT
+from video_index import video_index
+from utils import parse_timestamp
 
 logger = logging.getLogger(__name__)
 
+# Part of every media ID; bump it when rendering changes so older output isn't reused
+RENDER_VERSION = 6
+
+# Quality names understood by the generators, anything else renders as medium
+QUALITY_LEVELS = ('low', 'medium', 'high')
+
+# Last-access times are only rewritten when older than this many seconds
+ACCESS_RESOLUTION = 3600
+
+# Files whose last access this process remembers before starting over
+MAX_TOUCHED = 100000
+
+# Seconds between checks while another request renders the same media
+RENDER_POLL_INTERVAL = 0.1
+
+# Characters with a meaning in FFmpeg filter options or filter graphs
+FILTER_SPECIAL_CHARS = re.compile(r"([\\':\[\],;])")
+
+# Thread pool shared by all GIF renders in the process; Pillow releases the GIL
+# while decoding, resizing and compositing, so frames are processed in parallel
+_frame_pool = None
+_frame_pool_workers = 0
+_frame_pool_lock = threading.Lock()
+
+
+def get_frame_pool():
+    """Get the process-wide frame pool and its size, creating it on first use"""
+    global _frame_pool, _frame_pool_workers
+    with _frame_pool_lock:
+        if _frame_pool is None:
+            _frame_pool_workers = config.get('gif.workers') or os.cpu_count() or 1
+            _frame_pool = ThreadPoolExecutor(max_workers=_frame_pool_workers, thread_name_prefix="gif-frame")
+        return _frame_pool, _frame_pool_workers
+
+
+def normalize_media_params(params):
+    """Normalize request parameters so equivalent requests produce the same media ID"""
+    normalized = {}
+    for key, value in params.items():
+        if value is None:
+            pass
+        elif key in ('subtitle_id', 'frame_id', 'start_frame', 'end_frame', 'start_ms', 'end_ms'):
+            value = int(value)
+        elif key in ('font', 'text_color', 'outline_color', 'format'):
+            value = str(value).strip().lower()
+        elif key == 'quality':
+            value = str(value).strip().lower()
+            if value not in QUALITY_LEVELS:
+                value = 'medium'
+        elif key == 'speed':
+            value = round(float(value), 3)
+        elif key == 'caption':
+            value = bool(value)
+        elif key in ('start_time', 'end_time'):
+            value = str(value).strip().replace(',', '.')
+        normalized[key] = value
+    return normalized
+
+
+def media_id(kind, **params):
+    """
+    Derive the content-addressed ID of a meme, GIF or clip
+    
+    The ID is a hash of the normalized parameters, so identical requests map to
+    the same output file and are rendered only once.
+    """
+    payload = json.dumps(
+        [RENDER_VERSION, kind, normalize_media_params(params)],
+        sort_keys=True, separators=(',', ':')
+    )
+    return hashlib.blake2b(payload.encode('utf-8'), digest_size=8).hexdigest()
+
+
+# When each generated file was last recorded as used by this process
+_last_touched = {}
+
+
+def touch_media(path):
+    """Record an access to a generated file; returns False if the file doesn't exist"""
+    if not os.path.exists(path):
+        return False
+    
+    # Expiry moves forward in the manifest at most once per file per ACCESS_RESOLUTION
+    now = time.time()
+    key = str(path)
+    if now - _last_touched.get(key, 0) > ACCESS_RESOLUTION:
+        if len(_last_touched) >= MAX_TOUCHED:
+            _last_touched.clear()
+        _last_touched[key] = now
+        try:
+            media_manifest.touch(path, now)
+        except sqlite3.Error:
+            logger.exception(f"Error recording access to {path}")
+    return True
+
+
+def format_srt_timestamp(seconds):
+    """Format seconds as an SRT timestamp (HH:MM:SS,mmm)"""
+    milliseconds = max(0, round(seconds * 1000))
+    hours, milliseconds = divmod(milliseconds, 3600000)
+    minutes, milliseconds = divmod(milliseconds, 60000)
+    seconds, milliseconds = divmod(milliseconds, 1000)
+    return f"{hours:02d}:{minutes:02d}:{seconds:02d},{milliseconds:03d}"
+
+
+def escape_filter_value(value):
+    """Escape a value for a filter option in an FFmpeg filter graph"""
+    # Once for the option parser, then again for the graph parser
+    for _ in range(2):
+        value = FILTER_SPECIAL_CHARS.sub(r"\\\1", value)
+    return value
+
+
 class MediaGenerator:
     """Base class for generating media from subtitles and frames"""
     
@@ -22,51 +149,26 @@ class MediaGenerator:
         self.output_dir = Path(config.get('media_output_dir', 'media_output'))
         
         # Create output directories if they don't exist
-        for dir_name in ['memes', 'gifs', 'clips']:
+        for dir_name in ['memes', 'gifs', 'clips', 'segments', 'subtitles', 'derivatives']:
             os.makedirs(self.output_dir / dir_name, exist_ok=True)
             
-        # Font paths for text rendering
+        # Font paths for text rendering; the directory is listed once per process
+        # and fonts are loaded through the shared cache in text_render
         self.font_dir = Path(config.get('font_dir', 'fonts'))
-        self.default_font = self.font_dir / 'impact.ttf'
+        self.default_font = resolve_font(DEFAULT_FONT)
         
-        # Check if the default font exists, if not use a system font
-        if not self.default_font.exists():
-            logger.warning(f"Default font not found at {self.default_font}, using system font")
-            self.default_font = None
+        # A render lock older than this belongs to a process that died mid-render
+        self.render_timeout = config.get('jobs.timeout', 600)
     
     def get_subtitle_info(self, subtitle_id):
         """Get subtitle information from database"""
         from database import db
         
         # Get basic subtitle info without all the surrounding frames and subtitles
-        with db.get_cursor() as cursor:
-            cursor.execute(
-                """
-                SELECT 
-                    s.id as subtitle_id,
-                    'S' || printf('%02d', s.season) || 'E' || printf('%02d', s.episode) as episode,
-                    e.title as episode_title,
-                    s.subtitle_number as index,
-                    s.timestamp_start,
-                    s.timestamp_end,
-                    s.content as dialogue,
-                    s.start_frame,
-                    s.end_frame
-                FROM subtitles s
-                JOIN episodes e ON s.season = e.season AND s.episode = e.episode_of_season
-                WHERE s.id = ?
-                """,
-                (subtitle_id,)
-            )
-            
-            row = cursor.fetchone()
-            if not row:
-                return None
-            
-            return dict(row)
+        return db.get_subtitle_info(subtitle_id)
     
     def get_frame_path(self, episode, frame_id):
-        """Get path to a frame image file"""
+        """Get path to a loose frame image file (frames may instead be in the episode's archive, see open_frame)"""
         season_num = int(episode[1:3])
         episode_num = int(episode[4:6])
         
@@ -76,6 +178,19 @@ class MediaGenerator:
         
         return frame_path
     
+    def has_frame(self, episode, frame_id):
+        """Check whether a frame exists, in the episode's archive or as a loose file"""
+        return frame_index.has(episode, "frames", frame_id)
+    
+    def open_frame(self, episode, frame_id):
+        """Open a frame image from the episode's archive or loose files"""
+        data = frame_index.read(episode, "frames", frame_id)
+        if data is None:
+            raise ValueError(f"Frame not found: {episode} {frame_id}")
+        img = Image.open(io.BytesIO(data))
+        img.load()
+        return img
+    
     def get_video_path(self, episode):
         """Get path to episode video file"""
         season_num = int(episode[1:3])
@@ -90,6 +205,58 @@ class MediaGenerator:
     def format_url(self, file_type, file_id, extension):
         """Format URL for generated media files"""
         return f"{self.cdn_base_url}/{file_type}s/{file_id}.{extension}"
+    
+    def claim_output(self, output_path):
+        """
+        Take the right to render output_path
+        
+        Returns None if the file already exists, after waiting for any render of
+        the same file already running in this or another process. Otherwise
+        returns a temporary path to render into; pass it to publish_output on
+        success and always to release_output afterwards.
+        """
+        lock_path = output_path.with_name(output_path.name + '.lock')
+        while True:
+            if touch_media(output_path):
+                return None
+            
+            try:
+                os.close(os.open(lock_path, os.O_CREAT | os.O_EXCL | os.O_WRONLY))
+            except FileExistsError:
+                try:
+                    if time.time() - os.path.getmtime(lock_path) > self.render_timeout:
+                        logger.warning(f"Removing stale render lock {lock_path}")
+                        os.remove(lock_path)
+                except FileNotFoundError:
+                    pass
+                time.sleep(RENDER_POLL_INTERVAL)
+                continue
+            
+            # The previous holder may have finished between the check and taking the lock
+            if output_path.exists():
+                os.remove(lock_path)
+                return None
+            
+            # Same extension as the output, since Pillow, imageio and FFmpeg pick the format from it
+            return output_path.with_name(f"{output_path.stem}.{os.getpid()}.tmp{output_path.suffix}")
+    
+    def publish_output(self, temp_path, output_path):
+        """Move a finished render into place, so readers never see a partial file"""
+        os.replace(temp_path, output_path)
+        try:
+            media_manifest.record(output_path)
+        except sqlite3.Error:
+            # The file is still served; a rescan adds it to the manifest later
+            logger.exception(f"Error recording {output_path} in the media manifest")
+        _last_touched[str(output_path)] = time.time()
+    
+    def release_output(self, output_path, temp_path):
+        """Drop the render lock and any leftover temporary file"""
+        for path in (temp_path, output_path.with_name(output_path.name + '.lock')):
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
 
 
 class MemeGenerator(MediaGenerator):
@@ -117,70 +284,40 @@ class MemeGenerator(MediaGenerator):
         if not subtitle:
             raise ValueError(f"Subtitle with ID {subtitle_id} not found")
         
-        # If no frame_id provided, use the main frame from the subtitle
-        if not frame_id:
-            frame_id = subtitle.get('start_frame')
-        
-        # Get frame path
-        frame_path = self.get_frame_path(subtitle['episode'], frame_id)
-        if not frame_path.exists():
-            raise ValueError(f"Frame not found: {frame_path}")
-        
-        # Generate meme ID if not provided
+        # Derive the meme ID from the request if not provided
         if not meme_id:
-            meme_id = str(uuid.uuid4())[:8]
+            meme_id = media_id('meme', subtitle_id=subtitle_id, text=text, frame_id=frame_id, font=font,
+                               text_color=text_color, outline_color=outline_color)
         
         # Output path
         output_path = self.output_dir / "memes" / f"{meme_id}.jpg"
         
+        # Reuse an identical meme if one exists or is being rendered
+        temp_path = self.claim_output(output_path)
+        if temp_path is None:
+            return self.format_url("meme", meme_id, "jpg")
+        
         try:
+            # If no frame_id provided, use the main frame from the subtitle
+            if not frame_id:
+                frame_id = subtitle.get('start_frame')
+            
             # Open the image
-            img = Image.open(frame_path)
+            img = self.open_frame(subtitle['episode'], frame_id)
             
-            # Prepare text drawing
-            draw = ImageDraw.Draw(img)
+            # Font size based on image dimensions
+            font_size = int(img.width * 0.06)  # Scale font with image
             
-            # Get font
-            try:
-                # Try to load the requested font
-                font_path = self.font_dir / f"{font.lower()}.ttf"
-                if not font_path.exists():
-                    font_path = self.default_font
-                
-                # Font size based on image dimensions
-                font_size = int(img.width * 0.06)  # Scale font with image
-                img_font = ImageFont.truetype(str(font_path), font_size) if font_path else ImageFont.load_default()
-            except Exception:
-                # Fallback to default font
-                logger.warning(f"Failed to load font {font}, using default")
-                img_font = ImageFont.load_default()
-            
-            # Draw text with outline
+            # Draw text with outline, middle of the baseline near the bottom;
+            # popular captions come pre-rendered from the text cache
             text_position = (img.width // 2, img.height - font_size * 1.5)
-            
-            # Draw text outline
             outline_width = max(1, int(font_size * 0.05))
-            for offset_x in range(-outline_width, outline_width + 1):
-                for offset_y in range(-outline_width, outline_width + 1):
-                    draw.text(
-                        (text_position[0] + offset_x, text_position[1] + offset_y),
-                        text,
-                        font=img_font,
-                        fill=outline_color,
-                        anchor="ms"  # middle-bottom anchor
-                    )
-            
-            # Draw main text
-            draw.text(
-                text_position,
-                text,
-                font=img_font,
-                fill=text_color,
-                anchor="ms"  # middle-bottom anchor
-            )
+            draw_caption(img, text_position, text, font, font_size,
+                         fill=text_color, stroke_fill=outline_color, stroke_width=outline_width)
             
             # Save the meme
-            img.save(output_path, "JPEG", quality=95)
+            img.save(temp_path, "JPEG", quality=95)
+            self.publish_output(temp_path, output_path)
             
             # Return URL
             return self.format_url("meme", meme_id, "jpg")
@@ -188,11 +325,20 @@ class MemeGenerator(MediaGenerator):
         except Exception as e:
             logger.exception(f"Error creating meme: {e}")
             raise
+        finally:
+            self.release_output(output_path, temp_path)
 
 
 class GifGenerator(MediaGenerator):
     """Generator for animated GIFs from frame sequences"""
     
+    # Output scale and frame rate for each quality level
+    QUALITY_SETTINGS = {
+        'low': {'size': 0.5, 'fps': 8},
+        'medium': {'size': 0.75, 'fps': 12},
+        'high': {'size': 1.0, 'fps': 20}
+    }
+    
     def create_gif(self, subtitle_id, start_frame, end_frame, gif_id=None, 
                    caption=True, speed=1.0, quality='medium'):
         """
@@ -215,104 +361,56 @@ class GifGenerator(MediaGenerator):
         if not subtitle:
             raise ValueError(f"Subtitle with ID {subtitle_id} not found")
         
-        # Generate GIF ID if not provided
+        # Checked on the requested span, before any frame is looked up
+        max_frames = config.get('gif.max_frames', 600)
+        if end_frame - start_frame + 1 > max_frames:
+            raise ValueError(f"GIF too long: {end_frame - start_frame + 1} frames (maximum {max_frames})")
+        
+        # Derive the GIF ID from the request if not provided
         if not gif_id:
-            gif_id = str(uuid.uuid4())[:8]
+            gif_id = media_id('gif', subtitle_id=subtitle_id, start_frame=start_frame, end_frame=end_frame,
+                              caption=caption, speed=speed, quality=quality)
         
         # Output path
         output_path = self.output_dir / "gifs" / f"{gif_id}.gif"
         
-        # Quality settings
-        quality_settings = {
-            'low': {'size': 0.5, 'fps': 8},
-            'medium': {'size': 0.75, 'fps': 12},
-            'high': {'size': 1.0, 'fps': 20}
-        }
+        # Reuse an identical GIF if one exists or is being rendered
+        temp_path = self.claim_output(output_path)
+        if temp_path is None:
+            return self.format_url("gif", gif_id, "gif")
         
         # Use specified quality or default to medium
         quality = quality.lower() if quality else 'medium'
-        if quality not in quality_settings:
+        if quality not in self.QUALITY_SETTINGS:
             quality = 'medium'
         
-        settings = quality_settings[quality]
+        settings = self.QUALITY_SETTINGS[quality]
         
         try:
-            # Get all frame paths between start and end
-            frames = []
-            for frame_num in range(start_frame, end_frame + 1):
-                frame_path = self.get_frame_path(subtitle['episode'], frame_num)
-                if frame_path.exists():
-                    frames.append(frame_path)
+            # Get all frames between start and end
+            frames = [
+                frame_num for frame_num in range(start_frame, end_frame + 1)
+                if self.has_frame(subtitle['episode'], frame_num)
+            ]
             
             if not frames:
                 raise ValueError(f"No frames found between {start_frame} and {end_frame}")
             
-            # Read frames and resize if needed
-            images = []
-            for frame_path in frames:
-                img = Image.open(frame_path)
-                
-                # Resize based on quality setting
-                if settings['size'] < 1.0:
-                    new_width = int(img.width * settings['size'])
-                    new_height = int(img.height * settings['size'])
-                    img = img.resize((new_width, new_height), Image.LANCZOS)
-                
-                # Add caption if requested
-                if caption:
-                    draw = ImageDraw.Draw(img)
-                    
-                    # Get font
-                    try:
-                        font_size = int(img.width * 0.05)  # Scale font with image
-                        font_path = self.default_font
-                        img_font = ImageFont.truetype(str(font_path), font_size) if font_path else ImageFont.load_default()
-                    except Exception:
-                        img_font = ImageFont.load_default()
-                    
-                    # Draw text with outline
-                    text_position = (img.width // 2, img.height - font_size * 1.5)
-                    text = subtitle['dialogue']
-                    
-                    # Draw outline
-                    outline_width = max(1, int(font_size * 0.05))
-                    for offset_x in range(-outline_width, outline_width + 1):
-                        for offset_y in range(-outline_width, outline_width + 1):
-                            draw.text(
-                                (text_position[0] + offset_x, text_position[1] + offset_y),
-                                text,
-                                font=img_font,
-                                fill="#000000",
-                                anchor="ms"
-                            )
-                    
-                    # Draw main text
-                    draw.text(
-                        text_position,
-                        text,
-                        font=img_font,
-                        fill="#ffffff",
-                        anchor="ms"
-                    )
-                
-                # Convert to RGB if needed (GIF doesn't support RGBA)
-                if img.mode == 'RGBA':
-                    img = img.convert('RGB')
-                
-                images.append(img)
+            # Output size based on quality setting
+            width, height = self.frame_size(subtitle['episode'], frames[0])
+            size = (int(width * settings['size']), int(height * settings['size']))
+            
+            # The caption is the same on every frame, so it's drawn once and composited
+            overlay = self.render_caption(size, subtitle['dialogue']) if caption else None
             
             # Calculate duration based on speed
             duration = 1.0 / (settings['fps'] * speed)
             
-            # Create temporary file to avoid imageio issues
-            with tempfile.NamedTemporaryFile(suffix='.gif', delete=False) as temp_file:
-                temp_path = temp_file.name
-            
             # Save GIF
-            imageio.mimsave(temp_path, images, format='GIF', duration=duration, loop=0)
+            self.write_gif(temp_path, subtitle['episode'], frames, size, overlay, duration)
             
             # Move to final location
-            shutil.move(temp_path, output_path)
+            self.publish_output(temp_path, output_path)
             
             # Return URL
             return self.format_url("gif", gif_id, "gif")
@@ -320,13 +418,137 @@ class GifGenerator(MediaGenerator):
         except Exception as e:
             logger.exception(f"Error creating GIF: {e}")
             raise
+        finally:
+            self.release_output(output_path, temp_path)
+    
+    def frame_size(self, episode, frame_id):
+        """Get the dimensions of a frame from its JPEG header, without decoding it"""
+        data = frame_index.read(episode, "frames", frame_id)
+        if data is None:
+            raise ValueError(f"Frame not found: {episode} {frame_id}")
+        with Image.open(io.BytesIO(data)) as img:
+            return img.size
+    
+    def render_caption(self, size, text):
+        """
+        Get the outlined caption for frames of a given size
+        
+        Returns an (RGBA bitmap, position) overlay to paste onto each frame. The
+        bitmap comes from the shared text cache, so GIFs of the same line at the
+        same size reuse one rendering.
+        """
+        width, height = size
+        font_size = int(width * 0.05)  # Scale font with image
+        outline_width = max(1, int(font_size * 0.05))
+        
+        bitmap = text_cache.get(text, DEFAULT_FONT, font_size, "#ffffff", "#000000", outline_width)
+        return bitmap.image, bitmap.position((width // 2, height - font_size * 1.5))
+    
+    def prepare_frame(self, episode, frame_id, size, overlay=None):
+        """Decode a frame at the output size and composite the caption onto it"""
+        data = frame_index.read(episode, "frames", frame_id)
+        if data is None:
+            raise ValueError(f"Frame not found: {episode} {frame_id}")
+        
+        img = Image.open(io.BytesIO(data))
+        if img.size != size:
+            # Let the JPEG decoder scale down by a power of two before the exact resize
+            img.draft('RGB', size)
+            img = img.resize(size, Image.LANCZOS)
+        
+        # GIF frames are RGB; the overlay's alpha channel is its paste mask
+        img = img.convert('RGB')
+        if overlay is not None:
+            caption, position = overlay
+            img.paste(caption, position, caption)
+        return img
+    
+    def render_frames(self, episode, frame_ids, size, overlay=None, max_pending=None):
+        """
+        Prepare frames on the shared frame pool, yielding them in order
+        
+        Only a couple of frames per worker (at most max_pending) are in flight
+        at a time, so frames can be consumed as they are produced without
+        decoding the whole range up front.
+        """
+        pool, workers = get_frame_pool()
+        frame_ids = iter(frame_ids)
+        pending = deque()
+        
+        def submit_next():
+            frame_id = next(frame_ids, None)
+            if frame_id is not None:
+                pending.append(pool.submit(self.prepare_frame, episode, frame_id, size, overlay))
+        
+        for _ in range(min(workers * 2, max_pending or workers * 2)):
+            submit_next()
+        
+        try:
+            while pending:
+                img = pending.popleft().result()
+                submit_next()
+                yield img
+        finally:
+            # Abandoned early (e.g. on an error), don't leave queued work behind
+            for future in pending:
+                future.cancel()
+    
+    def write_gif(self, output, episode, frame_ids, size, overlay, duration):
+        """
+        Encode frames into a GIF file or binary file object
+        
+        The streaming encoder (gif.encoder "streaming") quantizes every frame to
+        one palette built from a sample of frames and writes each frame as soon
+        as it's rendered, so memory stays within gif.max_memory whatever the
+        length. The "imageio" encoder keeps all frames in memory and gives each
+        its own palette; requests that wouldn't fit the budget are refused.
+        """
+        max_memory = config.get('gif.max_memory', 256 * 1024 * 1024)
+        frame_bytes = size[0] * size[1] * 3
+        
+        if config.get('gif.encoder', 'streaming') == 'imageio':
+            if frame_bytes * len(frame_ids) > max_memory:
+                raise ValueError(f"GIF too large: {len(frame_ids)} frames of {size[0]}x{size[1]} exceed the memory budget")
+            images = list(self.render_frames(episode, frame_ids, size, overlay))
+            imageio.mimsave(output, images, format='GIF', duration=duration, loop=0)
+            return
+        
+        deltas = config.get('gif.delta_frames', False)
+        
+        # Evenly spaced frames, so the palette covers colours from the whole range
+        sample_count = min(len(frame_ids), config.get('gif.palette_samples', 8))
+        step = len(frame_ids) / sample_count
+        sample_ids = [frame_ids[int(i * step)] for i in range(sample_count)]
+        samples = list(self.render_frames(episode, sample_ids, size, overlay))
+        # Leave the last index free to mark unchanged pixels in delta frames
+        palette = build_palette(samples, colors=TRANSPARENT_INDEX if deltas else 256)
+        del samples
+        
+        max_pending = max(1, max_memory // frame_bytes)
+        with open(output, 'wb') if isinstance(output, (str, Path)) else nullcontext(output) as fp:
+            writer = GifStreamWriter(fp, size, palette, duration, loop=0, deltas=deltas)
+            for img in self.render_frames(episode, frame_ids, size, overlay, max_pending=max_pending):
+                writer.add_frame(img)
+            writer.close()
 
 
 class ClipGenerator(MediaGenerator):
     """Generator for video clips"""
     
-    def create_clip(self, subtitle_id, start_time, end_time, clip_id=None, 
-                    caption=True, format='mp4', quality='medium'):
+    # Encoder settings and maximum output height of each quality level; sources no taller are stream-copied
+    QUALITY_SETTINGS = {
+        'low': {'crf': '28', 'preset': 'veryfast', 'max_height': 480},
+        'medium': {'crf': '23', 'preset': 'medium', 'max_height': 720},
+        'high': {'crf': '18', 'preset': 'slow', 'max_height': 1080}
+    }
+    
+    # Source codecs whose packets can be copied into each output format
+    STREAM_COPY_CODECS = {
+        'mp4': ('h264',)
+    }
+    
+    def create_clip(self, subtitle_id, start_time=None, end_time=None, clip_id=None, 
+                    caption=True, format='mp4', quality='medium', start_ms=None, end_ms=None):
         """
         Create a video clip with audio
         
@@ -335,42 +557,47 @@ class ClipGenerator(MediaGenerator):
             start_time: Starting timestamp in format "HH:MM:SS,mmm"
             end_time: Ending timestamp in format "HH:MM:SS,mmm"
             clip_id: Optional ID for the clip
-            caption: Whether to include subtitles
+            caption: Whether to burn the episode's subtitles into the picture
             format: Output format (mp4, webm, etc.)
             quality: Video quality (low, medium, high)
+            start_ms: Starting time in milliseconds, instead of start_time
+            end_ms: Ending time in milliseconds, instead of end_time
             
         Returns:
             URL of the generated clip
         """
+        if start_ms is None:
+            start_ms = round(parse_timestamp(start_time) * 1000)
+        if end_ms is None:
+            end_ms = round(parse_timestamp(end_time) * 1000)
+        
         # Get subtitle info
         subtitle = self.get_subtitle_info(subtitle_id)
         if not subtitle:
             raise ValueError(f"Subtitle with ID {subtitle_id} not found")
         
-        # Generate clip ID if not provided
+        # Derive the clip ID from the request if not provided
         if not clip_id:
-            clip_id = str(uuid.uuid4())[:8]
+            clip_id = media_id('clip', subtitle_id=subtitle_id, start_ms=start_ms, end_ms=end_ms,
+                               caption=caption, format=format, quality=quality)
         
         # Output path
         output_path = self.output_dir / "clips" / f"{clip_id}.{format}"
         
-        # Convert timestamp format from HH:MM:SS,mmm to HH:MM:SS.mmm for ffmpeg
-        start_time = start_time.replace(',', '.')
-        end_time = end_time.replace(',', '.')
+        # Reuse an identical clip if one exists or is being rendered
+        temp_path = self.claim_output(output_path)
+        if temp_path is None:
+            return self.format_url("clip", clip_id, format)
         
-        # Quality settings
-        quality_settings = {
-            'low': {'scale': '480:-1', 'crf': '28', 'preset': 'veryfast'},
-            'medium': {'scale': '720:-1', 'crf': '23', 'preset': 'medium'},
-            'high': {'scale': '1080:-1', 'crf': '18', 'preset': 'slow'}
-        }
+        start = start_ms / 1000
+        end = end_ms / 1000
         
         # Use specified quality or default to medium
         quality = quality.lower() if quality else 'medium'
-        if quality not in quality_settings:
+        if quality not in self.QUALITY_SETTINGS:
             quality = 'medium'
         
-        settings = quality_settings[quality]
+        settings = self.QUALITY_SETTINGS[quality]
         
         try:
             # Get video path
@@ -378,33 +605,55 @@ class ClipGenerator(MediaGenerator):
             if not video_path.exists():
                 raise ValueError(f"Video file not found: {video_path}")
             
+            # Captions are burned into the picture, so every frame has to be encoded
+            subtitle_path = self.subtitle_file(subtitle['episode']) if caption else None
+            
+            # Copy the whole GOPs inside the range and only encode the partial ones at either end
+            plan = None
+            if subtitle_path is None:
+                plan = self.plan_stream_copy(subtitle['episode'], start, end, format, settings)
+            if plan is not None:
+                try:
+                    self.smart_cut(subtitle['episode'], video_path, plan, start, end, settings, temp_path)
+                    self.publish_output(temp_path, output_path)
+                    return self.format_url("clip", clip_id, format)
+                except subprocess.CalledProcessError as e:
+                    logger.warning(f"Stream copy failed, re-encoding the whole clip: {e.stderr.decode(errors='replace')[-500:]}")
+            
+            # Shrunk to the quality level's height but never enlarged, so a source that
+            # could have been stream copied comes out at the same size either way
+            video_filter = f"scale=-2:'min({settings['max_height']},ih)'"
+            if subtitle_path is not None:
+                # Input seeking restarts timestamps at zero; shift them back to episode time
+                # for the episode-wide subtitle file, then rebase the output on the clip start
+                video_filter = (
+                    f"setpts=PTS+{start:.3f}/TB,"
+                    f"subtitles=filename={escape_filter_value(str(subtitle_path.resolve()))},"
+                    f"setpts=PTS-STARTPTS,{video_filter}"
+                )
+            
             # Prepare FFmpeg command
             ffmpeg_cmd = [
                 'ffmpeg',
                 '-y',  # Overwrite output file if it exists
-                '-ss', start_time,  # Start time
-                '-to', end_time,  # End time
+                '-ss', f"{start:.3f}",  # Start time
+                '-to', f"{end:.3f}",  # End time
                 '-i', str(video_path),  # Input file
-                '-vf', f"scale={settings['scale']}",  # Scale video
+                '-vf', video_filter,  # Scale video and burn in captions
                 '-c:v', 'libx264',  # Video codec
                 '-crf', settings['crf'],  # Quality
                 '-preset', settings['preset'],  # Encoding speed/compression trade-off
                 '-c:a', 'aac',  # Audio codec
                 '-b:a', '128k',  # Audio bitrate
+                '-sn',  # Captions are in the picture, don't copy subtitle streams
             ]
             
-            # Add subtitles if requested
-            if caption:
-                # We might need to generate a temporary subtitle file
-                # For simplicity, we'll just assume the subtitles are in the video
-                ffmpeg_cmd.extend(['-c:s', 'copy'])
-            
             # Add output file
-            ffmpeg_cmd.append(str(output_path))
+            ffmpeg_cmd.append(str(temp_path))
             
             # Run FFmpeg
-            logger.info(f"Running FFmpeg: {' '.join(ffmpeg_cmd)}")
-            subprocess.run(ffmpeg_cmd, check=True, capture_output=True)
+            self.run_ffmpeg(ffmpeg_cmd)
+            self.publish_output(temp_path, output_path)
             
             # Return URL
             return self.format_url("clip", clip_id, format)
@@ -415,3 +664,227 @@ class ClipGenerator(MediaGenerator):
         except Exception as e:
             logger.exception(f"Error creating clip: {e}")
             raise
+        finally:
+            self.release_output(output_path, temp_path)
+    
+    def plan_stream_copy(self, episode, start, end, format, settings):
+        """
+        Decide whether a clip from `start` to `end` seconds can copy its middle from the source video
+        
+        Needs a current keyframe index (see index_videos.py), a source codec the
+        output format can carry, a source no taller than the quality level (so
+        copying doesn't change the output size class) and at least one whole GOP
+        inside the range. Returns (index, first_keyframe, last_keyframe) or None.
+        """
+        if not config.get('clips.stream_copy', True):
+            return None
+        
+        index = video_index.get(episode)
+        if index is None:
+            return None
+        if index.codec not in self.STREAM_COPY_CODECS.get(format, ()) or index.height > settings['max_height']:
+            return None
+        
+        inner = index.inner_range(start, end)
+        if inner is None:
+            return None
+        return (index,) + inner
+    
+    def subtitle_file(self, episode):
+        """
+        Get a cached SRT file of an episode's subtitles, or None if it has none
+        
+        One file covers the whole episode and is shared by every clip from it;
+        the name includes the database version, so edits to the subtitles are
+        picked up and stale files simply expire with the rest of the media.
+        """
+        from database import db
+        
+        version = hashlib.blake2b(repr(db.data_version()).encode(), digest_size=4).hexdigest()
+        subtitle_path = self.output_dir / "subtitles" / f"{episode}.{version}.srt"
+        temp_path = self.claim_output(subtitle_path)
+        if temp_path is not None:
+            try:
+                with open(temp_path, 'w', encoding='utf-8') as f:
+                    number = 0
+                    for start_ms, end_ms, content in db.get_episode_captions(episode):
+                        # Blank lines end an SRT entry, so they are dropped from the text
+                        text = '\n'.join(line.strip() for line in (content or '').splitlines() if line.strip())
+                        if not text or start_ms is None or end_ms is None:
+                            continue
+                        number += 1
+                        f.write(
+                            f"{number}\n"
+                            f"{format_srt_timestamp(start_ms / 1000)} --> "
+                            f"{format_srt_timestamp(end_ms / 1000)}\n"
+                            f"{text}\n\n"
+                        )
+                self.publish_output(temp_path, subtitle_path)
+            finally:
+                self.release_output(subtitle_path, temp_path)
+        
+        # Episodes without subtitles get an empty file, so they aren't queried again either
+        if subtitle_path.stat().st_size == 0:
+            return None
+        return subtitle_path
+    
+    def run_ffmpeg(self, ffmpeg_cmd):
+        """Run an FFmpeg command, raising CalledProcessError on failure"""
+        logger.info(f"Running FFmpeg: {' '.join(ffmpeg_cmd)}")
+        subprocess.run(ffmpeg_cmd, check=True, capture_output=True)
+    
+    def copy_segment(self, episode, video_path, first_keyframe, last_keyframe):
+        """
+        Get a cached MPEG-TS file of the source video from one keyframe up to another
+        
+        Segments are cut once and shared by every clip spanning the same GOPs;
+        they expire with the rest of the generated media.
+        """
+        segment_path = self.output_dir / "segments" / f"{episode}_{round(first_keyframe * 1000)}_{round(last_keyframe * 1000)}.ts"
+        temp_path = self.claim_output(segment_path)
+        if temp_path is None:
+            return segment_path
+        
+        try:
+            # Input seeking lands exactly on the keyframe, so the copy starts with a decodable frame;
+            # Annex B keeps the SPS/PPS in-band so segments encoded differently can be joined
+            self.run_ffmpeg([
+                'ffmpeg', '-y',
+                '-ss', f"{first_keyframe:.6f}",
+                '-to', f"{last_keyframe:.6f}",
+                '-i', str(video_path),
+                '-map', '0:v:0',
+                '-an', '-sn',
+                '-c:v', 'copy',
+                '-bsf:v', 'h264_mp4toannexb',
+                '-f', 'mpegts',
+                str(temp_path)
+            ])
+            self.publish_output(temp_path, segment_path)
+            return segment_path
+        finally:
+            self.release_output(segment_path, temp_path)
+    
+    def encode_segment(self, video_path, start, end, index, settings, output_path):
+        """Encode part of the source at its own size and pixel format, so it can be joined to copied GOPs"""
+        self.run_ffmpeg([
+            'ffmpeg', '-y',
+            '-ss', f"{start:.6f}",
+            '-to', f"{end:.6f}",
+            '-i', str(video_path),
+            '-map', '0:v:0',
+            '-an', '-sn',
+            '-c:v', 'libx264',
+            '-crf', settings['crf'],
+            '-preset', settings['preset'],
+            '-pix_fmt', index.pix_fmt or 'yuv420p',
+            '-f', 'mpegts',
+            str(output_path)
+        ])
+    
+    def smart_cut(self, episode, video_path, plan, start, end, settings, output_path):
+        """
+        Build a clip from encoded head and tail segments around copied GOPs
+        
+        Only the video up to the first keyframe and after the last one is
+        encoded, at most a GOP each. The audio is re-encoded in the final mux,
+        which is cheap and avoids joining audio from different encoders.
+        """
+        index, first_keyframe, last_keyframe = plan
+        
+        with tempfile.TemporaryDirectory(prefix="clip-") as work_dir:
+            work_dir = Path(work_dir)
+            parts = []
+            
+            if start < first_keyframe:
+                parts.append(work_dir / "head.ts")
+                self.encode_segment(video_path, start, first_keyframe, index, settings, parts[-1])
+            
+            parts.append(self.copy_segment(episode, video_path, first_keyframe, last_keyframe))
+            
+            if last_keyframe < end:
+                parts.append(work_dir / "tail.ts")
+                self.encode_segment(video_path, last_keyframe, end, index, settings, parts[-1])
+            
+            list_path = work_dir / "parts.txt"
+            list_path.write_text(''.join(
+                "file '{}'\n".format(str(part.resolve()).replace("'", "'\\''")) for part in parts
+            ))
+            
+            self.run_ffmpeg([
+                'ffmpeg', '-y',
+                '-f', 'concat', '-safe', '0',
+                '-i', str(list_path),
+                '-ss', f"{start:.6f}",
+                '-to', f"{end:.6f}",
+                '-i', str(video_path),
+                '-map', '0:v:0',
+                '-map', '1:a:0?',
+                '-c:v', 'copy',
+                '-c:a', 'aac',
+                '-b:a', '128k',
+                '-movflags', '+faststart',
+                '-shortest',
+                str(output_path)
+            ])
+
+
+class FrameResizer(MediaGenerator):
+    """Generator for resized and re-encoded copies of frames, made on first request"""
+    
+    # Pillow format and save options for each output extension
+    FORMATS = {
+        'jpg': ('JPEG', {'quality': 85, 'optimize': True}),
+        'webp': ('WEBP', {'quality': 80, 'method': 4})
+    }
+    
+    # Widths served when frames.widths isn't set; requests are rounded up to one of them
+    DEFAULT_WIDTHS = (160, 320, 480, 640, 960, 1280)
+    
+    def derivative_width(self, width):
+        """Round a requested width up to a configured one, so the cache holds a few sizes per frame"""
+        widths = sorted(config.get('frames.widths') or self.DEFAULT_WIDTHS)
+        for allowed in widths:
+            if allowed >= width:
+                return allowed
+        return widths[-1]
+    
+    def get_derivative(self, episode, frame_id, width=None, format='jpg'):
+        """
+        Get the path of a frame scaled down to `width` (None for full size) in `format`
+        
+        Returns None if the frame doesn't exist. Derivatives are cached in
+        media_output/derivatives, within the frames.cache_max_bytes budget.
+        """
+        if width is not None:
+            width = self.derivative_width(width)
+        output_path = self.output_dir / "derivatives" / f"{episode}_{frame_id:010d}_{width or 'full'}.{format}"
+        
+        temp_path = self.claim_output(output_path)
+        if temp_path is None:
+            return output_path
+        
+        try:
+            data = frame_index.read(episode, "frames", frame_id)
+            if data is None:
+                return None
+            
+            img = Image.open(io.BytesIO(data))
+            if width is not None and width < img.width:
+                size = (width, max(1, round(img.height * width / img.width)))
+                # JPEG frames are decoded straight at a fraction of their size
+                img.draft('RGB', size)
+                img = img.convert('RGB').resize(size, Image.LANCZOS)
+            else:
+                img = img.convert('RGB')
+            
+            pil_format, options = self.FORMATS[format]
+            img.save(temp_path, pil_format, **options)
+            self.publish_output(temp_path, output_path)
+            return output_path
+        finally:
+            self.release_output(output_path, temp_path)
+
+
+# Create a singleton frame resizer, shared by every derivative request
+frame_resizer = FrameResizer()
@@ -0,0 +1,252 @@
+import os
+import time
+import sqlite3
+import logging
+import threading
+from contextlib import contextmanager
+from pathlib import Path
+
+from config import config
+
+logger = logging.getLogger(__name__)
+
+# Directories of media_output_dir holding generated files
+MEDIA_DIRS = ('memes', 'gifs', 'clips', 'segments', 'subtitles', 'derivatives')
+
+# Files deleted per query while enforcing the disk budget
+EVICTION_BATCH = 100
+
+
+class MediaManifest:
+    """
+    Index of generated files with their size, last access and expiry time
+
+    Generators record each file when they publish it and touch_media moves
+    its expiry forward when it's used, so the sweeper finds what is due with
+    an indexed query instead of statting every file. The total size of the
+    index is kept under a budget by evicting the least recently used files.
+    """
+
+    def __init__(self, root, db_path, expiry=7 * 86400, max_bytes=None, budgets=None):
+        """
+        Initialize the manifest
+
+        Args:
+            root: media_output_dir; paths are stored relative to it
+            db_path: Path of the SQLite manifest database, created if missing
+            expiry: Seconds a file is kept after it was last used
+            max_bytes: Total size of generated files before the least recently
+                used are evicted, or None for no limit
+            budgets: Separate size limits for some kinds (directories) of files
+        """
+        self.root = Path(root)
+        self.db_path = Path(db_path)
+        self.expiry = expiry
+        self.max_bytes = max_bytes
+        self.budgets = budgets or {}
+
+        self._lock = threading.Lock()
+        self._thread = None
+        self._pid = None
+        self._schema_ready = False
+
+    @contextmanager
+    def _connect(self):
+        """Open a short-lived autocommit connection"""
+        if not self._schema_ready:
+            self.db_path.parent.mkdir(parents=True, exist_ok=True)
+        conn = sqlite3.connect(str(self.db_path), timeout=30, isolation_level=None)
+        try:
+            if not self._schema_ready:
+                self._create_schema(conn)
+            yield conn
+        finally:
+            conn.close()
+
+    def _create_schema(self, conn):
+        """Create the media table on first use"""
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS media (
+                path TEXT PRIMARY KEY,
+                kind TEXT NOT NULL,
+                size INTEGER NOT NULL,
+                created_at REAL NOT NULL,
+                accessed_at REAL NOT NULL,
+                expires_at REAL NOT NULL
+            )
+        """)
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_media_expires ON media(expires_at)")
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_media_accessed ON media(accessed_at)")
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_media_kind_accessed ON media(kind, accessed_at)")
+        self._schema_ready = True
+
+    def _key(self, path):
+        """Get the manifest key of a file: its path relative to the media root"""
+        return Path(path).resolve().relative_to(self.root.resolve()).as_posix()
+
+    def record(self, path):
+        """Add a newly published file"""
+        now = time.time()
+        key = self._key(path)
+        with self._connect() as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO media (path, kind, size, created_at, accessed_at, expires_at) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                (key, key.split('/', 1)[0], os.path.getsize(path), now, now, now + self.expiry)
+            )
+
+    def touch(self, path, when=None):
+        """Record a use of a file, moving its expiry forward"""
+        when = when or time.time()
+        with self._connect() as conn:
+            conn.execute(
+                "UPDATE media SET accessed_at = ?, expires_at = ? WHERE path = ?",
+                (when, when + self.expiry, self._key(path))
+            )
+
+    def expires_at(self, path):
+        """Get the Unix time a file expires, or None if it isn't in the manifest"""
+        with self._connect() as conn:
+            row = conn.execute("SELECT expires_at FROM media WHERE path = ?", (self._key(path),)).fetchone()
+        return row[0] if row else None
+
+    def _delete(self, conn, rows):
+        """Delete files and their entries; returns the bytes freed"""
+        freed = 0
+        for key, size in rows:
+            try:
+                os.remove(self.root / key)
+                freed += size
+            except FileNotFoundError:
+                pass
+        conn.executemany("DELETE FROM media WHERE path = ?", [(key,) for key, _ in rows])
+        return freed
+
+    def _evict(self, conn, max_bytes, kind=None):
+        """Delete the least recently used files (of one kind) until their total is under max_bytes"""
+        where, params = ("WHERE kind = ?", (kind,)) if kind else ("", ())
+        evicted = freed = 0
+        total = conn.execute(f"SELECT COALESCE(SUM(size), 0) FROM media {where}", params).fetchone()[0]
+        while total > max_bytes:
+            rows = conn.execute(
+                f"SELECT path, size FROM media {where} ORDER BY accessed_at LIMIT ?", params + (EVICTION_BATCH,)
+            ).fetchall()
+            if not rows:
+                break
+            # Only as many as it takes to get under the budget
+            batch = []
+            for key, size in rows:
+                batch.append((key, size))
+                total -= size
+                if total <= max_bytes:
+                    break
+            evicted += len(batch)
+            freed += self._delete(conn, batch)
+        return evicted, freed
+
+    def sweep(self):
+        """
+        Delete expired files, then the least recently used ones while over a budget
+
+        Returns counts of expired and evicted files and the bytes freed.
+        """
+        result = {"expired": 0, "evicted": 0, "freed_bytes": 0}
+        with self._connect() as conn:
+            rows = conn.execute("SELECT path, size FROM media WHERE expires_at < ?", (time.time(),)).fetchall()
+            result["expired"] = len(rows)
+            result["freed_bytes"] += self._delete(conn, rows)
+
+            budgets = [(kind, max_bytes) for kind, max_bytes in self.budgets.items() if max_bytes is not None]
+            if self.max_bytes is not None:
+                budgets.append((None, self.max_bytes))
+            for kind, max_bytes in budgets:
+                evicted, freed = self._evict(conn, max_bytes, kind)
+                result["evicted"] += evicted
+                result["freed_bytes"] += freed
+        return result
+
+    def rescan(self):
+        """
+        Sync the manifest with the files on disk
+
+        Adds files it doesn't know about (media generated before the manifest
+        existed, or leftovers of crashed renders) using their access times,
+        and drops entries whose files are gone. Returns (added, removed).
+        """
+        on_disk = {}
+        for media_type in MEDIA_DIRS:
+            media_type_dir = self.root / media_type
+            if not media_type_dir.is_dir():
+                continue
+            for file_path in media_type_dir.iterdir():
+                if file_path.is_file():
+                    on_disk[f"{media_type}/{file_path.name}"] = file_path.stat()
+
+        with self._connect() as conn:
+            known = {row[0] for row in conn.execute("SELECT path FROM media")}
+            added = []
+            for key, stat in on_disk.items():
+                if key not in known:
+                    accessed = max(stat.st_atime, stat.st_mtime)
+                    added.append((key, key.split('/', 1)[0], stat.st_size, stat.st_mtime, accessed, accessed + self.expiry))
+            removed = [(key,) for key in known if key not in on_disk]
+
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                conn.executemany(
+                    "INSERT OR IGNORE INTO media (path, kind, size, created_at, accessed_at, expires_at) "
+                    "VALUES (?, ?, ?, ?, ?, ?)",
+                    added
+                )
+                conn.executemany("DELETE FROM media WHERE path = ?", removed)
+                conn.execute("COMMIT")
+            except Exception:
+                conn.execute("ROLLBACK")
+                raise
+        return len(added), len(removed)
+
+    def stats(self):
+        """Get the number and total size of generated files"""
+        with self._connect() as conn:
+            count, size = conn.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM media").fetchone()
+        return {"files": count, "bytes": size, "max_bytes": self.max_bytes}
+
+    def _run(self, interval, sweep):
+        """Sweeper loop"""
+        while True:
+            time.sleep(interval)
+            try:
+                sweep()
+            except Exception:
+                logger.exception("Error sweeping media")
+
+    def start(self, interval, sweep=None):
+        """Start a background thread in this process that calls `sweep` (default: self.sweep) every `interval` seconds"""
+        # A forked child (e.g. a gunicorn worker) gets its own sweeper
+        if self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._pid == os.getpid():
+                return
+            self._pid = os.getpid()
+            self._thread = threading.Thread(
+                target=self._run, args=(interval, sweep or self.sweep), name="media-sweeper", daemon=True
+            )
+            self._thread.start()
+
+
+def create_media_manifest():
+    """Create the media manifest from the configuration"""
+    db_path = config.get('media.manifest_path')
+    return MediaManifest(
+        config.media_output_dir,
+        db_path or config.media_output_dir / "media.db",
+        expiry=config.get('cdn.file_expiry_days', 7) * 86400,
+        max_bytes=config.get('media.max_bytes'),
+        budgets={'derivatives': config.get('frames.cache_max_bytes', 1024 * 1024 * 1024)}
+    )
+
+
+# Create a singleton media manifest
+media_manifest = create_media_manifest()
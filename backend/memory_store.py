@@ -0,0 +1,463 @@
+import logging
+import threading
+from array import array
+from bisect import bisect_left, bisect_right
+from collections import OrderedDict
+from functools import wraps
+
+from database import (
+    Database, parse_search_terms, parse_frame_indices, encode_cursor, decode_cursor, timestamp_range, check_page
+)
+
+logger = logging.getLogger(__name__)
+
+# Number of distinct search queries whose matching rows are kept
+MATCH_CACHE_SIZE = 256
+
+
+class IntColumn:
+    """Integers stored in an array, with NULLs read back as None like the SQLite backend returns them"""
+
+    # Stored in place of NULL; outside any frame number or time
+    MISSING = -2 ** 63
+
+    def __init__(self, values):
+        self.values = array('q', (self.MISSING if value is None else value for value in values))
+
+    def __len__(self):
+        return len(self.values)
+
+    def __getitem__(self, row):
+        value = self.values[row]
+        return None if value == self.MISSING else value
+
+
+class TextColumn:
+    """Strings stored back to back in one blob and addressed by offset; NULLs are read back as None"""
+
+    def __init__(self, values, separator=''):
+        parts = []
+        offsets = array('q')
+        # Rows that were NULL, usually none, so a set is smaller than a mask
+        self.missing = set()
+        position = 0
+        for row, value in enumerate(values):
+            if value is None:
+                self.missing.add(row)
+                value = ''
+            offsets.append(position)
+            parts.append(value)
+            position += len(value) + len(separator)
+        offsets.append(position)
+
+        self.blob = separator.join(parts)
+        self.offsets = offsets
+        self.separator_length = len(separator)
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    def __getitem__(self, row):
+        if row in self.missing:
+            return None
+        return self.blob[self.offsets[row]:self.offsets[row + 1] - self.separator_length]
+
+    def row_at(self, position):
+        """Get the row containing a character position of the blob"""
+        return bisect_right(self.offsets, position) - 1
+
+
+def consistent(method):
+    """Run a query against one loaded version of the corpus, never a mix of two"""
+    @wraps(method)
+    def wrapper(self, *args, **kwargs):
+        self.check_version()
+        with self._state_lock:
+            return method(self, *args, **kwargs)
+    return wrapper
+
+
+class MemoryDatabase(Database):
+    """
+    Database backend that serves subtitles from an in-memory columnar copy
+
+    The `subtitles` and `episodes` tables are read once at startup. Rows are
+    kept in (season, episode, subtitle_number) order with integer columns in
+    arrays and text in shared blobs, so lookups are array indexing instead of
+    SQL. Search is a case-insensitive substring match of every term and returns
+    results in episode order rather than by relevance.
+    """
+
+    def __init__(self, db_path=None):
+        """Initialize the backend and load the corpus"""
+        super().__init__(db_path)
+        self._match_cache = OrderedDict()
+        self._match_lock = threading.Lock()
+        # Queries are pure Python and serialized by the GIL anyway, so holding this costs little
+        self._state_lock = threading.RLock()
+        self.load()
+
+    def _version_changed(self):
+        """Reload the corpus from a newly published database version"""
+        self.load()
+        super()._version_changed()
+
+    def load(self):
+        """
+        Read the subtitles and episodes tables into memory
+
+        The columns are built first and swapped in together, so queries keep
+        using the previous copy while a new version loads.
+        """
+        with self.get_cursor() as cursor:
+            cursor.execute(
+                """
+                SELECT
+                    season,
+                    episode_of_season,
+                    title,
+                    episode_overall,
+                    air_date
+                FROM episodes
+                """
+            )
+            episodes = {
+                (row["season"], row["episode_of_season"]): {
+                    "id": f"S{row['season']:02d}E{row['episode_of_season']:02d}",
+                    "title": row["title"],
+                    "season": row["season"],
+                    "episode": row["episode_of_season"],
+                    "episode_overall": row["episode_overall"],
+                    "air_date": row["air_date"]
+                }
+                for row in cursor.fetchall()
+            }
+
+            # Subtitles without an episode row are unreachable through the SQL backend too
+            keyframes_column, keyframes_join = self._keyframes_sql('s')
+            cursor.execute(
+                f"""
+                SELECT
+                    s.id,
+                    s.season,
+                    s.episode,
+                    s.subtitle_number,
+                    s.timestamp_start,
+                    s.timestamp_end,
+                    {self._timestamp_ms_sql('s', 'start')} as start_ms,
+                    {self._timestamp_ms_sql('s', 'end')} as end_ms,
+                    s.content,
+                    s.start_frame,
+                    s.end_frame,
+                    {keyframes_column} as frame_indices
+                FROM subtitles s
+                JOIN episodes e ON s.season = e.season AND s.episode = e.episode_of_season
+                {keyframes_join}
+                ORDER BY s.season, s.episode, s.subtitle_number
+                """
+            )
+            rows = cursor.fetchall()
+
+        ids = array('q', (row["id"] for row in rows))
+        seasons = array('H', (row["season"] for row in rows))
+        episode_numbers = array('H', (row["episode"] for row in rows))
+
+        # Row positions sorted by id, for id lookups by bisection
+        id_order = array('q', sorted(range(len(rows)), key=ids.__getitem__))
+
+        # Precomputed [start, end) row range of every episode
+        episode_ranges = {}
+        for position in range(len(rows)):
+            key = (seasons[position], episode_numbers[position])
+            start, _ = episode_ranges.get(key, (position, position))
+            episode_ranges[key] = (start, position + 1)
+
+        columns = {
+            "episodes": episodes,
+            "ids": ids,
+            "seasons": seasons,
+            "episode_numbers": episode_numbers,
+            "numbers": array('q', (row["subtitle_number"] for row in rows)),
+            "start_frames": IntColumn(row["start_frame"] for row in rows),
+            "end_frames": IntColumn(row["end_frame"] for row in rows),
+            "timestamps_start": TextColumn(row["timestamp_start"] for row in rows),
+            "timestamps_end": TextColumn(row["timestamp_end"] for row in rows),
+            "start_ms": IntColumn(row["start_ms"] for row in rows),
+            "end_ms": IntColumn(row["end_ms"] for row in rows),
+            "content": TextColumn(row["content"] for row in rows),
+            "keyframes": TextColumn(row["frame_indices"] for row in rows),
+            # Lowercased copy for search; NUL separators stop matches spanning two rows
+            "search_text": TextColumn(((row["content"] or '').lower() for row in rows), separator='\0'),
+            "id_order": id_order,
+            "sorted_ids": array('q', (ids[position] for position in id_order)),
+            "episode_ranges": episode_ranges
+        }
+
+        with self._state_lock:
+            self.__dict__.update(columns)
+            with self._match_lock:
+                self._match_cache.clear()
+
+        logger.info(f"Loaded {len(rows)} subtitles from {len(episodes)} episodes into memory")
+
+    def _position(self, subtitle_id):
+        """Get the row position of a subtitle ID, or None"""
+        index = bisect_left(self.sorted_ids, subtitle_id)
+        if index < len(self.sorted_ids) and self.sorted_ids[index] == subtitle_id:
+            return self.id_order[index]
+        return None
+
+    def _episode_code(self, position):
+        return self.episodes[(self.seasons[position], self.episode_numbers[position])]["id"]
+
+    def _frame_indices(self, position):
+        return parse_frame_indices(self.keyframes[position], self.start_frames[position], self.end_frames[position])
+
+    def _timestamp(self, position):
+        return timestamp_range(
+            self.timestamps_start[position], self.timestamps_end[position],
+            self.start_ms[position], self.end_ms[position]
+        )
+
+    def _matching_positions(self, query):
+        """Get the sorted row positions whose content contains every search term"""
+        with self._match_lock:
+            if query in self._match_cache:
+                self._match_cache.move_to_end(query)
+                return self._match_cache[query]
+
+        terms = [text.lower() for text, _ in parse_search_terms(query)] or [query.lower()]
+        # Scan the blob for the longest (usually rarest) term, then check the rest per row
+        terms.sort(key=len, reverse=True)
+        first, rest = terms[0], terms[1:]
+
+        blob = self.search_text.blob
+        positions = array('q')
+        start = blob.find(first)
+        while start != -1:
+            position = self.search_text.row_at(start)
+            text = self.search_text[position]
+            if all(term in text for term in rest):
+                positions.append(position)
+            # Skip to the next row, one match per row is enough
+            start = blob.find(first, self.search_text.offsets[position + 1])
+
+        with self._match_lock:
+            self._match_cache[query] = positions
+            if len(self._match_cache) > MATCH_CACHE_SIZE:
+                self._match_cache.popitem(last=False)
+        return positions
+
+    @consistent
+    def get_subtitle_info(self, subtitle_id):
+        """Get basic subtitle information without surrounding frames and subtitles"""
+        return self._subtitle_info(subtitle_id)
+
+    def _subtitle_info(self, subtitle_id):
+        position = self._position(subtitle_id)
+        if position is None:
+            return None
+
+        key = (self.seasons[position], self.episode_numbers[position])
+        return {
+            "subtitle_id": subtitle_id,
+            "episode": self._episode_code(position),
+            "episode_title": self.episodes[key]["title"],
+            "index": self.numbers[position],
+            "timestamp_start": self.timestamps_start[position],
+            "timestamp_end": self.timestamps_end[position],
+            "start_ms": self.start_ms[position],
+            "end_ms": self.end_ms[position],
+            "dialogue": self.content[position],
+            "start_frame": self.start_frames[position],
+            "end_frame": self.end_frames[position]
+        }
+
+    @consistent
+    def search_quotes(self, query, page=1, limit=20, cursor=None, include_total=True):
+        """Search subtitles held in memory for matching keywords"""
+        check_page(page, limit)
+        positions = self._matching_positions(query)
+        keyset = cursor is not None
+
+        if keyset:
+            start = 0
+            if cursor:
+                # Rows are stored in cursor order, so the cursor maps straight to a position
+                season, episode, number = decode_cursor(cursor)
+                after = self._seek(season, episode, number)
+                start = bisect_left(positions, after)
+            page_positions = positions[start:start + limit]
+        else:
+            offset = (page - 1) * limit
+            page_positions = positions[offset:offset + limit]
+
+        results = []
+        for position in page_positions:
+            episode = self.episodes[(self.seasons[position], self.episode_numbers[position])]
+            thumbnail_prefix, _ = self.episode_urls(episode["id"])
+            results.append({
+                "subtitle_id": self.ids[position],
+                "episode": episode["id"],
+                "episode_title": episode["title"],
+                "index": self.numbers[position],
+                "dialogue": self.content[position],
+                "start_frame": self.start_frames[position],
+                "end_frame": self.end_frames[position],
+                "timestamp": self._timestamp(position),
+                "frame_indices": self._frame_indices(position),
+                "thumbnail_url": f"{thumbnail_prefix}{self.numbers[position]}.jpg"
+            })
+
+        total_results = len(positions)
+        if keyset:
+            next_cursor = None
+            if page_positions and page_positions[-1] != positions[-1]:
+                last = page_positions[-1]
+                next_cursor = encode_cursor(self.seasons[last], self.episode_numbers[last], self.numbers[last])
+            pagination = {
+                "next_cursor": next_cursor,
+                "limit": limit
+            }
+            if include_total:
+                pagination["total_results"] = total_results
+        else:
+            pagination = {
+                "total_results": total_results,
+                "page": page,
+                "total_pages": (total_results + limit - 1) // limit,
+                "limit": limit
+            }
+
+        return {
+            "results": results,
+            "pagination": pagination
+        }
+
+    def _seek(self, season, episode, number):
+        """Get the first row position strictly after (season, episode, number)"""
+        if (season, episode) in self.episode_ranges:
+            start, end = self.episode_ranges[(season, episode)]
+            return bisect_right(self.numbers, number, start, end)
+
+        # Unknown episode, find the first episode that sorts after it
+        following = [start for key, (start, _) in self.episode_ranges.items() if key > (season, episode)]
+        return min(following, default=len(self.ids))
+
+    @consistent
+    def get_subtitle(self, subtitle_id, frames_before=3, frames_after=3, subtitles_before=2, subtitles_after=2):
+        """Get detailed information about a specific subtitle from memory"""
+        subtitle = self._subtitle_info(subtitle_id)
+        if not subtitle:
+            return None
+
+        position = self._position(subtitle_id)
+        start, end = self.episode_ranges[(self.seasons[position], self.episode_numbers[position])]
+        episode_code = subtitle["episode"]
+
+        subtitle["timestamp"] = timestamp_range(
+            subtitle.pop("timestamp_start"), subtitle.pop("timestamp_end"),
+            subtitle.pop("start_ms"), subtitle.pop("end_ms")
+        )
+        subtitle["frame_indices"] = self._frame_indices(position)
+
+        def before(count):
+            return range(max(start, position - count), position)
+
+        def after(count):
+            return range(position + 1, min(end, position + 1 + count))
+
+        _, frame_prefix = self.episode_urls(episode_code)
+
+        def frame(row):
+            return {
+                "frame_id": self.ids[row],
+                "timestamp": self.timestamps_start[row],
+                "url": f"{frame_prefix}{self.ids[row]}.jpg"
+            }
+
+        def surrounding(row):
+            return {
+                "subtitle_id": self.ids[row],
+                "dialogue": self.content[row],
+                "timestamp": self._timestamp(row)
+            }
+
+        return {
+            "subtitle": subtitle,
+            "frames": {
+                "before": [frame(row) for row in before(frames_before)],
+                "current": frame(position),
+                "after": [frame(row) for row in after(frames_after)]
+            },
+            "surrounding_subtitles": {
+                "before": [surrounding(row) for row in before(subtitles_before)],
+                "after": [surrounding(row) for row in after(subtitles_after)]
+            },
+            "episode_link": f"/episode/{episode_code}?subtitle={subtitle_id}"
+        }
+
+    @consistent
+    def get_episode_subtitles(self, episode_id, page=1, limit=50, cursor=None, include_total=True):
+        """Get all subtitles for a specific episode from memory with pagination"""
+        check_page(page, limit)
+        season = int(episode_id[1:3])
+        episode = int(episode_id[4:6])
+
+        episode_info = self.episodes.get((season, episode))
+        if not episode_info:
+            return None
+
+        start, end = self.episode_ranges.get((season, episode), (0, 0))
+        keyset = cursor is not None
+
+        if keyset:
+            first = start
+            if cursor:
+                cursor_season, cursor_episode, after_number = decode_cursor(cursor)
+                if (cursor_season, cursor_episode) != (season, episode):
+                    raise ValueError(f"Cursor does not belong to episode {episode_id}")
+                first = bisect_right(self.numbers, after_number, start, end)
+        else:
+            first = start + (page - 1) * limit
+        rows = range(first, min(end, first + limit))
+
+        thumbnail_prefix, _ = self.episode_urls(episode_info["id"])
+        subtitles = [
+            {
+                "subtitle_id": self.ids[row],
+                "index": self.numbers[row],
+                "dialogue": self.content[row],
+                "start_frame": self.start_frames[row],
+                "end_frame": self.end_frames[row],
+                "timestamp": self._timestamp(row),
+                "frame_indices": self._frame_indices(row),
+                "thumbnail_url": f"{thumbnail_prefix}{self.numbers[row]}.jpg"
+            }
+            for row in rows
+        ]
+
+        total_subtitles = end - start
+        if keyset:
+            next_cursor = None
+            if rows and rows[-1] + 1 < end:
+                next_cursor = encode_cursor(season, episode, self.numbers[rows[-1]])
+            pagination = {
+                "next_cursor": next_cursor,
+                "limit": limit
+            }
+            if include_total:
+                pagination["total_subtitles"] = total_subtitles
+        else:
+            pagination = {
+                "total_subtitles": total_subtitles,
+                "page": page,
+                "total_pages": (total_subtitles + limit - 1) // limit,
+                "limit": limit
+            }
+
+        return {
+            "episode": dict(episode_info),
+            "subtitles": subtitles,
+            "pagination": pagination
+        }
@@ -0,0 +1,49 @@
+#!/usr/bin/env python3
+"""
+Script to upgrade an existing subtitles.db with derived search structures
+Run once after copying a new database into the static directory
+"""
+
+import sys
+import logging
+import argparse
+from pathlib import Path
+
+# Add the parent directory to the path so we can import the application modules
+parent_dir = Path(__file__).resolve().parent
+sys.path.append(str(parent_dir))
+
+# Configure logging
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger(__name__)
+
+from database import Database
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Build derived indexes for the Veepiac subtitle database")
+    parser.add_argument('--db', help="Path to subtitles.db (defaults to the configured database_path)")
+    parser.add_argument('--tokenizer', help="FTS5 tokenizer, e.g. 'trigram' or 'porter unicode61'")
+    args = parser.parse_args()
+
+    database = Database(args.db)
+
+    logger.info(f"Creating indexes in {database.db_path}")
+    database.build_indexes()
+
+    logger.info("Materializing episode codes")
+    database.build_episode_codes()
+
+    logger.info("Materializing millisecond timestamps")
+    database.build_timestamp_ms()
+
+    logger.info(f"Building full-text search index in {database.db_path}")
+    database.build_search_index(tokenizer=args.tokenizer)
+    logger.info("Full-text search index built")
+
+
+if __name__ == "__main__":
+    main()
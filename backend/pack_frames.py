@@ -0,0 +1,75 @@
+#!/usr/bin/env python3
+"""
+Script to pack each episode's frames/ and thumbnails/ directories into
+single archives (frames.pack + frames.idx, thumbnails.pack + thumbnails.idx)
+that the API serves in place of the loose JPEGs
+"""
+
+import sys
+import shutil
+import logging
+import argparse
+from pathlib import Path
+
+# Add the parent directory to the path so we can import the application modules
+parent_dir = Path(__file__).resolve().parent
+sys.path.append(str(parent_dir))
+
+# Configure logging
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger(__name__)
+
+from config import config
+from frame_store import FrameIndex, PackedImages, IMAGE_PREFIXES, EPISODE_PATTERN, write_pack
+
+
+def find_episodes(static_dir):
+    """Get the codes of all episode directories (static/Season X/SXXEYY)"""
+    return sorted(
+        episode_dir.name
+        for episode_dir in static_dir.glob("Season */*")
+        if episode_dir.is_dir() and EPISODE_PATTERN.match(episode_dir.name)
+    )
+
+
+def pack_episode(episode, remove_loose=False):
+    """Pack the image directories of one episode"""
+    index = FrameIndex()
+    for kind in IMAGE_PREFIXES:
+        directory = index.directory(episode, kind)
+        if not len(directory):
+            continue
+
+        episode_dir = directory.directory.parent
+        data_path = episode_dir / f"{kind}.pack"
+        index_path = episode_dir / f"{kind}.idx"
+        images, size = write_pack(directory, data_path, index_path)
+        logger.info(f"{episode}/{kind}: packed {images} images ({size} bytes)")
+
+        if remove_loose:
+            # Only delete the originals once every image reads back identically
+            pack = PackedImages(data_path, index_path)
+            for number in directory.numbers:
+                if pack.read(number) != directory.get(number).read_bytes():
+                    raise RuntimeError(f"{episode}/{kind}: frame {number} differs after packing")
+            shutil.rmtree(directory.directory)
+            logger.info(f"{episode}/{kind}: removed loose images")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Pack episode frames and thumbnails into archives")
+    parser.add_argument('--episode', action='append', help="Only pack this episode (e.g. S01E04), repeatable")
+    parser.add_argument('--remove-loose', action='store_true',
+                        help="Delete the loose JPEGs after verifying the archive")
+    args = parser.parse_args()
+
+    episodes = args.episode or find_episodes(config.static_dir)
+    for episode in episodes:
+        pack_episode(episode, remove_loose=args.remove_loose)
+
+
+if __name__ == "__main__":
+    main()
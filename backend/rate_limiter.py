@@ -0,0 +1,151 @@
+import os
+import math
+import time
+import sqlite3
+import hashlib
+import logging
+import threading
+from pathlib import Path
+
+from config import config
+
+logger = logging.getLogger(__name__)
+
+# Tokens charged per endpoint when api.rate_limit_costs doesn't list it
+DEFAULT_COST = 1
+
+# Refill and charge a bucket in one statement; every SET expression sees the row
+# as it was before the update, so `granted` is decided on the refilled balance
+TAKE_SQL = """
+    INSERT INTO buckets (key, tokens, updated, granted) VALUES (:key, :capacity - :cost, :now, 1)
+    ON CONFLICT(key) DO UPDATE SET
+        tokens = min(:capacity, tokens + max(0, :now - updated) * :rate)
+            - CASE WHEN min(:capacity, tokens + max(0, :now - updated) * :rate) >= :cost THEN :cost ELSE 0 END,
+        granted = min(:capacity, tokens + max(0, :now - updated) * :rate) >= :cost,
+        updated = :now
+    RETURNING tokens, granted
+"""
+
+
+class RateLimitResult:
+    """Outcome of charging a request to a bucket"""
+
+    __slots__ = ("allowed", "limit", "remaining", "reset", "retry_after")
+
+    def __init__(self, allowed, limit, remaining, reset, retry_after):
+        self.allowed = allowed
+        self.limit = limit
+        self.remaining = remaining
+        self.reset = reset
+        self.retry_after = retry_after
+
+    def headers(self):
+        """Get the X-RateLimit-* (and, when refused, Retry-After) response headers"""
+        headers = {
+            'X-RateLimit-Limit': str(self.limit),
+            'X-RateLimit-Remaining': str(self.remaining),
+            'X-RateLimit-Reset': str(self.reset)
+        }
+        if not self.allowed:
+            headers['Retry-After'] = str(self.retry_after)
+        return headers
+
+
+class RateLimiter:
+    """
+    Token buckets per API key, shared by every worker process on a host
+
+    A bucket holds up to a tier's limit in tokens and refills at that many
+    tokens per period. Each request takes its endpoint's cost from the bucket
+    and is refused while the bucket holds less. Buckets live in a small local
+    SQLite database that never syncs to disk; a charge is one statement on a
+    connection kept open by each thread, so it costs well under a millisecond.
+    """
+
+    def __init__(self, db_path, period=86400, costs=None):
+        """
+        Initialize the limiter
+
+        Args:
+            db_path: Path of the SQLite bucket database, created if missing; a
+                tmpfs path such as /dev/shm keeps it in memory
+            period: Seconds in which an empty bucket refills completely
+            costs: Tokens charged per endpoint name
+        """
+        self.db_path = Path(db_path)
+        self.period = period
+        self.costs = costs or {}
+        self._local = threading.local()
+
+    def _connection(self):
+        """Get this thread's connection, opening it on first use or after a fork"""
+        conn = getattr(self._local, 'conn', None)
+        if conn is not None and self._local.pid == os.getpid():
+            return conn
+
+        self.db_path.parent.mkdir(parents=True, exist_ok=True)
+        conn = sqlite3.connect(str(self.db_path), timeout=5, isolation_level=None, check_same_thread=False)
+        # Counters are disposable, so nothing is worth an fsync
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=OFF")
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS buckets (
+                key TEXT PRIMARY KEY,
+                tokens REAL NOT NULL,
+                updated REAL NOT NULL,
+                granted INTEGER NOT NULL
+            ) WITHOUT ROWID
+        """)
+        self._local.conn = conn
+        self._local.pid = os.getpid()
+        return conn
+
+    def cost(self, endpoint):
+        """Get the tokens a request to an endpoint costs"""
+        return self.costs.get(endpoint, DEFAULT_COST)
+
+    def take(self, key, limit, cost):
+        """
+        Charge `cost` tokens to the bucket of `key`, which holds at most `limit`
+
+        An endpoint costing more than a whole bucket is charged a full bucket.
+        """
+        limit = max(1, int(limit))
+        cost = min(cost, limit)
+        rate = limit / self.period
+        # Keys are API keys; only a digest of them is written to disk
+        bucket = hashlib.blake2b(key.encode('utf-8'), digest_size=16).hexdigest()
+
+        tokens, granted = self._connection().execute(
+            TAKE_SQL,
+            {"key": bucket, "capacity": limit, "cost": cost, "now": time.time(), "rate": rate}
+        ).fetchone()
+
+        return RateLimitResult(
+            allowed=bool(granted),
+            limit=limit,
+            remaining=max(0, int(tokens)),
+            reset=math.ceil((limit - tokens) / rate),
+            retry_after=0 if granted else max(1, math.ceil((cost - tokens) / rate))
+        )
+
+    def purge(self):
+        """Delete buckets that have refilled completely, which are the same as missing ones"""
+        cursor = self._connection().execute(
+            "DELETE FROM buckets WHERE updated < ?", (time.time() - self.period,)
+        )
+        return cursor.rowcount
+
+
+def create_rate_limiter():
+    """Create the rate limiter from the configuration"""
+    db_path = config.get('api.rate_limit_db_path')
+    return RateLimiter(
+        db_path or config.media_output_dir / "rate_limits.db",
+        period=config.get('api.rate_limit_period', 86400),
+        costs=config.get('api.rate_limit_costs', {})
+    )
+
+
+# Create a singleton rate limiter
+rate_limiter = create_rate_limiter()
@@ -0,0 +1,117 @@
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+
+
+class CachedResponse:
+    """A serialized response body with its strong ETag"""
+
+    __slots__ = ("body", "etag", "mimetype", "created", "version")
+
+    def __init__(self, body, mimetype, version):
+        self.body = body
+        self.etag = hashlib.blake2b(body, digest_size=16).hexdigest()
+        self.mimetype = mimetype
+        self.created = time.monotonic()
+        self.version = version
+
+
+class ResponseCache:
+    """Size-bounded LRU cache of response bodies with a TTL and data-version invalidation"""
+
+    def __init__(self, max_bytes=64 * 1024 * 1024, ttl=3600, version_source=None, version_check_interval=1.0):
+        """
+        Initialize an empty cache
+
+        Args:
+            max_bytes: Total size of cached bodies before least recently used entries are evicted
+            ttl: Seconds an entry stays valid
+            version_source: Callable returning the current data version; entries
+                stored under a different version are discarded
+            version_check_interval: Minimum seconds between calls to version_source
+        """
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.version_source = version_source
+        self.version_check_interval = version_check_interval
+
+        self._entries = OrderedDict()
+        self._size = 0
+        self._lock = threading.Lock()
+        self._version = None
+        self._version_checked = 0.0
+        self._stats = {"hits": 0, "misses": 0, "evictions": 0, "invalidations": 0}
+
+    def _current_version(self):
+        """Get the data version, polling the source at most once per check interval"""
+        if self.version_source is None:
+            return None
+
+        now = time.monotonic()
+        if now - self._version_checked >= self.version_check_interval:
+            self._version_checked = now
+            version = self.version_source()
+            if version != self._version:
+                if self._version is not None:
+                    self._stats["invalidations"] += 1
+                self._version = version
+                self._entries.clear()
+                self._size = 0
+        return self._version
+
+    def _remove(self, key):
+        entry = self._entries.pop(key)
+        self._size -= len(entry.body)
+
+    def get(self, key):
+        """Get a cached response, or None if it's missing, expired or stale"""
+        with self._lock:
+            version = self._current_version()
+            entry = self._entries.get(key)
+            if entry is None:
+                self._stats["misses"] += 1
+                return None
+
+            if entry.version != version or time.monotonic() - entry.created > self.ttl:
+                self._remove(key)
+                self._stats["misses"] += 1
+                return None
+
+            self._entries.move_to_end(key)
+            self._stats["hits"] += 1
+            return entry
+
+    def set(self, key, body, mimetype="application/json"):
+        """Store a response body and return the cached entry"""
+        with self._lock:
+            entry = CachedResponse(body, mimetype, self._current_version())
+
+            # Bodies larger than the whole budget are returned but never stored
+            if len(body) > self.max_bytes:
+                return entry
+
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = entry
+            self._size += len(body)
+
+            while self._size > self.max_bytes:
+                self._remove(next(iter(self._entries)))
+                self._stats["evictions"] += 1
+            return entry
+
+    def clear(self):
+        """Remove all entries"""
+        with self._lock:
+            self._entries.clear()
+            self._size = 0
+
+    def stats(self):
+        """Get cache usage metrics"""
+        with self._lock:
+            stats = dict(self._stats)
+            stats["entries"] = len(self._entries)
+            stats["bytes"] = self._size
+            stats["max_bytes"] = self.max_bytes
+        return stats
@@ -0,0 +1,186 @@
+import time
+import logging
+import threading
+from array import array
+from bisect import bisect_right
+
+logger = logging.getLogger(__name__)
+
+
+class IntervalArray:
+    """
+    Intervals sorted by start, for finding the one covering a position by bisection
+
+    `max_ends` holds the largest end of every interval up to each one, so when
+    intervals overlap the search stops as soon as nothing earlier can reach the
+    position instead of scanning back through the whole episode.
+    """
+
+    __slots__ = ("rows", "starts", "ends", "max_ends")
+
+    def __init__(self, intervals):
+        """Build from (row, start, end) tuples; intervals without a start or end are left out"""
+        intervals = sorted(
+            (start, end, row) for row, start, end in intervals
+            if start is not None and end is not None
+        )
+        self.rows = array('q', (row for _, _, row in intervals))
+        self.starts = array('q', (start for start, _, _ in intervals))
+        self.ends = array('q', (end for _, end, _ in intervals))
+
+        self.max_ends = array('q')
+        highest = None
+        for end in self.ends:
+            highest = end if highest is None else max(highest, end)
+            self.max_ends.append(highest)
+
+    def find(self, position):
+        """
+        Get (covering, previous, next) rows for a position
+
+        `covering` is the latest-starting interval containing the position, or
+        None. `previous` and `next` are the nearest intervals before and after
+        it (or around the gap the position falls in), None at either end.
+        """
+        last = bisect_right(self.starts, position) - 1
+
+        index = last
+        covering = None
+        while index >= 0 and self.max_ends[index] >= position:
+            if self.ends[index] >= position:
+                covering = index
+                break
+            index -= 1
+
+        previous = (covering if covering is not None else last + 1) - 1
+        following = last + 1
+        return (
+            self.rows[covering] if covering is not None else None,
+            self.rows[previous] if previous >= 0 else None,
+            self.rows[following] if following < len(self.rows) else None
+        )
+
+
+class EpisodeIntervals:
+    """One episode's subtitles, indexed by frame number and by time"""
+
+    def __init__(self, rows):
+        """
+        Build from (subtitle_id, start_frame, end_frame, timestamp_start, timestamp_end,
+        start_ms, end_ms, content) rows
+        """
+        self.ids = array('q', (row[0] for row in rows))
+        self.start_frames = [row[1] for row in rows]
+        self.end_frames = [row[2] for row in rows]
+        self.timestamps_start = [row[3] for row in rows]
+        self.timestamps_end = [row[4] for row in rows]
+        self.start_ms = [row[5] for row in rows]
+        self.end_ms = [row[6] for row in rows]
+        self.content = [row[7] for row in rows]
+
+        self.frames = IntervalArray(
+            (position, row[1], row[2]) for position, row in enumerate(rows)
+        )
+        self.times = IntervalArray(
+            (position, row[5], row[6]) for position, row in enumerate(rows)
+        )
+
+    def subtitle(self, position):
+        """Get the public fields of the subtitle at a row position"""
+        return {
+            "subtitle_id": self.ids[position],
+            "dialogue": self.content[position],
+            "timestamp": {
+                "start": self.timestamps_start[position],
+                "end": self.timestamps_end[position],
+                "start_ms": self.start_ms[position],
+                "end_ms": self.end_ms[position]
+            },
+            "start_frame": self.start_frames[position],
+            "end_frame": self.end_frames[position]
+        }
+
+    def lookup(self, intervals, position):
+        """Resolve a position to the subtitle shown there and its neighbours' IDs"""
+        covering, previous, following = intervals.find(position)
+        return {
+            "subtitle": self.subtitle(covering) if covering is not None else None,
+            "previous_subtitle_id": self.ids[previous] if previous is not None else None,
+            "next_subtitle_id": self.ids[following] if following is not None else None
+        }
+
+    def at_frame(self, frame):
+        """Get the subtitle on screen at a frame number"""
+        return self.lookup(self.frames, frame)
+
+    def at_time(self, milliseconds):
+        """Get the subtitle on screen at a time in milliseconds"""
+        return self.lookup(self.times, milliseconds)
+
+
+class SubtitleIndex:
+    """
+    Per-process interval index of every episode's subtitles
+
+    Built from one query on first use and rebuilt when the database changes,
+    so frame and time lookups are a bisection with no SQL.
+    """
+
+    def __init__(self, source, version_source=None, version_check_interval=1.0):
+        """
+        Initialize an empty index
+
+        Args:
+            source: Callable returning rows grouped by episode, like Database.get_subtitle_intervals
+            version_source: Callable returning the current data version; the
+                index is rebuilt when it changes
+            version_check_interval: Minimum seconds between calls to version_source
+        """
+        self.source = source
+        self.version_source = version_source
+        self.version_check_interval = version_check_interval
+
+        self._episodes = None
+        self._lock = threading.Lock()
+        self._version = None
+        self._version_checked = 0.0
+
+    def _check_version(self):
+        """Drop the index if the data changed, polling the source at most once per check interval"""
+        if self.version_source is None:
+            return
+
+        now = time.monotonic()
+        if now - self._version_checked < self.version_check_interval:
+            return
+
+        self._version_checked = now
+        version = self.version_source()
+        if version != self._version:
+            self._version = version
+            self._episodes = None
+
+    def episode(self, episode):
+        """Get an episode's intervals, or None if it has no subtitles"""
+        self._check_version()
+        episodes = self._episodes
+        if episodes is None:
+            with self._lock:
+                episodes = self._episodes
+                if episodes is None:
+                    started = time.perf_counter()
+                    # Built into a local, since a version check in another thread can drop the index meanwhile
+                    episodes = {
+                        code: EpisodeIntervals(rows) for code, rows in self.source().items()
+                    }
+                    self._episodes = episodes
+                    logger.info(
+                        f"Indexed subtitles of {len(episodes)} episodes "
+                        f"in {time.perf_counter() - started:.2f}s"
+                    )
+        return episodes.get(episode)
+
+    def invalidate(self):
+        """Forget the index so it's rebuilt on next use"""
+        with self._lock:
+            self._episodes = None
@@ -0,0 +1,75 @@
+import os
+import sys
+import json
+import atexit
+import shutil
+import tempfile
+from pathlib import Path
+
+import pytest
+
+# Add the backend directory to the path so the tests can import the application modules
+backend_dir = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(backend_dir))
+
+# The application modules read their configuration on import, so it has to
+# point at a throwaway directory before any of them are imported
+test_dir = Path(tempfile.mkdtemp(prefix="veepiac-tests-"))
+atexit.register(shutil.rmtree, test_dir, ignore_errors=True)
+
+config_path = test_dir / "config.json"
+config_path.write_text(json.dumps({
+    "environment": "development",
+    "static_dir": str(test_dir / "static"),
+    "database_path": str(test_dir / "subtitles.db"),
+    "media_output_dir": str(test_dir / "media_output"),
+    "ignore_missing_dirs": True,
+    "bypass_api_key": True,
+    "bypass_rate_limit": True,
+    "auto_cleanup_media": False,
+    "cache": {"version_check_interval": 0},
+    "jobs": {"run_in_app": False}
+}))
+os.environ['VEEPIAC_CONFIG'] = str(config_path)
+
+
+def subtitle_rows(count):
+    """Build `count` consecutive one-second subtitles in INGEST_COLUMNS order"""
+    rows = []
+    for number in range(1, count + 1):
+        start_ms, end_ms = (number - 1) * 1000, number * 1000 - 1
+        start = f"00:00:{start_ms // 1000:02d},000"
+        end = f"00:00:{end_ms // 1000:02d},999"
+        rows.append((
+            number, f"{start} --> {end}", start, end, f"line {number} of the episode",
+            number * 24, number * 24 + 23, start_ms, end_ms
+        ))
+    return rows
+
+
+@pytest.fixture(scope="session")
+def client():
+    """Flask test client backed by a small two-episode database"""
+    from database import Database
+
+    database = Database(test_dir / "subtitles.db")
+    database.ingest_episodes([
+        {
+            "code": code,
+            "season": 1,
+            "episode": number,
+            "title": f"Episode {number}",
+            "file_path": f"Season 1/{code}/subtitles.csv",
+            "hash": code,
+            "subtitles": subtitle_rows(5)
+        }
+        for number, code in ((1, "S01E01"), (2, "S01E02"))
+    ], rebuild=True)
+    database.build_indexes()
+    database.build_episode_codes()
+    database.build_timestamp_ms()
+    database.build_search_index()
+    database.pool.close()
+
+    from app import app
+    return app.test_client()
@@ -0,0 +1,12 @@
+from config import config
+
+
+def test_span_longer_than_max_frames_is_a_bad_request(client):
+    max_frames = config.get('gif.max_frames', 600)
+    response = client.post('/v1/create/gif', json={
+        "subtitle_id": 1,
+        "start_frame": 0,
+        "end_frame": max_frames
+    })
+    assert response.status_code == 400
+    assert str(max_frames) in response.get_json()['error']
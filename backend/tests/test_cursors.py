@@ -0,0 +1,73 @@
+import pytest
+
+from database import db, encode_cursor, decode_cursor
+
+
+@pytest.mark.parametrize("position", [(1, 1, 1), (1, 4, 37), (12, 25, 123456)])
+def test_round_trip(position):
+    assert decode_cursor(encode_cursor(*position)) == position
+
+
+def test_cursor_is_url_safe():
+    cursor = encode_cursor(99, 99, 999999)
+    assert cursor.replace('-', '').replace('_', '').isalnum()
+
+
+@pytest.mark.parametrize("cursor", [
+    "not a cursor",
+    "AAAA",                            # decodes to bytes that aren't a position
+    encode_cursor(1, 2, 3)[:-3],       # truncated
+    "MS4y",                            # "1.2": too few parts
+    "MS4yLjMuNA",                      # "1.2.3.4": too many parts
+    "YS5iLmM",                         # "a.b.c": not numbers
+    "/w",                              # not UTF-8
+])
+def test_malformed_cursor(cursor):
+    with pytest.raises(ValueError):
+        decode_cursor(cursor)
+
+
+def test_search_pages_follow_cursors(client):
+    first = client.get('/v1/search?query=episode&cursor=&limit=3').get_json()
+    second = client.get(f"/v1/search?query=episode&cursor={first['pagination']['next_cursor']}&limit=3").get_json()
+    ids = [result['subtitle_id'] for result in first['results'] + second['results']]
+    assert len(ids) == 6
+    assert len(set(ids)) == 6
+
+
+def test_episode_pages_follow_cursors(client):
+    first = client.get('/v1/episode/S01E01?cursor=&limit=2').get_json()
+    second = client.get(f"/v1/episode/S01E01?cursor={first['pagination']['next_cursor']}&limit=2").get_json()
+    numbers = [subtitle['index'] for subtitle in first['subtitles'] + second['subtitles']]
+    assert numbers == [1, 2, 3, 4]
+
+
+@pytest.mark.parametrize("path", [
+    '/v1/search?query=episode&cursor=garbage',
+    '/v1/episode/S01E01?cursor=garbage'
+])
+def test_malformed_cursor_is_a_bad_request(client, path):
+    response = client.get(path)
+    assert response.status_code == 400
+    assert 'Invalid cursor' in response.get_json()['error']
+
+
+@pytest.mark.parametrize("path", [
+    '/v1/search?query=episode&cursor=&limit=0',
+    '/v1/search?query=episode&cursor=&limit=-1',
+    '/v1/search?query=episode&page=0',
+    '/v1/search?query=episode&limit=many',
+    '/v1/episode/S01E01?cursor=&limit=0',
+    '/v1/episode/S01E01?cursor=&limit=-1',
+    '/v1/episode/S01E01?page=-2'
+])
+def test_page_and_limit_below_one_are_bad_requests(client, path):
+    assert client.get(path).status_code == 400
+
+
+@pytest.mark.parametrize("page, limit", [(1, 0), (0, 10), (-1, 10)])
+def test_database_rejects_page_and_limit_below_one(page, limit):
+    with pytest.raises(ValueError):
+        db.search_quotes('episode', page=page, limit=limit, cursor='')
+    with pytest.raises(ValueError):
+        db.get_episode_subtitles('S01E01', page=page, limit=limit, cursor='')
@@ -0,0 +1,58 @@
+import shutil
+from array import array
+
+import pytest
+
+from frame_store import DirectoryIndex, PackedImages, ArchiveMismatch, write_pack
+
+
+def loose_frames(directory, images):
+    """Write `images` ({frame number: bytes}) as loose frame files and index them"""
+    directory.mkdir(parents=True, exist_ok=True)
+    for number, image in images.items():
+        (directory / f"frame_{number:010d}.jpg").write_bytes(image)
+    return DirectoryIndex(directory, "frame", array('q', sorted(images)), {})
+
+
+def build(tmp_path, name, images):
+    """Pack `images` into `<name>.pack`/`<name>.idx` and return their paths"""
+    data_path, index_path = tmp_path / f"{name}.pack", tmp_path / f"{name}.idx"
+    write_pack(loose_frames(tmp_path / name, images), data_path, index_path)
+    return data_path, index_path
+
+
+def test_round_trip(tmp_path):
+    images = {3: b"three", 4: b"four", 7: b"seven"}
+    pack = PackedImages(*build(tmp_path, "frames", images))
+    assert [pack.read(number) for number in range(3, 8)] == [b"three", b"four", None, None, b"seven"]
+    assert 5 not in pack
+    assert pack.read(2) is None
+
+
+def test_empty_directory(tmp_path):
+    pack = PackedImages(*build(tmp_path, "frames", {}))
+    assert len(pack) == 0
+    assert pack.read(0) is None
+
+
+def test_data_from_another_build_is_rejected(tmp_path):
+    data_path, index_path = build(tmp_path, "frames", {1: b"old"})
+    new_data, _ = build(tmp_path, "rebuilt", {1: b"new image"})
+
+    # What a reader sees between write_pack's two moves
+    shutil.copy(new_data, data_path)
+    with pytest.raises(ArchiveMismatch):
+        PackedImages(data_path, index_path)
+
+
+def test_open_data_refuses_a_rebuilt_file(tmp_path):
+    data_path, index_path = build(tmp_path, "frames", {1: b"old"})
+    pack = PackedImages(data_path, index_path)
+    with pack.open_data() as data_file:
+        offset, length = pack.entry(1)
+        data_file.seek(offset)
+        assert data_file.read(length) == b"old"
+
+    build(tmp_path, "frames", {1: b"new image"})
+    assert pack.open_data() is None
+    assert pack.read(1) == b"old"
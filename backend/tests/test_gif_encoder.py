@@ -0,0 +1,58 @@
+import io
+
+from PIL import Image, ImageSequence
+
+from gif_encoder import GifStreamWriter, build_palette, TRANSPARENT_INDEX
+
+RED = (200, 10, 10)
+NAVY = (20, 20, 90)
+SIZE = (16, 16)
+
+
+def encode(frames, samples, deltas):
+    """Encode frames to GIF bytes with a palette built from `samples`"""
+    palette = build_palette(samples, colors=TRANSPARENT_INDEX if deltas else 256)
+    fp = io.BytesIO()
+    writer = GifStreamWriter(fp, SIZE, palette, 0.1, deltas=deltas)
+    for frame in frames:
+        writer.add_frame(frame)
+    writer.close()
+    return fp.getvalue()
+
+
+def decode(data):
+    """Decode every frame of a GIF to RGB, with delta frames composited"""
+    with Image.open(io.BytesIO(data)) as gif:
+        return [frame.convert('RGB') for frame in ImageSequence.Iterator(gif)]
+
+
+def two_colour_frames():
+    """A red frame, then the same frame with a black patch that isn't in the palette sample"""
+    first = Image.new('RGB', SIZE, RED)
+    first.paste(NAVY, (0, 0, 16, 4))
+    second = first.copy()
+    second.paste((0, 0, 0), (4, 8, 12, 12))
+    return first, second
+
+
+def test_unused_palette_slots_repeat_a_real_colour():
+    first, _ = two_colour_frames()
+    colours = build_palette([first], colors=TRANSPARENT_INDEX).getpalette()
+    entries = {tuple(colours[index:index + 3]) for index in range(0, 768, 3)}
+    assert entries == {RED, NAVY}
+
+
+def test_dark_pixels_survive_delta_frames():
+    first, second = two_colour_frames()
+    decoded = decode(encode([first, second], [first], deltas=True))
+
+    # The patch falls on the nearest real colour, not through to the red underneath
+    assert decoded[1].getpixel((8, 10)) == NAVY
+    assert decoded[1].getpixel((0, 15)) == RED
+
+
+def test_delta_frames_match_full_frames():
+    first, second = two_colour_frames()
+    full = decode(encode([first, second], [first], deltas=False))
+    delta = decode(encode([first, second], [first], deltas=True))
+    assert [list(frame.getdata()) for frame in delta] == [list(frame.getdata()) for frame in full]
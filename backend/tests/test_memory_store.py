@@ -0,0 +1,60 @@
+import pytest
+
+from database import Database
+from memory_store import MemoryDatabase, IntColumn, TextColumn
+from conftest import subtitle_rows
+
+
+@pytest.fixture(scope="module")
+def backends(tmp_path_factory):
+    """The SQLite and memory backends over one episode whose last subtitle has no frames or times"""
+    db_path = tmp_path_factory.mktemp("memory") / "subtitles.db"
+    rows = subtitle_rows(4)
+    rows.append((5, None, None, None, "no timing at all", None, None, None, None))
+
+    database = Database(db_path)
+    database.ingest_episodes([{
+        "code": "S01E01",
+        "season": 1,
+        "episode": 1,
+        "title": "Episode 1",
+        "file_path": "Season 1/S01E01/subtitles.csv",
+        "hash": "S01E01",
+        "subtitles": rows
+    }], rebuild=True)
+    database.build_indexes()
+    database.build_episode_codes()
+    database.build_timestamp_ms()
+    database.build_search_index()
+    return database, MemoryDatabase(db_path)
+
+
+def test_columns_keep_nulls():
+    assert list(IntColumn([3, None, 0])) == [3, None, 0]
+    assert list(TextColumn(["a", None, ""])) == ["a", None, ""]
+
+
+def test_episode_pages_match_sqlite(backends):
+    sqlite_db, memory_db = backends
+    expected = sqlite_db.get_episode_subtitles('S01E01', page=1, limit=10)
+    assert memory_db.get_episode_subtitles('S01E01', page=1, limit=10)["subtitles"] == expected["subtitles"]
+
+    untimed = expected["subtitles"][-1]
+    assert untimed["start_frame"] is None
+    assert untimed["frame_indices"] == []
+    assert untimed["timestamp"]["start_ms"] is None
+
+
+def test_subtitle_info_matches_sqlite(backends):
+    sqlite_db, memory_db = backends
+    subtitle_id = sqlite_db.get_episode_subtitles('S01E01', page=1, limit=10)["subtitles"][-1]["subtitle_id"]
+    assert memory_db.get_subtitle_info(subtitle_id) == sqlite_db.get_subtitle_info(subtitle_id)
+
+
+@pytest.mark.parametrize("page, limit", [(0, 2), (-1, 2), (1, 0)])
+def test_page_and_limit_below_one_are_rejected(backends, page, limit):
+    _, memory_db = backends
+    with pytest.raises(ValueError):
+        memory_db.get_episode_subtitles('S01E01', page=page, limit=limit)
+    with pytest.raises(ValueError):
+        memory_db.search_quotes('timing', page=page, limit=limit)
@@ -0,0 +1,60 @@
+from subtitle_index import IntervalArray
+
+
+def test_position_inside_an_interval():
+    intervals = IntervalArray([(0, 0, 10), (1, 20, 30), (2, 40, 50)])
+    assert intervals.find(25) == (1, 0, 2)
+
+
+def test_interval_ends_are_inclusive():
+    intervals = IntervalArray([(0, 0, 10), (1, 20, 30)])
+    assert intervals.find(10) == (0, None, 1)
+    assert intervals.find(20) == (1, 0, None)
+
+
+def test_gap_between_intervals():
+    intervals = IntervalArray([(0, 0, 10), (1, 20, 30)])
+    assert intervals.find(15) == (None, 0, 1)
+
+
+def test_before_first_interval():
+    intervals = IntervalArray([(0, 5, 10), (1, 20, 30)])
+    assert intervals.find(0) == (None, None, 0)
+
+
+def test_after_last_interval():
+    intervals = IntervalArray([(0, 0, 10), (1, 20, 30)])
+    assert intervals.find(31) == (None, 1, None)
+
+
+def test_overlap_prefers_the_latest_start():
+    intervals = IntervalArray([(0, 0, 100), (1, 40, 60)])
+    assert intervals.find(50) == (1, 0, None)
+
+
+def test_overlap_reaches_back_past_shorter_intervals():
+    # Interval 1 starts closer to 70 but ended at 30; max_ends keeps the
+    # search going back to interval 0, which still covers it
+    intervals = IntervalArray([(0, 0, 100), (1, 20, 30), (2, 80, 90)])
+    assert intervals.find(70) == (0, None, 2)
+
+
+def test_overlap_ended_before_position_is_a_gap():
+    intervals = IntervalArray([(0, 0, 30), (1, 10, 20), (2, 50, 60)])
+    assert intervals.find(40) == (None, 1, 2)
+
+
+def test_rows_are_sorted_by_start():
+    intervals = IntervalArray([(7, 20, 30), (3, 0, 10)])
+    assert intervals.find(5) == (3, None, 7)
+    assert intervals.find(25) == (7, 3, None)
+
+
+def test_intervals_without_a_start_or_end_are_left_out():
+    intervals = IntervalArray([(0, None, 10), (1, 20, None), (2, 30, 40)])
+    assert len(intervals.rows) == 1
+    assert intervals.find(5) == (None, None, 2)
+
+
+def test_empty():
+    assert IntervalArray([]).find(0) == (None, None, None)
@@ -0,0 +1,139 @@
+import logging
+import threading
+from collections import OrderedDict
+from functools import lru_cache
+from pathlib import Path
+
+from PIL import Image, ImageDraw, ImageFont
+
+from config import config
+
+logger = logging.getLogger(__name__)
+
+# Font used when the requested one isn't in the font directory
+DEFAULT_FONT = 'impact'
+
+# Loaded fonts kept per process, keyed by (name, size)
+FONT_CACHE_SIZE = 64
+
+FONT_EXTENSIONS = ('.ttf', '.otf')
+
+
+@lru_cache(maxsize=None)
+def font_files():
+    """Map lowercase font names to the files in the font directory, listed once per process"""
+    font_dir = Path(config.get('font_dir', 'fonts'))
+    if not font_dir.is_dir():
+        logger.warning(f"Font directory not found at {font_dir}, using the built-in font")
+        return {}
+    return {
+        path.stem.lower(): path
+        for path in font_dir.iterdir()
+        if path.suffix.lower() in FONT_EXTENSIONS
+    }
+
+
+def resolve_font(name):
+    """Get the path of a font by name (case-insensitive), or None if it isn't installed"""
+    return font_files().get(name.lower()) if name else None
+
+
+@lru_cache(maxsize=FONT_CACHE_SIZE)
+def load_font(name, size):
+    """Load a font at a pixel size, falling back to the default font, then the built-in one"""
+    path = resolve_font(name) or resolve_font(DEFAULT_FONT)
+    if path is None:
+        return ImageFont.load_default()
+    try:
+        return ImageFont.truetype(str(path), size)
+    except OSError:
+        logger.warning(f"Failed to load font {path}, using the built-in font")
+        return ImageFont.load_default()
+
+
+class TextBitmap:
+    """Rendered text with its offset from the anchor point (middle of the baseline)"""
+
+    __slots__ = ("image", "offset")
+
+    def __init__(self, image, offset):
+        self.image = image
+        self.offset = offset
+
+    def position(self, anchor):
+        """Get the top-left paste position that puts the text's anchor at `anchor`"""
+        return (int(anchor[0]) + self.offset[0], int(anchor[1]) + self.offset[1])
+
+
+def render_text(text, font, size, fill, stroke_fill, stroke_width):
+    """Rasterize outlined text into a tightly cropped RGBA bitmap"""
+    img_font = load_font(font, size)
+    params = {"font": img_font, "stroke_width": stroke_width}
+    if isinstance(img_font, ImageFont.FreeTypeFont):
+        params["anchor"] = "ms"
+        bbox = ImageDraw.Draw(Image.new('L', (1, 1))).textbbox((0, 0), text, **params)
+    else:
+        # Built-in bitmap fonts don't support anchors; centre above the baseline by hand
+        left, top, right, bottom = ImageDraw.Draw(Image.new('L', (1, 1))).textbbox((0, 0), text, **params)
+        width, height = right - left, bottom - top
+        bbox = (-(width // 2), -height, width - width // 2, 0)
+
+    image = Image.new('RGBA', (max(1, bbox[2] - bbox[0]), max(1, bbox[3] - bbox[1])), (0, 0, 0, 0))
+    ImageDraw.Draw(image).text((-bbox[0], -bbox[1]), text, fill=fill, stroke_fill=stroke_fill, **params)
+    return TextBitmap(image, (bbox[0], bbox[1]))
+
+
+class TextCache:
+    """Size-bounded LRU cache of rendered text bitmaps, so repeated captions are only rasterized once"""
+
+    def __init__(self, max_bytes=32 * 1024 * 1024):
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()
+        self._size = 0
+        self._lock = threading.Lock()
+        self._stats = {"hits": 0, "misses": 0, "evictions": 0}
+
+    def get(self, text, font, size, fill, stroke_fill, stroke_width):
+        """Get the bitmap for some text, rendering it on a miss"""
+        key = (text, (font or DEFAULT_FONT).lower(), size, fill, stroke_fill, stroke_width)
+        with self._lock:
+            bitmap = self._entries.get(key)
+            if bitmap is not None:
+                self._entries.move_to_end(key)
+                self._stats["hits"] += 1
+                return bitmap
+            self._stats["misses"] += 1
+
+        # Rendered outside the lock; two threads may race on the same text, which is harmless
+        bitmap = render_text(text, font, size, fill, stroke_fill, stroke_width)
+        nbytes = bitmap.image.width * bitmap.image.height * 4
+
+        with self._lock:
+            if nbytes <= self.max_bytes and key not in self._entries:
+                self._entries[key] = bitmap
+                self._size += nbytes
+                while self._size > self.max_bytes:
+                    _, evicted = self._entries.popitem(last=False)
+                    self._size -= evicted.image.width * evicted.image.height * 4
+                    self._stats["evictions"] += 1
+        return bitmap
+
+    def stats(self):
+        """Get cache usage metrics"""
+        with self._lock:
+            stats = dict(self._stats)
+            stats["entries"] = len(self._entries)
+            stats["bytes"] = self._size
+            stats["max_bytes"] = self.max_bytes
+        return stats
+
+
+# Create a singleton text cache
+text_cache = TextCache(config.get('fonts.text_cache_bytes', 32 * 1024 * 1024))
+
+
+def draw_caption(img, anchor, text, font, size, fill='#ffffff', stroke_fill='#000000', stroke_width=1):
+    """Composite cached outlined text onto an image, with the middle of its baseline at `anchor`"""
+    bitmap = text_cache.get(text, font, size, fill, stroke_fill, stroke_width)
+    img.paste(bitmap.image, bitmap.position(anchor), bitmap.image)
+    return img
@@ -10,42 +10,45 @@ from config import config
 
 logger = logging.getLogger(__name__)
 
-def cleanup_expired_media():
+def cleanup_expired_media(rescan=False):
     """
-    Clean up expired media files (older than the configured expiry period)
+    Clean up expired media files (not accessed within the configured expiry period)
+    
+    Also evicts the least recently used files while the total size is over
+    media.max_bytes. Returns the sweep result (expired, evicted, freed_bytes),
+    or None if it failed.
     """
     try:
-        # Get the expiry period from config (default 7 days)
-        expiry_days = config.get('cdn.file_expiry_days', 7)
+        from media_manifest import media_manifest
+        
+        # Pick up files generated before the manifest existed or left behind by crashed renders
+        if rescan:
+            added, removed = media_manifest.rescan()
+            logger.info(f"Rescanned media: {added} files added to the manifest, {removed} missing files dropped")
         
-        # Calculate the cutoff date
-        cutoff_date = datetime.now() - timedelta(days=expiry_days)
+        # Due files come from an indexed query on the manifest, nothing else is statted
+        result = media_manifest.sweep()
+        logger.info(
+            f"Removed {result['expired']} expired and {result['evicted']} evicted files, "
+            f"freeing {result['freed_bytes']} bytes"
+        )
+        
+        # Finished jobs only point at files that are gone by now
+        expiry_days = config.get('cdn.file_expiry_days', 7)
+        from job_queue import job_queue
+        purged = job_queue.purge(expiry_days * 86400)
+        logger.info(f"Removed {purged} finished jobs")
         
-        # Media output directory
-        media_dir = config.media_output_dir
+        # Full buckets are the same as missing ones
+        from rate_limiter import rate_limiter
+        purged = rate_limiter.purge()
+        logger.info(f"Removed {purged} idle rate limit buckets")
         
-        # Check each media type directory
-        for media_type in ['memes', 'gifs', 'clips']:
-            media_type_dir = media_dir / media_type
-            if not media_type_dir.exists():
-                continue
-                
-            # Check each file in the directory
-            for file_path in media_type_dir.iterdir():
-                if not file_path.is_file():
-                    continue
-                    
-                # Get the file's modification time
-                mod_time = datetime.fromtimestamp(os.path.getmtime(file_path))
-                
-                # If the file is older than the cutoff date, delete it
-                if mod_time < cutoff_date:
-                    logger.info(f"Deleting expired file: {file_path}")
-                    os.remove(file_path)
-                    
-        logger.info(f"Cleanup complete. Removed files older than {expiry_days} days")
+        logger.info(f"Cleanup complete. Removed files unused for {expiry_days} days")
+        return result
     except Exception as e:
         logger.exception(f"Error cleaning up expired media: {e}")
+        return None
 
 
 def get_error_frame_path():
@@ -61,6 +64,19 @@ def get_error_frame_path():
     return error_frame_path
 
 
+def get_episode_dir(episode):
+    """Get the static directory of an episode from its code (e.g. S01E04)"""
+    season_num = int(episode[1:3])
+    # Format: static/Season X/SXXEYY
+    return config.static_dir / f"Season {season_num}" / episode
+
+
+def parse_timestamp(timestamp):
+    """Convert an SRT-style timestamp (HH:MM:SS,mmm or HH:MM:SS.mmm) to seconds"""
+    hours, minutes, seconds = timestamp.strip().replace(',', '.').split(':')
+    return int(hours) * 3600 + int(minutes) * 60 + float(seconds)
+
+
 def safe_filename(text):
     """Convert text to a safe filename"""
     # Replace spaces with underscores and remove invalid characters
@@ -0,0 +1,151 @@
+import os
+import json
+import logging
+import subprocess
+import threading
+from array import array
+from bisect import bisect_left, bisect_right
+
+from utils import get_episode_dir
+
+logger = logging.getLogger(__name__)
+
+# Keyframe index written next to each episode's video.mkv
+INDEX_NAME = "video.keyframes.json"
+INDEX_VERSION = 1
+
+
+def probe_video(video_path):
+    """
+    Read the video stream parameters and keyframe timestamps of a file with ffprobe
+
+    Keyframes come from the packet flags, so nothing is decoded and a full
+    episode takes seconds.
+    """
+    result = subprocess.run(
+        [
+            'ffprobe', '-v', 'error',
+            '-select_streams', 'v:0',
+            '-show_entries', 'stream=codec_name,width,height,pix_fmt:format=duration',
+            '-of', 'json',
+            str(video_path)
+        ],
+        check=True, capture_output=True
+    )
+    info = json.loads(result.stdout)
+    stream = info['streams'][0]
+
+    result = subprocess.run(
+        [
+            'ffprobe', '-v', 'error',
+            '-select_streams', 'v:0',
+            '-show_entries', 'packet=pts_time,flags',
+            '-of', 'csv=p=0',
+            str(video_path)
+        ],
+        check=True, capture_output=True
+    )
+    keyframes = []
+    for line in result.stdout.decode().splitlines():
+        pts_time, _, flags = line.partition(',')
+        if 'K' in flags and pts_time not in ('', 'N/A'):
+            keyframes.append(float(pts_time))
+    keyframes.sort()
+
+    return {
+        "codec": stream.get('codec_name'),
+        "width": stream.get('width'),
+        "height": stream.get('height'),
+        "pix_fmt": stream.get('pix_fmt'),
+        "duration": float(info.get('format', {}).get('duration') or 0),
+        "keyframes": keyframes
+    }
+
+
+def build_index(episode):
+    """Probe an episode's video and write its keyframe index; returns the number of keyframes"""
+    video_path = get_episode_dir(episode) / "video.mkv"
+    stat = video_path.stat()
+    index = probe_video(video_path)
+    # The index is only trusted while the video is unchanged
+    index.update(version=INDEX_VERSION, video_size=stat.st_size, video_mtime_ns=stat.st_mtime_ns)
+
+    index_path = video_path.with_name(INDEX_NAME)
+    temp_path = index_path.with_name(index_path.name + '.tmp')
+    with open(temp_path, 'w') as f:
+        json.dump(index, f)
+    os.replace(temp_path, index_path)
+    return len(index['keyframes'])
+
+
+class KeyframeIndex:
+    """Video stream parameters and sorted keyframe timestamps (seconds) of one episode"""
+
+    __slots__ = ("codec", "width", "height", "pix_fmt", "duration", "keyframes", "video_key")
+
+    def __init__(self, data, video_key):
+        self.codec = data['codec']
+        self.width = data['width']
+        self.height = data['height']
+        self.pix_fmt = data['pix_fmt']
+        self.duration = data['duration']
+        self.keyframes = array('d', data['keyframes'])
+        self.video_key = video_key
+
+    def inner_range(self, start, end):
+        """
+        Get the first and last keyframes inside start..end, or None if there
+        isn't at least one whole GOP between them
+        """
+        first = bisect_left(self.keyframes, start)
+        last = bisect_right(self.keyframes, end) - 1
+        if first >= len(self.keyframes) or last < first or self.keyframes[first] >= self.keyframes[last]:
+            return None
+        return self.keyframes[first], self.keyframes[last]
+
+
+class VideoIndex:
+    """Per-process cache of episode keyframe indexes, reloaded when a video changes"""
+
+    def __init__(self):
+        self._indexes = {}
+        self._lock = threading.Lock()
+
+    def get(self, episode):
+        """Get the keyframe index of an episode, or None if it has none or it's out of date"""
+        video_path = get_episode_dir(episode) / "video.mkv"
+        try:
+            stat = video_path.stat()
+        except FileNotFoundError:
+            return None
+        video_key = (stat.st_size, stat.st_mtime_ns)
+
+        index = self._indexes.get(episode)
+        if index is not None and index.video_key == video_key:
+            return index
+
+        try:
+            with open(video_path.with_name(INDEX_NAME)) as f:
+                data = json.load(f)
+        except (FileNotFoundError, ValueError):
+            return None
+        if data.get('version') != INDEX_VERSION or (data.get('video_size'), data.get('video_mtime_ns')) != video_key:
+            logger.warning(f"Keyframe index for {episode} is out of date, run index_videos.py")
+            return None
+
+        index = KeyframeIndex(data, video_key)
+        with self._lock:
+            self._indexes[episode] = index
+        return index
+
+    def invalidate(self, episode=None):
+        """Forget cached indexes so they are reloaded on next use"""
+        with self._lock:
+            if episode is None:
+                self._indexes.clear()
+            else:
+                self._indexes.pop(episode, None)
+
+
+# Create a singleton video index
+video_index = VideoIndex()